@@ -0,0 +1,99 @@
+import os
+import threading
+
+from PIL import Image
+
+import export_profiles
+from instrumentation import tracer
+
+
+def encode_image(image, output, image_format, profile=export_profiles.DEFAULT_PROFILE):
+    # output: a binary file object; image_format: a Pillow format name
+    options = export_profiles.encoder_options(profile, image_format)
+    with tracer.span("encode", image, format=image_format, profile=profile):
+        if image_format == "JPEG" and image.mode == 'RGBA':
+            rgb_image = Image.new("RGB", image.size, (255, 255, 255))
+            rgb_image.paste(image, mask=image.getchannel("A"))
+            image = rgb_image
+        image.save(output, format=image_format, **options)
+
+
+def write_image(image, path, profile=export_profiles.DEFAULT_PROFILE):
+    # Encodes to a temp file next to the target and renames it into place, so a
+    # crash mid-encode never leaves a truncated file behind
+    directory, filename = os.path.split(os.path.abspath(path))
+    extension = os.path.splitext(filename)[1].lower()
+    image_format = Image.registered_extensions().get(extension)
+    if image_format is None:
+        raise ValueError(f"Unsupported file extension: {extension or filename}")
+
+    temp_path = os.path.join(directory, f".{filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp_path, "wb") as temp_file:
+            encode_image(image, temp_file, image_format, profile)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class AutosaveQueue:
+    def __init__(self, on_error=None, render_cache=None):
+        self.on_error = on_error
+        # With a RenderCache, a file already holding the same render is not encoded again
+        self.render_cache = render_cache
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._writing = None
+        self.writes = 0
+        self.coalesced = 0
+        self.unchanged = 0
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def submit(self, path, image, key=None, profile=export_profiles.DEFAULT_PROFILE):
+        # Only the newest state of each file is written; an older pending one is replaced.
+        # key is the image's RenderCache key, when known
+        with self._condition:
+            if path in self._pending:
+                self.coalesced += 1
+            self._pending[path] = (image, export_profiles.output_key(key, profile), profile)
+            self._condition.notify_all()
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending) + (1 if self._writing else 0)
+
+    def flush(self, timeout=None):
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and self._writing is None, timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                path = next(iter(self._pending))
+                image, key, profile = self._pending.pop(path)
+                self._writing = path
+            try:
+                if self.render_cache is not None and self.render_cache.skip_write(path, key):
+                    self.unchanged += 1
+                    print(f"Image unchanged since last autosaved to: {path}")
+                    continue
+                write_image(image, path, profile)
+                self.writes += 1
+                if self.render_cache is not None and key is not None:
+                    self.render_cache.record_output(path, key)
+                print(f"Image autosaved to: {path}")
+            except Exception as e:
+                print(f"Error autosaving image to {path}: {e}")
+                if self.on_error is not None:
+                    self.on_error(path, e)
+            finally:
+                with self._condition:
+                    self._writing = None
+                    self._condition.notify_all()
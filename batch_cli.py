@@ -0,0 +1,158 @@
+# Headless batch processing: runs the same op chain over many files without Qt.
+#   python batch_cli.py "shots/*.jpg" -o out --op Left=100 --op Contrast=70 --op Resize=800x600
+#   python batch_cli.py "shots/*.jpg" -o out --recipe edits/IMG_0042.recipe.json
+import argparse
+import concurrent.futures
+import glob
+import os
+import sys
+import time
+
+from PIL import Image
+
+import edit_recipe
+import export_profiles
+import image_ops
+import strip_parallel
+import tiled_image
+from autosave import write_image
+
+SUPPORTED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
+
+
+def collect_inputs(source):
+    if os.path.isdir(source):
+        paths = (os.path.join(source, name) for name in os.listdir(source))
+    else:
+        paths = glob.glob(source)
+    return sorted(path for path in paths
+                  if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS)
+
+
+def output_path_for(input_path, output_directory, output_format):
+    filename = os.path.basename(input_path)
+    if output_format:
+        filename = os.path.splitext(filename)[0] + "." + output_format.lstrip(".")
+    return os.path.join(output_directory, filename)
+
+
+def process_file(input_path, output_path, ops, tiled=None, profile=export_profiles.DEFAULT_PROFILE):
+    # Runs in a worker process; returns instead of raising so one bad file never stops the batch.
+    # tiled=None picks the out-of-core path for images too large to decode whole.
+    start = time.perf_counter()
+    try:
+        if tiled is None:
+            tiled = tiled_image.should_tile(input_path, ops)
+        if tiled:
+            tiled_image.process_tiled(input_path, output_path, ops, report=lambda message: None, profile=profile)
+            return input_path, None, time.perf_counter() - start
+        with Image.open(input_path) as image:
+            image.load()
+            result = image_ops.apply_ops(image, ops)
+        write_image(result, output_path, profile)
+        return input_path, None, time.perf_counter() - start
+    except Exception as e:
+        return input_path, f"{type(e).__name__}: {e}", time.perf_counter() - start
+
+
+def run_batch(inputs, output_directory, ops, workers=None, max_in_flight=None, output_format=None, tiled=None,
+              threads=None, profile=export_profiles.DEFAULT_PROFILE, report=print):
+    workers = workers or os.cpu_count() or 1
+    # Blur and sharpen also split across threads inside each worker; by default the
+    # cores are shared out so processes x threads does not oversubscribe them
+    threads = threads or max((os.cpu_count() or 1) // workers, 1)
+    # Each in-flight file holds at most one decoded image (plus its result) in a worker,
+    # so this bounds memory independently of how many files are queued
+    max_in_flight = max_in_flight or workers * 2
+    os.makedirs(output_directory, exist_ok=True)
+
+    failures = []
+    done = 0
+    total = len(inputs)
+    start = time.perf_counter()
+    pending_inputs = iter(inputs)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=strip_parallel.set_threads,
+                                                initargs=(threads,)) as pool:
+        in_flight = set()
+
+        def fill():
+            while len(in_flight) < max_in_flight:
+                input_path = next(pending_inputs, None)
+                if input_path is None:
+                    return
+                output_path = output_path_for(input_path, output_directory, output_format)
+                in_flight.add(pool.submit(process_file, input_path, output_path, ops, tiled, profile))
+
+        fill()
+        while in_flight:
+            finished, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                in_flight.discard(future)
+                input_path, error, elapsed = future.result()
+                done += 1
+                rate = done / max(time.perf_counter() - start, 1e-9)
+                if error:
+                    failures.append((input_path, error))
+                    report(f"[{done}/{total}] FAILED {input_path}: {error}")
+                else:
+                    report(f"[{done}/{total}] {input_path} ({elapsed:.2f}s, {rate:.1f} files/sec)")
+            fill()
+
+    elapsed = time.perf_counter() - start
+    report(f"Processed {total - len(failures)}/{total} files in {elapsed:.1f}s "
+           f"({total / max(elapsed, 1e-9):.1f} files/sec), {len(failures)} failed.")
+    return failures
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Apply an ordered chain of edits to many images.")
+    parser.add_argument("input", help="Input directory or glob pattern")
+    parser.add_argument("-o", "--output", required=True, help="Output directory")
+    parser.add_argument("--op", dest="ops", action="append", default=[], metavar="NAME[=VALUE]",
+                        help=f"Operation to apply, in order. Filters: {', '.join(image_ops.FILTER_NAMES)} "
+                             "(VALUE 0-100, default 50); Resize=WxH; Crop=X,Y,W,H")
+    parser.add_argument("--recipe", default=None, help="Edit recipe saved from the editor; its steps run before any --op")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Threads per worker for blur and sharpen (default: CPU count / workers)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Maximum files decoded at once (default: 2 per worker)")
+    parser.add_argument("--format", default=None, help="Output extension, e.g. png or jpg (default: keep input's)")
+    parser.add_argument("--profile", choices=export_profiles.PROFILE_NAMES, default=export_profiles.DEFAULT_PROFILE,
+                        help="Encoder settings for the output files (default: %(default)s)")
+    parser.add_argument("--tiled", action="store_true", default=None,
+                        help="Process every file in bounded-memory bands (default: only images of "
+                             f"{tiled_image.AUTO_TILED_PIXELS // 1000000} MP or more). "
+                             f"Supports {', '.join(tiled_image.TILED_OPS)}")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        ops = list(edit_recipe.load_recipe(args.recipe)) if args.recipe else []
+        ops.extend(image_ops.parse_op(spec) for spec in args.ops)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if not ops:
+        print("Error: at least one --op or a non-empty --recipe is required.", file=sys.stderr)
+        return 2
+
+    if args.tiled and not tiled_image.supports_ops(ops):
+        print(f"Error: --tiled supports only {', '.join(tiled_image.TILED_OPS)}.", file=sys.stderr)
+        return 2
+
+    inputs = collect_inputs(args.input)
+    if not inputs:
+        print(f"No supported image files found for: {args.input}", file=sys.stderr)
+        return 1
+
+    failures = run_batch(inputs, args.output, ops, args.workers, args.max_in_flight, args.format, args.tiled, args.threads,
+                         args.profile)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
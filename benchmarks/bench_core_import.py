@@ -0,0 +1,46 @@
+# Import time and resident memory of the Qt-free core versus the Qt editor, each
+# measured in a fresh interpreter.
+#   python benchmarks/bench_core_import.py
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["image_ops", "editor_core", "image_editor"]
+REPEATS = 5
+
+PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, int('PyQt5' in sys.modules))
+"""
+
+BASELINE = """
+import resource
+print(0.0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 0)
+"""
+
+
+def measure(code):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), int(output[1]), output[2] == "1"
+
+
+def main():
+    baseline_rss = min(measure(BASELINE)[1] for _ in range(REPEATS))
+    print(f"interpreter baseline RSS: {baseline_rss / 1024:.1f} MB")
+    print(f"{'module':>14} {'import (ms)':>12} {'RSS (MB)':>10} {'+RSS (MB)':>10} {'loads Qt':>9}")
+    for module in MODULES:
+        runs = [measure(PROBE.format(module=module)) for _ in range(REPEATS)]
+        import_time = min(run[0] for run in runs)
+        rss = min(run[1] for run in runs)
+        print(f"{module:>14} {import_time * 1000:>12.1f} {rss / 1024:>10.1f} "
+              f"{(rss - baseline_rss) / 1024:>10.1f} {'yes' if runs[0][2] else 'no':>9}")
+
+
+if __name__ == '__main__':
+    main()
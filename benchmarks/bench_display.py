@@ -0,0 +1,62 @@
+# Times one display frame (PIL image -> QPixmap) for the old PNG round-trip and
+# the raw-buffer QImage path.
+#   QT_QPA_PLATFORM=offscreen python benchmarks/bench_display.py
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PIL import Image
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtWidgets import QApplication
+
+from qt_image import pil_to_qimage
+
+SIZES_MP = [1, 4, 12, 24]
+MODES = ["RGB", "RGBA", "L"]
+REPEATS = 3
+
+
+def png_round_trip(image):
+    image_bytes = io.BytesIO()
+    image.save(image_bytes, format="PNG")
+    qpixmap = QPixmap()
+    qpixmap.loadFromData(image_bytes.getvalue())
+    return qpixmap
+
+
+def raw_buffer(image):
+    return QPixmap.fromImage(pil_to_qimage(image))
+
+
+def synthetic_image(megapixels, mode):
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    return Image.effect_noise((width, height), 64).convert(mode)
+
+
+def best_time(func, image):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(image)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    app = QApplication(sys.argv)
+    print(f"{'size':>6} {'mode':>5} {'png (ms)':>10} {'raw (ms)':>10} {'speedup':>8}")
+    for megapixels in SIZES_MP:
+        for mode in MODES:
+            image = synthetic_image(megapixels, mode)
+            before = best_time(png_round_trip, image)
+            after = best_time(raw_buffer, image)
+            print(f"{megapixels:>4}MP {mode:>5} {before * 1000:>10.1f} {after * 1000:>10.1f} {before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
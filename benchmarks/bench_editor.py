@@ -0,0 +1,309 @@
+# Times every Editor operation on synthetic images and records each one's peak
+# memory, Pillow allocation counts and time to the first frame on screen, headless. Results are written as JSON; --compare diffs two result files
+# and exits non-zero when an operation got slower (or hungrier) past --threshold.
+#   python benchmarks/bench_editor.py -o before.json
+#   python benchmarks/bench_editor.py --sizes 1,12 --modes RGB -o after.json
+#   python benchmarks/bench_editor.py --compare before.json after.json
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import PIL
+from PIL import Image
+from PyQt5.QtCore import QT_VERSION_STR
+from PyQt5.QtWidgets import QApplication, QMessageBox
+
+import image_ops
+
+SIZES_MP = [1, 4, 12, 24, 50, 100]
+MODES = ["RGB", "RGBA", "L"]
+REPEATS = 3
+FILTER_VALUE = 70
+DEFAULT_THRESHOLD = 0.10
+# Differences below this are timer noise, whatever the ratio
+NOISE_FLOOR_SECONDS = 0.002
+NOISE_FLOOR_MB = 4.0
+
+
+def synthetic_image(megapixels, mode):
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    noise = Image.effect_noise((width, height), 64)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", [noise, gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)])
+    if mode == "RGBA":
+        image.putalpha(gradient.transpose(Image.Transpose.FLIP_TOP_BOTTOM))
+    return image.convert(mode)
+
+
+def _rss_kb(field):
+    with open("/proc/self/status") as status:
+        return int(re.search(rf"{field}:\s+(\d+)", status.read()).group(1))
+
+
+class PeakMemory:
+    # Peak resident memory of one operation above what was resident when it started.
+    # Linux can reset the high-water mark between operations; elsewhere only the
+    # process-wide peak is available and the figure is an upper bound.
+
+    def __init__(self):
+        try:
+            self._reset()
+            _rss_kb("VmHWM")
+            self.exact = True
+        except (OSError, AttributeError):
+            self.exact = False
+
+    def _reset(self):
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+
+    def start(self):
+        if self.exact:
+            self._reset()
+            self._baseline = _rss_kb("VmRSS")
+        else:
+            self._baseline = 0
+
+    def peak_mb(self):
+        if self.exact:
+            return max(_rss_kb("VmHWM") - self._baseline, 0) / 1024
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+
+
+def _allocation_counts():
+    # Pillow's own counters: images created and pixel blocks handed out, process-wide
+    stats = Image.core.get_stats()
+    return stats["new_count"], stats["allocated_blocks"] + stats["reused_blocks"]
+
+
+class EditorBench:
+    def __init__(self, app, work_directory, repeats, save_format):
+        from photoqt_ui import PhotoQTUI
+        from image_editor import Editor
+
+        # Success dialogs are modal; an unattended run must not stop on them
+        for name in ("information", "warning", "critical"):
+            setattr(QMessageBox, name, staticmethod(lambda *args, **kwargs: QMessageBox.Ok))
+
+        self.app = app
+        self.repeats = repeats
+        self.save_format = save_format
+        self.work_directory = work_directory
+        self.memory = PeakMemory()
+        self.ui = PhotoQTUI()
+        self.ui.resize(1280, 800)
+        self.ui.show()
+        self.ui.current_working_directory = work_directory
+        # Without the on-disk render cache, so repeats measure the work and not a lookup
+        self.editor = Editor(self.ui, render_cache_directory=None)
+        self.app.processEvents()
+        # Time of the first picture shown after an operation starts (a draft, with progressive display)
+        self.first_frame = None
+        set_image = self.ui.picture_box.set_image
+
+        def record_frame(*args):
+            if self.first_frame is None:
+                self.first_frame = time.perf_counter()
+            set_image(*args)
+
+        self.ui.picture_box.set_image = record_frame
+
+    def wait(self):
+        while self.editor.is_rendering():
+            self.app.processEvents()
+            time.sleep(0.001)
+        self.app.processEvents()
+
+    def settle(self):
+        # Background autosaves must not overlap the next measurement
+        self.wait()
+        self.editor.flush_autosave()
+        self.editor.history.wait_idle()
+
+    def measure(self, action, prepare=None, cleanup=None):
+        times = []
+        first_frames = []
+        peak = 0.0
+        allocations = None
+        for _ in range(self.repeats):
+            if prepare:
+                prepare()
+            self.settle()
+            self.memory.start()
+            images_before, blocks_before = _allocation_counts()
+            self.first_frame = None
+            start = time.perf_counter()
+            action()
+            self.wait()
+            times.append(time.perf_counter() - start)
+            if self.first_frame is not None:
+                first_frames.append(self.first_frame - start)
+            peak = max(peak, self.memory.peak_mb())
+            # Allocations include the background work the operation started
+            # (history tiling, autosave), so they are counted once that settles
+            self.settle()
+            images_after, blocks_after = _allocation_counts()
+            if allocations is None:
+                allocations = (images_after - images_before, blocks_after - blocks_before)
+            if cleanup:
+                cleanup()
+        return {"seconds_min": min(times), "seconds_median": statistics.median(times),
+                "first_frame_seconds": min(first_frames) if first_frames else None, "peak_mb": round(peak, 1),
+                "images_allocated": allocations[0], "blocks_allocated": allocations[1]}
+
+    def run_case(self, megapixels, mode, report):
+        editor = self.editor
+        source = synthetic_image(megapixels, mode)
+        filename = f"bench_{megapixels}mp_{mode}.tif"
+        source.save(os.path.join(self.work_directory, filename))
+        width, height = source.size
+        del source
+
+        def load():
+            editor.prefetcher.clear()
+            editor.load_image(filename)
+
+        operations = [("load_image", load, None, None)]
+        operations.append(("full_decode", editor.core.ensure_full_image, load, None))
+        operations.append(("show_image_in_box", lambda: editor.show_image_in_box(editor.history.current()), None, None))
+        for name in image_ops.FILTER_NAMES:
+            operations.append((f"apply_filter:{name}", lambda name=name: editor.apply_filter(name, FILTER_VALUE),
+                               None, editor.undo))
+        operations.append(("resize_image", lambda: editor.resize_image(width // 2, height // 2), None, editor.undo))
+        operations.append(("crop_image", lambda: editor.crop_image(width // 4, height // 4, width // 2, height // 2),
+                           None, editor.undo))
+        save_path = os.path.join(self.work_directory, f"saved.{self.save_format}")
+        operations.append((f"save_image:{self.save_format}", lambda: editor.save_image(save_path), None, None))
+        operations.append(("undo", editor.undo, lambda: editor.apply_filter("Color", FILTER_VALUE), None))
+        operations.append(("redo", editor.redo, editor.undo, None))
+
+        results = []
+        load()
+        self.settle()
+        for op, action, prepare, cleanup in operations:
+            result = self.measure(action, prepare, cleanup)
+            result.update({"size_mp": megapixels, "mode": mode, "width": width, "height": height, "op": op})
+            results.append(result)
+            first_frame = result["first_frame_seconds"]
+            first_frame = f"{first_frame * 1000:>8.1f} ms" if first_frame is not None else f"{'-':>11}"
+            report(f"{megapixels:>4}MP {mode:>5} {op:<22} {result['seconds_min'] * 1000:>10.1f} ms {first_frame}"
+                   f" {result['peak_mb']:>9.1f} MB {result['images_allocated']:>8} {result['blocks_allocated']:>8}")
+        editor.clear_history()
+        os.remove(os.path.join(self.work_directory, filename))
+        return results
+
+
+def run(args):
+    out = sys.stdout
+    app = QApplication(sys.argv)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="photoqt-bench-") as work_directory:
+        previous_directory = os.getcwd()
+        os.chdir(work_directory)
+        try:
+            # The editor logs every step; keep the table readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                bench = EditorBench(app, work_directory, args.repeats, args.save_format)
+                report = lambda line: print(line, file=out, flush=True)
+                report(f"{'size':>6} {'mode':>5} {'operation':<22} {'best':>13} {'first frame':>11} {'peak above start':>12}"
+                       f" {'images':>8} {'blocks':>8}")
+                for megapixels in args.sizes:
+                    for mode in args.modes:
+                        results.extend(bench.run_case(megapixels, mode, report))
+                exact_memory = bench.memory.exact
+        finally:
+            os.chdir(previous_directory)
+
+    document = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "qt": QT_VERSION_STR,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeats": args.repeats,
+            "peak_memory": "per-operation" if exact_memory else "process-wide",
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(document, output_file, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+def compare(baseline_path, current_path, threshold, report=print):
+    with open(baseline_path) as baseline_file:
+        baseline = {(r["size_mp"], r["mode"], r["op"]): r for r in json.load(baseline_file)["results"]}
+    with open(current_path) as current_file:
+        current = json.load(current_file)["results"]
+
+    regressions = 0
+    report(f"{'size':>6} {'mode':>5} {'operation':<22} {'before':>10} {'after':>10} {'change':>8}")
+    for result in current:
+        key = (result["size_mp"], result["mode"], result["op"])
+        before = baseline.get(key)
+        if before is None:
+            continue
+        old, new = before["seconds_min"], result["seconds_min"]
+        change = new / old - 1 if old else 0.0
+        flags = []
+        if change > threshold and new - old > NOISE_FLOOR_SECONDS:
+            flags.append("SLOWER")
+        old_mb, new_mb = before.get("peak_mb", 0.0), result.get("peak_mb", 0.0)
+        if new_mb > old_mb * (1 + threshold) and new_mb - old_mb > NOISE_FLOOR_MB:
+            flags.append(f"MEMORY {old_mb:.0f}->{new_mb:.0f} MB")
+        # Block counts are deterministic, so any increase is real
+        old_blocks, new_blocks = before.get("blocks_allocated"), result.get("blocks_allocated")
+        if old_blocks is not None and new_blocks is not None and new_blocks > old_blocks:
+            flags.append(f"ALLOCATIONS {old_blocks}->{new_blocks} blocks")
+        regressions += bool(flags)
+        report(f"{key[0]:>4}MP {key[1]:>5} {key[2]:<22} {old * 1000:>8.1f}ms {new * 1000:>8.1f}ms "
+               f"{change:>+7.0%}  {' '.join(flags)}")
+    report(f"{regressions} regression(s) past {threshold:.0%}.")
+    return 1 if regressions else 0
+
+
+def _number_list(text):
+    return [float(part) if "." in part else int(part) for part in text.split(",")]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark every Editor operation on synthetic images.")
+    parser.add_argument("--sizes", type=_number_list, default=SIZES_MP, help="Megapixels, comma separated")
+    parser.add_argument("--modes", type=lambda text: text.split(","), default=MODES, help="Image modes, comma separated")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="Runs per operation; the best is compared")
+    parser.add_argument("--save-format", default="jpg", help="Extension save_image writes")
+    parser.add_argument("-o", "--output", default=None, help="Write results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown flagged as a regression (default 0.10)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# Encodes sample images with every export profile and reports encode time and
+# output bytes per format, so the profiles' speed/size trade-offs stay measured.
+# By default the images in edits/ plus a synthetic photo-like image are used.
+#   python benchmarks/bench_export.py
+#   python benchmarks/bench_export.py --sizes 12,24 photos/*.jpg
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFilter
+
+import export_profiles
+
+SAMPLE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "edits")
+SAMPLE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp")
+SIZES_MP = [12]
+FORMATS = ["PNG", "JPEG", "WEBP"]
+REPEATS = 3
+
+
+def synthetic_photo(megapixels):
+    # Smooth gradients with mild grain: compresses like a photo, unlike pure noise
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    red = Image.linear_gradient("L").resize((width, height))
+    green = Image.radial_gradient("L").resize((width, height))
+    blue = red.transpose(Image.FLIP_LEFT_RIGHT)
+    grain = Image.effect_noise((width, height), 12).filter(ImageFilter.GaussianBlur(1))
+    return Image.merge("RGB", (Image.blend(red, grain, 0.3), Image.blend(green, grain, 0.3), blue))
+
+
+def encodable(image, image_format):
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    if image.mode not in ("RGB", "RGBA", "L"):
+        return image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    return image
+
+
+def encode(image, image_format, options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.tell()
+
+
+def best_time(func, *args):
+    best = float("inf")
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def load_samples(paths, sizes):
+    samples = []
+    if not paths and os.path.isdir(SAMPLE_DIRECTORY):
+        paths = sorted(os.path.join(SAMPLE_DIRECTORY, name) for name in os.listdir(SAMPLE_DIRECTORY)
+                       if name.lower().endswith(SAMPLE_EXTENSIONS))
+    for path in paths:
+        with Image.open(path) as image:
+            image.load()
+            samples.append((os.path.basename(path), image))
+    for megapixels in sizes:
+        samples.append((f"synthetic {megapixels}MP", synthetic_photo(megapixels)))
+    return samples
+
+
+def _number_list(text):
+    return [int(part) for part in text.split(",") if part]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Encode time and size per export profile.")
+    parser.add_argument("images", nargs="*", help=f"Images to encode (default: {SAMPLE_DIRECTORY})")
+    parser.add_argument("--sizes", type=_number_list, default=SIZES_MP,
+                        help="Megapixels of synthetic images, comma separated ('' for none)")
+    parser.add_argument("--formats", type=lambda text: text.upper().split(","), default=FORMATS,
+                        help="Pillow formats, comma separated")
+    args = parser.parse_args(argv)
+
+    totals = {}
+    print(f"{'image':<22} {'format':<5} {'profile':<13} {'ms':>9} {'bytes':>12} {'MP/s':>7}")
+    for label, image in load_samples(args.images, args.sizes):
+        megapixels = image.width * image.height / 1_000_000
+        for image_format in args.formats:
+            source = encodable(image, image_format)
+            for profile in export_profiles.PROFILE_NAMES:
+                options = export_profiles.encoder_options(profile, image_format)
+                elapsed, size = best_time(encode, source, image_format, options)
+                total = totals.setdefault((image_format, profile), [0.0, 0])
+                total[0] += elapsed
+                total[1] += size
+                print(f"{label[:22]:<22} {image_format:<5} {profile:<13} {elapsed * 1000:>9.1f} {size:>12,} "
+                      f"{megapixels / elapsed:>7.1f}")
+
+    print()
+    print(f"{'total':<22} {'format':<5} {'profile':<13} {'ms':>9} {'bytes':>12}")
+    for (image_format, profile), (elapsed, size) in totals.items():
+        print(f"{'':<22} {image_format:<5} {profile:<13} {elapsed * 1000:>9.1f} {size:>12,}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
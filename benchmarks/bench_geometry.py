@@ -0,0 +1,69 @@
+# Times chains of rotate/mirror/crop/resize edits applied one op at a time versus
+# geometry_ops, which composes them into a single resample.
+#   python benchmarks/bench_geometry.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import geometry_ops
+import image_ops
+
+SIZES_MP = [1, 12, 24]
+MODES = ["RGB", "RGBA"]
+REPEATS = 3
+
+
+def chains(width, height):
+    half = (width // 2, height // 2)
+    return [
+        [("Right", 100), ("Mirror", 100)],
+        [("Crop", (width // 4, height // 4) + half), ("Resize", (width // 8, height // 8))],
+        [("Left", 100), ("Crop", (0, 0, height // 2, width // 2)), ("Resize", (800, 600))],
+        [("Left", 20), ("Crop", (width // 4, height // 4) + half), ("Resize", (1600, 1200))],
+        [("Right", 10), ("Mirror", 100), ("Resize", (width // 4, height // 4))],
+    ]
+
+
+def one_at_a_time(image, ops):
+    for name, value in ops:
+        image = image_ops.apply_op(image, name, value)
+    return image
+
+
+def synthetic_image(megapixels, mode):
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    return Image.effect_noise((width, height), 64).convert(mode)
+
+
+def best_time(func, *args):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def describe(ops):
+    return " + ".join(f"{name}={value}" for name, value in ops)
+
+
+def main():
+    print(f"{'size':>6} {'mode':>5} {'per-op (ms)':>12} {'fused (ms)':>11} {'speedup':>8}  chain")
+    for megapixels in SIZES_MP:
+        for mode in MODES:
+            image = synthetic_image(megapixels, mode)
+            for ops in chains(*image.size):
+                before = best_time(one_at_a_time, image, ops)
+                after = best_time(geometry_ops.apply_geometry_ops, image, ops)
+                print(f"{megapixels:>4}MP {mode:>5} {before * 1000:>12.1f} {after * 1000:>11.1f} "
+                      f"{before / after:>7.1f}x  {describe(ops)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Times chains of colour/contrast/B&W edits: one ImageEnhance pass per op versus
+# point_ops, which turns contrast into lookup tables and fuses everything after
+# B/W into one table, and checks both produce identical pixels.
+#   python benchmarks/bench_point_ops.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageEnhance
+
+import point_ops
+
+SIZES_MP = [1, 12, 24]
+MODES = ["RGB", "RGBA"]
+CHAINS = [
+    [("Contrast", 70)],
+    [("Color", 30)],
+    [("Contrast", 70), ("Contrast", 40)],
+    [("Color", 80), ("Contrast", 65)],
+    [("Contrast", 60), ("Color", 120), ("Contrast", 45)],
+    [("Color", 20), ("B/W", 50), ("Contrast", 90)],
+    [("B/W", 50), ("Contrast", 80), ("Color", 70), ("Contrast", 40)],
+]
+REPEATS = 3
+
+
+def image_enhance_chain(image, ops):
+    for name, value in ops:
+        if name == "B/W":
+            image = image.convert("L").convert("RGB")
+        elif name == "Color":
+            image = ImageEnhance.Color(image).enhance(value / 50.0)
+        else:
+            image = ImageEnhance.Contrast(image).enhance(value / 50.0)
+    return image
+
+
+def synthetic_image(megapixels, mode):
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    noise = Image.effect_noise((width, height), 64)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    return Image.merge("RGB", [noise, gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)]).convert(mode)
+
+
+def best_time(func, *args):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def describe(ops):
+    return " + ".join(f"{name}={value}" if name != "B/W" else name for name, value in ops)
+
+
+def main():
+    print(f"{'size':>6} {'mode':>5} {'enhance (ms)':>13} {'fused (ms)':>11} {'speedup':>8}  chain")
+    for megapixels in SIZES_MP:
+        for mode in MODES:
+            image = synthetic_image(megapixels, mode)
+            for ops in CHAINS:
+                before, expected = best_time(image_enhance_chain, image, ops)
+                after, result = best_time(point_ops.apply_point_ops, image, ops)
+                same = "" if result.tobytes() == expected.tobytes() else "  MISMATCH"
+                print(f"{megapixels:>4}MP {mode:>5} {before * 1000:>13.1f} {after * 1000:>11.1f} "
+                      f"{before / after:>7.1f}x  {describe(ops)}{same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Times resampling a rendition set as a reduce()/LANCZOS cascade against
+# resampling every size from the full image with LANCZOS (what repeated
+# resize_image calls did), then the whole export in renditions/sec.
+#   python benchmarks/bench_renditions.py
+#   python benchmarks/bench_renditions.py --sizes 24,50 --threads 1,4
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import renditions
+from bench_export import synthetic_photo
+
+SIZES_MP = [12, 24]
+RENDITION_SIZES = ["print=full", "large=3000", "web=2048", "small=1024", "thumb=320", "icon=96"]
+FORMATS = ["jpg", "webp"]
+THREADS = [1, 4]
+REPEATS = 3
+
+
+def best_time(func, *args):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def independent(image, sizes):
+    for _, box in sizes:
+        size = renditions.fit_size(image.size, box)
+        if size != image.size:
+            image.resize(size, Image.Resampling.LANCZOS)
+
+
+def cascade(image, sizes):
+    for _ in renditions.build_renditions(image, sizes):
+        pass
+
+
+def _number_list(text):
+    return [int(part) for part in text.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rendition cascade and export throughput.")
+    parser.add_argument("--sizes", type=_number_list, default=SIZES_MP, help="Megapixels, comma separated")
+    parser.add_argument("--threads", type=_number_list, default=THREADS, help="Write threads, comma separated")
+    args = parser.parse_args(argv)
+
+    sizes = [renditions.parse_size(spec) for spec in RENDITION_SIZES]
+    extensions = [renditions.parse_format(spec) for spec in FORMATS]
+    count = len(sizes) * len(extensions)
+    print(f"{os.cpu_count()} CPUs, {len(sizes)} sizes x {len(extensions)} formats")
+    for megapixels in args.sizes:
+        image = synthetic_photo(megapixels)
+        before = best_time(independent, image, sizes)
+        after = best_time(cascade, image, sizes)
+        print(f"{megapixels:>4}MP resample: independent {before * 1000:>8.1f} ms, cascade {after * 1000:>8.1f} ms "
+              f"({before / after:.1f}x)")
+        for threads in args.threads:
+            with tempfile.TemporaryDirectory(prefix="photoqt-renditions-") as output_directory:
+                elapsed = best_time(renditions.export_renditions, image, output_directory, "bench", sizes, extensions,
+                                    "balanced", threads, lambda message: None)
+            print(f"{megapixels:>4}MP export, {threads} write threads: {elapsed:>6.2f} s, "
+                  f"{count / elapsed:>6.1f} renditions/sec")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# Times blur and sharpen at several thread counts with strip_parallel and checks
+# every result is bit-identical to the single-threaded filter.
+#   python benchmarks/bench_strips.py
+#   python benchmarks/bench_strips.py --threads 1,2,4,8,16 --sizes 12,50
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import image_ops
+import strip_parallel
+
+SIZES_MP = [4, 12, 24]
+MODES = ["RGB", "RGBA"]
+THREADS = [1, 2, 4, 8, 16]
+FILTERS = [("Blur", 20), ("Blur", 100), ("Sharpen", 70)]
+REPEATS = 3
+
+
+def synthetic_image(megapixels, mode):
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    return Image.effect_noise((width, height), 64).convert(mode)
+
+
+def best_time(func, *args):
+    best = float("inf")
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _number_list(text):
+    return [int(part) for part in text.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Strip-parallel blur/sharpen scaling.")
+    parser.add_argument("--threads", type=_number_list, default=THREADS, help="Thread counts, comma separated")
+    parser.add_argument("--sizes", type=_number_list, default=SIZES_MP, help="Megapixels, comma separated")
+    args = parser.parse_args(argv)
+
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'size':>6} {'mode':>5} {'filter':<12} {'threads':>7} {'ms':>9} {'speedup':>8}  identical")
+    mismatches = 0
+    for megapixels in args.sizes:
+        for mode in MODES:
+            image = synthetic_image(megapixels, mode)
+            for name, value in FILTERS:
+                strip_parallel.set_threads(1)
+                baseline, expected = best_time(image_ops.apply_op, image, name, value)
+                expected = expected.tobytes()
+                for threads in args.threads:
+                    strip_parallel.set_threads(threads)
+                    elapsed, result = best_time(image_ops.apply_op, image, name, value)
+                    identical = result.tobytes() == expected
+                    mismatches += not identical
+                    print(f"{megapixels:>4}MP {mode:>5} {f'{name}={value}':<12} {threads:>7} {elapsed * 1000:>9.1f} "
+                          f"{baseline / elapsed:>7.2f}x  {'yes' if identical else 'NO'}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+from PIL import Image
+
+import geometry_ops
+import image_ops
+
+# Low-resolution stand-ins for committed edits that are still rendering at full
+# resolution. A frame is a small image plus the full-resolution size it stands
+# for; steps are replayed on the frame with their crop box, resize target and
+# blur radius scaled down to it, so a frame costs the same for any image size.
+
+# Sides of the instant frame shown the moment an edit is committed
+DRAFT_SIZE = (256, 256)
+
+
+def make_frame(image, logical_size, max_size):
+    width, height = image.size
+    ratio = min(max_size[0] / width, max_size[1] / height)
+    if ratio < 1.0:
+        size = (max(round(width * ratio), 1), max(round(height * ratio), 1))
+        image = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return image, logical_size
+
+
+def make_frames(image, logical_size, display_size):
+    # (draft frame, display-sized frame); the draft is cut from the display frame
+    display_frame = make_frame(image, logical_size, display_size)
+    return make_frame(display_frame[0], logical_size, DRAFT_SIZE), display_frame
+
+
+def apply_step(frame, name, argument):
+    image, logical_size = frame
+    scale_x = image.width / logical_size[0]
+    scale_y = image.height / logical_size[1]
+    if name in geometry_ops.GEOMETRIC_OPS:
+        # Raises ValueError for a crop outside the image, as the full render would
+        _, new_size, _ = geometry_ops.plan(logical_size, [(name, argument)])
+    else:
+        new_size = logical_size
+    if name == "Resize":
+        size = (max(round(argument[0] * scale_x), 1), max(round(argument[1] * scale_y), 1))
+        image = image.resize(size, Image.Resampling.BILINEAR)
+    elif name == "Crop":
+        x, y, width, height = argument
+        left, top = int(x * scale_x), int(y * scale_y)
+        right = min(max(round((x + width) * scale_x), left + 1), image.width)
+        bottom = min(max(round((y + height) * scale_y), top + 1), image.height)
+        image = image.crop((left, top, right, bottom))
+    else:
+        filter_function = image_ops.get_filter_function(name, scale_x)
+        if filter_function is None:
+            raise ValueError(f"Unknown operation: '{name}'")
+        image = filter_function(image, argument)
+    return image, new_size
+
+
+def apply_steps(frame, steps):
+    for name, argument in steps:
+        frame = apply_step(frame, name, argument)
+    return frame
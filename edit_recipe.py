@@ -0,0 +1,149 @@
+import collections
+import json
+import threading
+
+import image_ops
+
+# An edit is kept as the ordered steps that produced it from the original image,
+# ((name, argument), ...) in image_ops.apply_op form. RecipeCache keeps the
+# intermediate results keyed by the step prefix that made them, so changing
+# step k re-runs only steps k..n. Recipes are saved as JSON in the same
+# "Contrast=70" / "Resize=800x600" syntax batch_cli takes, and replay on any file.
+
+RECIPE_VERSION = 1
+RESET_STEP = "Original"
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def append_step(steps, name, argument):
+    # "Original" goes back to the unedited image, so it empties the recipe
+    if name == RESET_STEP:
+        return ()
+    return tuple(steps) + ((name, argument),)
+
+
+def _check_index(steps, index):
+    if not 0 <= index < len(steps):
+        raise IndexError(f"No step {index} in a recipe of {len(steps)} steps.")
+
+
+def replace_step(steps, index, argument):
+    _check_index(steps, index)
+    name, _ = steps[index]
+    # Round-trip through parse_op so a bad value fails the same way as in a saved recipe
+    step = image_ops.parse_op(image_ops.format_op(name, argument))
+    return steps[:index] + (step,) + steps[index + 1:]
+
+
+def remove_step(steps, index):
+    _check_index(steps, index)
+    return steps[:index] + steps[index + 1:]
+
+
+def normalize_steps(steps):
+    # The steps as op specs, minus those that leave the image as it was, so recipes
+    # giving the same result share one form
+    normalized = []
+    for name, argument in steps:
+        if name == "Mirror" and argument <= 50:
+            continue
+        if name in ("Left", "Right") and argument == 0:
+            continue
+        normalized.append(image_ops.format_op(name, argument))
+    return normalized
+
+
+def to_json(steps):
+    return json.dumps({"version": RECIPE_VERSION, "steps": [image_ops.format_op(name, argument) for name, argument in steps]},
+                      indent=2)
+
+
+def from_json(text):
+    document = json.loads(text)
+    if not isinstance(document, dict) or document.get("version") != RECIPE_VERSION:
+        raise ValueError(f"Not a version {RECIPE_VERSION} edit recipe.")
+    return tuple(image_ops.parse_op(spec) for spec in document.get("steps", []))
+
+
+def save_recipe(path, steps):
+    with open(path, "w") as recipe_file:
+        recipe_file.write(to_json(steps))
+
+
+def load_recipe(path):
+    with open(path) as recipe_file:
+        return from_json(recipe_file.read())
+
+
+def _image_nbytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class RecipeCache:
+    # Byte-bounded LRU of intermediate results for one original image. Each
+    # result is rendered from the longest cached prefix with apply_op, step by
+    # step, so it matches what committing the same edits one at a time gives.
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def put(self, steps, image):
+        steps = tuple(steps)
+        if not steps:
+            return
+        nbytes = _image_nbytes(image)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(steps, None)
+            if previous is not None:
+                self._bytes -= _image_nbytes(previous)
+            self._entries[steps] = image
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _image_nbytes(evicted)
+
+    def _longest_prefix(self, steps):
+        with self._lock:
+            for length in range(len(steps), 0, -1):
+                image = self._entries.get(steps[:length])
+                if image is not None:
+                    self._entries.move_to_end(steps[:length])
+                    self.hits += 1
+                    return length, image
+            self.misses += 1
+            return 0, None
+
+    def render(self, original, steps):
+        steps = tuple(steps)
+        length, image = self._longest_prefix(steps)
+        if image is None:
+            image = original
+        for index in range(length, len(steps)):
+            name, argument = steps[index]
+            image = image_ops.apply_op(image, name, argument)
+            self.put(steps[:index + 1], image)
+        print(f"[RecipeCache] Rendered {len(steps)} steps, {len(steps) - length} re-run.")
+        return image
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,318 @@
+import os
+import threading
+
+from PIL import Image
+
+import edit_recipe
+import export_profiles
+import image_ops
+from autosave import write_image
+from image_history import ImageHistory, DEFAULT_MEMORY_BUDGET
+from instrumentation import tracer
+
+# Editing state and operations with no Qt dependency. Failures come back as
+# EditorError values; the Qt Editor turns them into message boxes, headless
+# callers can log or raise them.
+
+CRITICAL = "critical"
+WARNING = "warning"
+INFORMATION = "information"
+
+
+def decode_full(path):
+    # load() decodes in place and, for single-frame files, closes the file itself;
+    # no copy is needed to detach the pixels
+    with tracer.span("decode", path=os.path.basename(path)) as span:
+        image = Image.open(path)
+        image.load()
+        span.output(image)
+        return image_ops.freeze(image)
+
+
+class EditorError(Exception):
+    def __init__(self, title, message, level=CRITICAL, status=None):
+        super().__init__(message)
+        self.title = title
+        self.message = message
+        self.level = level
+        # Placeholder text for the picture area, when the error leaves nothing to show
+        self.status = status
+
+
+class EditorCore:
+    def __init__(self, edits_directory="edits", history_memory_budget=DEFAULT_MEMORY_BUDGET,
+                 recipe_cache_bytes=edit_recipe.DEFAULT_CACHE_BYTES, render_cache=None):
+        self.image = None
+        self.original_image = None
+        self.history = ImageHistory(history_memory_budget)
+        # Every history entry records the recipe that rebuilds it from original_image;
+        # intermediate results are kept here so a changed step only re-runs what follows it
+        self.recipe_cache = edit_recipe.RecipeCache(recipe_cache_bytes)
+        # Optional RenderCache: finished renders on disk, shared across sessions
+        self.render_cache = render_cache
+        self.current_filename = None
+        self.current_filepath = None
+        # Set while self.image is a reduced-resolution decode standing in for the full file
+        self._deferred_full_path = None
+        self._full_size = None
+        self._full_lock = threading.Lock()
+        self.edits_directory = edits_directory
+        self.filters_with_parameters = list(image_ops.FILTERS_WITH_PARAMETERS)
+        # Encoder settings for Save As and for autosaves, from export_profiles
+        self.export_profile = export_profiles.DEFAULT_PROFILE
+        self.autosave_profile = export_profiles.DEFAULT_PROFILE
+
+    def ensure_edits_directory(self):
+        if not os.path.exists(self.edits_directory):
+            try:
+                os.makedirs(self.edits_directory)
+            except OSError as e:
+                print(f"Error creating edits directory: {e}")
+                return EditorError("Directory Error", f"Could not create '{self.edits_directory}' directory: {e}")
+        return None
+
+    def load_image(self, directory, filename, decode=None):
+        # decode(path) may hand back an already decoded image, e.g. from a prefetch cache,
+        # or a reduced-resolution one; in that case the full decode waits until an edit
+        # is committed or the image is exported.
+        full_path = os.path.join(directory, filename)
+        print(f"[EditorCore.load_image] Attempting to load: {filename}")
+        print(f"[EditorCore.load_image] Full image path: '{full_path}'")
+
+        try:
+            with Image.open(full_path) as header:
+                full_size = header.size
+            if decode is not None:
+                pil_image = decode(full_path)
+            else:
+                pil_image = decode_full(full_path)
+
+            self.clear_history()
+
+            self.image = image_ops.freeze(pil_image)
+            self.current_filename = filename
+            self.current_filepath = full_path
+            self._full_size = full_size
+
+            if pil_image.size != full_size:
+                self.original_image = None
+                self._deferred_full_path = full_path
+                print(f"[EditorCore.load_image] Showing {pil_image.size} reduced decode of {full_size} image; full decode deferred.")
+            else:
+                self.original_image = pil_image
+                self._deferred_full_path = None
+                self.add_to_history(self.image) # Add initial state to history
+                print("[EditorCore.load_image] Image loaded successfully and added to history.")
+            return None
+        except FileNotFoundError:
+            error = EditorError("File Not Found", f"Image file not found: {full_path}", status="Image not found.")
+        except Image.UnidentifiedImageError:
+            error = EditorError("Unsupported Image Type", f"Could not open image. The file format might be unsupported or corrupted: {filename}",
+                                status="Unsupported or corrupted image.")
+        except Exception as e:
+            error = EditorError("Loading Error", f"An error occurred while loading image '{filename}': {e}", status="Error loading image.")
+        self.reset()
+        return error
+
+    def reset(self):
+        self.image = None
+        self.original_image = None
+        self.current_filename = None
+        self.current_filepath = None
+        self._deferred_full_path = None
+        self._full_size = None
+        self.clear_history()
+
+    def is_full_resolution(self):
+        return self._deferred_full_path is None
+
+    def image_size(self):
+        # Size in full-resolution pixels, known without decoding the full image
+        if self.image is None:
+            return None
+        return self._full_size if self._deferred_full_path is not None else self.image.size
+
+    def ensure_full_image(self):
+        # Safe to call from the render worker; the first caller does the decode
+        with self._full_lock:
+            path = self._deferred_full_path
+            if path is None:
+                return self.history.current()
+            print(f"[EditorCore.ensure_full_image] Decoding full resolution: '{path}'")
+            full_image = decode_full(path)
+            if self._deferred_full_path != path:
+                # A different file was loaded while decoding
+                return self.history.current()
+            self.original_image = full_image
+            self._deferred_full_path = None
+            self.add_to_history(full_image)
+            return full_image
+
+    def add_to_history(self, image_state, transpose=None, steps=(), previous=None):
+        self.history.add(image_state, transpose, steps, previous)
+        print(f"Image state added to history. ({self.history_memory_usage() / (1024 * 1024):.1f} MB in use)")
+
+    def clear_history(self):
+        self.history.clear()
+        self.recipe_cache.clear()
+        print("Image history cleared.")
+
+    def history_memory_usage(self):
+        return self.history.memory_usage()
+
+    def undo(self):
+        # Returns the image to show, or an EditorError; making it self.image is left
+        # to the caller, which may be on another thread
+        if not self.history.can_undo():
+            print("No more undo steps.")
+            return EditorError("Undo", "No more undo steps available.", INFORMATION)
+        image = self.history.undo()
+        print("Undo applied.")
+        return image
+
+    def redo(self):
+        # As undo()
+        if not self.history.can_redo():
+            print("No more redo steps.")
+            return EditorError("Redo", "No more redo steps available.", INFORMATION)
+        image = self.history.redo()
+        print("Redo applied.")
+        return image
+
+    def autosave_path(self):
+        if self.current_filename is None:
+            return None
+        return os.path.join(self.edits_directory, self.current_filename)
+
+    def save_image(self, path=None, profile=None, image=None):
+        # image: what to write, e.g. taken on a worker thread; by default the current
+        # image, decoded at full resolution first
+        if self.image is None:
+            print("No image to save.")
+            return EditorError("Save Error", "No image to save.", WARNING)
+
+        final_save_path = path if path else self.autosave_path()
+        if not final_save_path:
+            print("Cannot determine save path.")
+            return EditorError("Save Error", "Cannot determine a valid save path.", WARNING)
+
+        if profile is None:
+            profile = self.export_profile if path else self.autosave_profile
+        try:
+            if image is None:
+                image = self.image if self.is_full_resolution() else self.ensure_full_image()
+            key = export_profiles.output_key(self.render_key(self.recipe()), profile)
+            if self.render_cache is not None and self.render_cache.skip_write(final_save_path, key):
+                print(f"Image unchanged since last saved to: {final_save_path}")
+                return None
+            write_image(image, final_save_path, profile)
+            if key is not None:
+                self.render_cache.record_output(final_save_path, key)
+            print(f"Image saved to: {final_save_path}")
+            return None
+        except PermissionError:
+            print(f"Permission denied saving image to {final_save_path}")
+            return EditorError("Save Error", f"Permission denied to save to: {final_save_path}\nPlease choose a different location.")
+        except Exception as e:
+            print(f"Error saving image to {final_save_path}: {e}")
+            return EditorError("Save Error", f"An error occurred while saving image to {final_save_path}: {e}")
+
+    def filter_renderer(self, filter_name, slider_value=image_ops.DEFAULT_FILTER_VALUE):
+        # Returns (render(base) -> image, lossless transpose or None), or an EditorError
+        if filter_name == "Original":
+            if not self.original_image and self.is_full_resolution():
+                print("Original image not available.")
+                return EditorError("Original Image", "Original image not available for reset.", WARNING)
+            # Read at render time: the original may still be waiting on its full decode
+            return (lambda base: self.original_image), None
+
+        filter_function = image_ops.get_filter_function(filter_name)
+        if filter_function is None:
+            print(f"Unknown filter: {filter_name}")
+            return EditorError("Unknown Filter", f"Unknown filter selected: {filter_name}", WARNING)
+        return (lambda base: filter_function(base, slider_value)), self.lossless_transpose(filter_name, slider_value)
+
+    def lossless_transpose(self, filter_name, value):
+        # Filters whose result is an exact transpose of the history entry can be
+        # stored as a recipe instead of pixels
+        if filter_name == "Mirror" and value > 50:
+            return Image.Transpose.FLIP_LEFT_RIGHT
+        if filter_name == "Left" and value == 100:
+            return Image.Transpose.ROTATE_270
+        if filter_name == "Right" and value == 100:
+            return Image.Transpose.ROTATE_90
+        return None
+
+    def validate_crop(self, x, y, width, height):
+        if self.image is None:
+            return EditorError("No Image", "No image loaded to crop.", WARNING)
+        # Ensure crop box is within image bounds
+        img_width, img_height = self.image_size()
+        if x < 0 or y < 0 or x + width > img_width or y + height > img_height:
+            return EditorError("Invalid Crop Area", "Crop area is outside image boundaries.", WARNING)
+        return None
+
+    def recipe(self):
+        return self.history.current_steps()
+
+    def render_key(self, steps):
+        # Disk cache key of this file with steps applied, or None without a cache
+        if self.render_cache is None or self.current_filepath is None:
+            return None
+        try:
+            return self.render_cache.key(self.current_filepath, steps)
+        except OSError as e:
+            print(f"[EditorCore.render_key] Could not hash '{self.current_filepath}': {e}")
+            return None
+
+    def _cached_render(self, steps):
+        key = self.render_key(steps) if steps else None
+        image = self.render_cache.get(key) if key is not None else None
+        return key, image
+
+    def render_commit(self, render, step, transpose=None):
+        # Renders step on top of the current history entry (previous) and appends the
+        # result after it, dropping any redo steps; the new entry becomes the current
+        # one. self.image is left to the caller. The Qt Editor runs this on its
+        # render worker.
+        base = self.ensure_full_image()
+        previous = self.history.current_entry()
+        name, argument = step
+        steps = edit_recipe.append_step(previous.steps, name, argument)
+        key, image = self._cached_render(steps)
+        with tracer.span("filter", base, op=name, cached=image is not None) as span:
+            if image is None:
+                image = render(base)
+                if key is not None:
+                    self.render_cache.put(key, image)
+            span.output(image)
+        self.recipe_cache.put(steps, image)
+        self.add_to_history(image, transpose, steps, previous)
+        return image
+
+    def render_recipe_change(self, change, label):
+        # change maps the current recipe to a new one, which is rebuilt from the
+        # original through the longest cached prefix it shares with earlier edits
+        self.ensure_full_image()
+        previous = self.history.current_entry()
+        steps = change(previous.steps)
+        key, image = self._cached_render(steps)
+        with tracer.span("filter", self.original_image, op=label, cached=image is not None) as span:
+            if image is None:
+                image = self.recipe_cache.render(self.original_image, steps)
+                if key is not None:
+                    self.render_cache.put(key, image)
+            else:
+                self.recipe_cache.put(steps, image)
+            span.output(image)
+        self.add_to_history(image, None, steps, previous)
+        return image
+
+    def save_recipe(self, path):
+        try:
+            edit_recipe.save_recipe(path, self.recipe())
+            print(f"Recipe saved to: {path}")
+            return None
+        except OSError as e:
+            print(f"Error saving recipe to {path}: {e}")
+            return EditorError("Save Error", f"An error occurred while saving the recipe to {path}: {e}")
@@ -0,0 +1,43 @@
+# Named encoder settings for exports and autosaves, by Pillow format name.
+# Formats a profile does not mention are saved with Pillow's defaults.
+# benchmarks/bench_export.py measures them; on a 12 MP photo-like image PNG time
+# is almost all zlib: Pillow's default level 6 took 4-5 s for 6.6 MB, level 3
+# about 2 s for 19% more bytes, level 1 about 1.2 s for 37% more, and level 9
+# over a minute for 11% fewer bytes, which only archival copies are worth.
+
+FAST_PREVIEW = "fast-preview"
+BALANCED = "balanced"
+ARCHIVAL = "archival"
+
+PROFILES = {
+    FAST_PREVIEW: {
+        "PNG": {"compress_level": 1},
+        "JPEG": {"quality": 80, "subsampling": "4:2:0"},
+        "WEBP": {"quality": 80, "method": 0},
+    },
+    BALANCED: {
+        "PNG": {"compress_level": 3},
+        "JPEG": {"quality": 95, "subsampling": "4:2:0"},
+        "WEBP": {"quality": 90, "method": 4},
+    },
+    ARCHIVAL: {
+        "PNG": {"compress_level": 9, "optimize": True},
+        "JPEG": {"quality": 95, "subsampling": "4:4:4", "progressive": True, "optimize": True},
+        "WEBP": {"lossless": True, "method": 6},
+    },
+}
+PROFILE_NAMES = list(PROFILES)
+DEFAULT_PROFILE = BALANCED
+
+
+def encoder_options(profile, image_format):
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown export profile: '{profile}'")
+    return dict(PROFILES[profile].get(image_format, {}))
+
+
+def output_key(render_key, profile):
+    # The same render written with another profile is a different file
+    if render_key is None:
+        return None
+    return f"{render_key}:{profile}"
@@ -0,0 +1,262 @@
+import os
+import threading
+import time
+
+from PyQt5.QtCore import QAbstractListModel, QFileSystemWatcher, QModelIndex, Qt, QTimer, QObject, pyqtSignal
+from PyQt5.QtWidgets import QListView
+
+# The folder list for directories of any size. A background thread walks the
+# directory with os.scandir and hands names to the model in batches, so the first
+# rows show while a 200k-file folder is still being read; the view is a
+# QListView with uniform rows, which only lays out and paints the rows on screen.
+# QFileSystemWatcher keeps the list current: it only says that the directory
+# changed, so a background rescan is diffed against the model and just the added
+# and removed rows are inserted or taken out.
+
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.svg', '.bmp', '.tiff'})
+SCAN_BATCH_SIZE = 2000
+# A batch is also handed over after this long, so a slow disk still shows progress
+SCAN_BATCH_SECONDS = 0.1
+# Bursts of changes (a copy of many files) are coalesced into one rescan
+RESCAN_DELAY_MS = 300
+
+
+def is_image_file(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+class DirectoryScanner(QObject):
+    # Emitted from the scan thread; Qt queues them onto the GUI thread
+    names_found = pyqtSignal(int, object)
+    scan_finished = pyqtSignal(int, object)
+    scan_failed = pyqtSignal(int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def scan(self, directory, stream=True):
+        # Starts a scan and returns its generation; any scan still running stops.
+        # stream=False reports nothing until scan_finished, which carries every name.
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        threading.Thread(target=self._scan, args=(directory, generation, stream),
+                         name="directory-scan", daemon=True).start()
+        return generation
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+
+    def _is_current(self, generation):
+        with self._lock:
+            return generation == self._generation
+
+    def _scan(self, directory, generation, stream):
+        names = []
+        batch = []
+        last_batch = time.monotonic()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not is_image_file(entry.name) or not entry.is_file():
+                        continue
+                    names.append(entry.name)
+                    if not stream:
+                        continue
+                    batch.append(entry.name)
+                    if len(batch) >= SCAN_BATCH_SIZE or time.monotonic() - last_batch >= SCAN_BATCH_SECONDS:
+                        if not self._is_current(generation):
+                            return
+                        self.names_found.emit(generation, batch)
+                        batch = []
+                        last_batch = time.monotonic()
+        except OSError as e:
+            if self._is_current(generation):
+                self.scan_failed.emit(generation, e)
+            return
+        if not self._is_current(generation):
+            return
+        if batch:
+            self.names_found.emit(generation, batch)
+        self.scan_finished.emit(generation, names)
+
+
+class FileListModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._names = []
+        # Row of each name; rebuilt lazily after rows are removed
+        self._rows = {}
+        self._icons = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._names):
+            return None
+        if role == Qt.DisplayRole:
+            return self._names[index.row()]
+        if role == Qt.DecorationRole:
+            return self._icons.get(self._names[index.row()])
+        return None
+
+    def filename(self, row):
+        return self._names[row] if 0 <= row < len(self._names) else None
+
+    def names(self):
+        return self._names
+
+    def row_of(self, name):
+        if self._rows is None:
+            self._rows = {name: row for row, name in enumerate(self._names)}
+        return self._rows.get(name, -1)
+
+    def clear(self):
+        self.beginResetModel()
+        self._names = []
+        self._rows = {}
+        self._icons = {}
+        self.endResetModel()
+
+    def append_names(self, names):
+        if not names:
+            return
+        first = len(self._names)
+        self.beginInsertRows(QModelIndex(), first, first + len(names) - 1)
+        self._names.extend(names)
+        if self._rows is not None:
+            self._rows.update((name, first + offset) for offset, name in enumerate(names))
+        self.endInsertRows()
+
+    def remove_names(self, names):
+        rows = sorted((row for row in (self.row_of(name) for name in names) if row >= 0), reverse=True)
+        # Contiguous rows go out as one range, last range first so earlier rows keep their numbers
+        index = 0
+        while index < len(rows):
+            last = first = rows[index]
+            index += 1
+            while index < len(rows) and rows[index] == first - 1:
+                first = rows[index]
+                index += 1
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._names[first:last + 1]
+            self.endRemoveRows()
+        for name in names:
+            self._icons.pop(name, None)
+        if rows:
+            self._rows = None
+
+    def set_icon(self, name, icon):
+        row = self.row_of(name)
+        if row < 0:
+            return
+        self._icons[name] = icon
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class FileListView(QListView):
+    # Stands in for the QListWidget the folder list used to be
+    current_filename_changed = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setModel(FileListModel(self))
+        # With uniform rows the view never measures the rows it does not show
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(SCAN_BATCH_SIZE)
+        self.selectionModel().currentChanged.connect(self._current_changed)
+
+    def count(self):
+        return self.model().rowCount()
+
+    def filename(self, row):
+        return self.model().filename(row)
+
+    def currentRow(self):
+        index = self.currentIndex()
+        return index.row() if index.isValid() else -1
+
+    def setCurrentRow(self, row):
+        self.setCurrentIndex(self.model().index(row))
+
+    def current_filename(self):
+        return self.filename(self.currentRow())
+
+    def _current_changed(self, current, previous):
+        self.current_filename_changed.emit(self.model().filename(current.row()) if current.isValid() else None)
+
+
+class DirectoryWatcher(QObject):
+    # Keeps a FileListModel in step with the directory it lists
+    changed = pyqtSignal(object, object)
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.directory = ""
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._schedule_rescan)
+        self._scanner = DirectoryScanner(self)
+        self._scanner.scan_finished.connect(self._apply_rescan)
+        self._rescan_generation = None
+        # While the first scan still fills the model a rescan would diff against a
+        # partial list; changes seen meanwhile are rescanned once it is done
+        self._paused = False
+        self._missed_change = False
+        self._rescan_timer = QTimer(self)
+        self._rescan_timer.setSingleShot(True)
+        self._rescan_timer.setInterval(RESCAN_DELAY_MS)
+        self._rescan_timer.timeout.connect(self._rescan)
+
+    def watch(self, directory, paused=False):
+        self.stop()
+        self.directory = directory
+        self._paused = paused
+        if directory:
+            self._watcher.addPath(directory)
+
+    def resume(self):
+        self._paused = False
+        if self._missed_change:
+            self._missed_change = False
+            self._rescan_timer.start()
+
+    def stop(self):
+        if self._watcher.directories():
+            self._watcher.removePaths(self._watcher.directories())
+        self._rescan_timer.stop()
+        self._scanner.cancel()
+        self._rescan_generation = None
+        self._missed_change = False
+        self.directory = ""
+
+    def _schedule_rescan(self, path):
+        if path != self.directory:
+            return
+        if self._paused:
+            self._missed_change = True
+        else:
+            self._rescan_timer.start()
+
+    def _rescan(self):
+        self._rescan_generation = self._scanner.scan(self.directory, stream=False)
+
+    def _apply_rescan(self, generation, names):
+        if generation != self._rescan_generation:
+            return
+        current = set(names)
+        known = set(self.model.names())
+        removed = known - current
+        # New files keep the order the directory listed them in
+        added = [name for name in names if name not in known]
+        self.model.remove_names(removed)
+        self.model.append_names(added)
+        if added or removed:
+            print(f"[DirectoryWatcher] {self.directory}: {len(added)} added, {len(removed)} removed.")
+            self.changed.emit(added, removed)
@@ -0,0 +1,178 @@
+import math
+
+from PIL import Image
+
+# Rotations, mirroring, crops and resizes all map output pixels back to source
+# pixels through an affine transform. A run of them is composed into one matrix
+# and rendered in a single pass that only produces the output pixels, instead of
+# resampling (and softening) the whole image once per op. When the composite is
+# axis-aligned, which covers mirrors, quarter turns, crops and resizes, it runs as
+# a crop or one LANCZOS resize of just the source box plus at most one lossless
+# transpose, so single ops give exactly what the individual functions give.
+
+GEOMETRIC_OPS = ["Left", "Right", "Mirror", "Resize", "Crop"]
+
+# Matrices are (a, b, c, d, e, f): output (u, v) samples source (a*u + b*v + c, d*u + e*v + f)
+_IDENTITY = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+
+# (flip x, flip y, swap axes) of an axis-aligned composite -> the single transpose doing it
+_TRANSPOSES = {
+    (False, False, False): None,
+    (True, False, False): Image.Transpose.FLIP_LEFT_RIGHT,
+    (False, True, False): Image.Transpose.FLIP_TOP_BOTTOM,
+    (True, True, False): Image.Transpose.ROTATE_180,
+    (False, False, True): Image.Transpose.TRANSPOSE,
+    (True, False, True): Image.Transpose.ROTATE_90,
+    (False, True, True): Image.Transpose.ROTATE_270,
+    (True, True, True): Image.Transpose.TRANSVERSE,
+}
+
+
+def _compose(outer, inner):
+    # The matrix that applies inner first, then outer
+    a, b, c, d, e, f = outer
+    ia, ib, ic, id_, ie, if_ = inner
+    return (a * ia + b * id_, a * ib + b * ie, a * ic + b * if_ + c,
+            d * ia + e * id_, d * ib + e * ie, d * ic + e * if_ + f)
+
+
+def _rotation(size, angle):
+    # Same matrix and expanded size as Image.rotate(angle, expand=True)
+    width, height = size
+    angle = angle % 360.0
+    if angle == 0:
+        return _IDENTITY, size
+    if angle == 90:
+        return (0.0, -1.0, float(width), 1.0, 0.0, 0.0), (height, width)
+    if angle == 180:
+        return (-1.0, 0.0, float(width), 0.0, -1.0, float(height)), size
+    if angle == 270:
+        return (0.0, 1.0, 0.0, -1.0, 0.0, float(height)), (height, width)
+
+    radians = -math.radians(angle)
+    a, b = round(math.cos(radians), 15), round(math.sin(radians), 15)
+    d, e = round(-math.sin(radians), 15), round(math.cos(radians), 15)
+    center_x, center_y = width / 2, height / 2
+    c = a * -center_x + b * -center_y + center_x
+    f = d * -center_x + e * -center_y + center_y
+
+    xs, ys = [], []
+    for x, y in ((0, 0), (width, 0), (width, height), (0, height)):
+        xs.append(a * x + b * y + c)
+        ys.append(d * x + e * y + f)
+    new_width = math.ceil(max(xs)) - math.floor(min(xs))
+    new_height = math.ceil(max(ys)) - math.floor(min(ys))
+    shift_x, shift_y = -(new_width - width) / 2.0, -(new_height - height) / 2.0
+    c, f = a * shift_x + b * shift_y + c, d * shift_x + e * shift_y + f
+    return (a, b, c, d, e, f), (new_width, new_height)
+
+
+def plan(size, ops):
+    # Returns (matrix, output size, resized) for a run of GEOMETRIC_OPS on an image of size
+    matrix = _IDENTITY
+    resized = False
+    for name, value in ops:
+        width, height = size
+        if name == "Left":
+            step, size = _rotation(size, -90 * (value / 100.0))
+        elif name == "Right":
+            step, size = _rotation(size, 90 * (value / 100.0))
+        elif name == "Mirror":
+            step = (-1.0, 0.0, float(width), 0.0, 1.0, 0.0) if value > 50 else _IDENTITY
+        elif name == "Crop":
+            x, y, crop_width, crop_height = value
+            if x < 0 or y < 0 or x + crop_width > width or y + crop_height > height:
+                raise ValueError("Crop area is outside image boundaries.")
+            step, size = (1.0, 0.0, float(x), 0.0, 1.0, float(y)), (crop_width, crop_height)
+        elif name == "Resize":
+            new_width, new_height = value
+            step, size = (width / new_width, 0.0, 0.0, 0.0, height / new_height, 0.0), (new_width, new_height)
+            resized = True
+        else:
+            raise ValueError(f"Not a geometric operation: '{name}'")
+        matrix = _compose(matrix, step)
+    return matrix, size, resized
+
+
+def _snap(value):
+    nearest = round(value)
+    return nearest if abs(value - nearest) < 1e-6 else value
+
+
+def _apply_axis_aligned(image, matrix, size):
+    a, b, c, d, e, f = matrix
+    width, height = size
+    swap = a == 0
+    if swap:
+        # Output rows walk source columns: resample in source orientation, transpose after
+        scale_x, scale_y, source_size = b, d, (height, width)
+    else:
+        scale_x, scale_y, source_size = a, e, (width, height)
+    x0, x1 = sorted((c, c + scale_x * source_size[0]))
+    y0, y1 = sorted((f, f + scale_y * source_size[1]))
+    box = tuple(_snap(value) for value in (x0, y0, x1, y1))
+
+    transpose = _TRANSPOSES[(scale_x < 0, scale_y < 0, swap)]
+    exact = all(isinstance(value, int) for value in box) and (box[2] - box[0], box[3] - box[1]) == source_size
+    if exact and box == (0, 0) + image.size:
+        return image.transpose(transpose) if transpose is not None else image
+    # Cropping to the covering pixels first keeps resize() from converting the whole
+    # source (RGBA is premultiplied first) and matches a crop followed by a resize
+    covering = (math.floor(box[0]), math.floor(box[1]), math.ceil(box[2]), math.ceil(box[3]))
+    result = image.crop(covering)
+    if not exact:
+        box = (box[0] - covering[0], box[1] - covering[1], box[2] - covering[0], box[3] - covering[1])
+        result = result.resize(source_size, Image.Resampling.LANCZOS, box=box)
+    return result.transpose(transpose) if transpose is not None else result
+
+
+def _apply_affine(image, matrix, size, resample):
+    a, b, c, d, e, f = matrix
+    # transform() does not antialias, so a big downscale first goes through an
+    # integer box reduce of just the source area the output covers
+    factor = int(math.sqrt(abs(a * e - b * d))) if resample != Image.Resampling.NEAREST else 1
+    if factor >= 2:
+        width, height = size
+        corners = [(a * u + b * v + c, d * u + e * v + f) for u, v in ((0, 0), (width, 0), (width, height), (0, height))]
+        left = max(int(min(x for x, _ in corners)) // factor * factor, 0)
+        top = max(int(min(y for _, y in corners)) // factor * factor, 0)
+        right = min(math.ceil(max(x for x, _ in corners)), image.width)
+        bottom = min(math.ceil(max(y for _, y in corners)), image.height)
+        if right > left and bottom > top:
+            image = image.reduce(factor, box=(left, top, right, bottom))
+            matrix = (a / factor, b / factor, (c - left) / factor, d / factor, e / factor, (f - top) / factor)
+    return image.transform(size, Image.Transform.AFFINE, matrix, resample)
+
+
+def _is_free_rotation(name, value):
+    return name in ("Left", "Right") and (90 * (value / 100.0)) % 90 != 0
+
+
+def _exposing_crop(ops):
+    # Index of the last Crop that a later free rotation would look past: the
+    # rotation's expanded corners must be black, not the pixels the crop removed
+    crop = cut = None
+    for index, (name, value) in enumerate(ops):
+        if name == "Crop":
+            crop = index
+        elif crop is not None and _is_free_rotation(name, value):
+            cut = crop
+    return cut
+
+
+def apply_geometry_ops(image, ops):
+    # ops: [(name, value)] with names from GEOMETRIC_OPS, applied in order
+    if not ops:
+        return image
+    cut = _exposing_crop(ops)
+    if cut is not None:
+        image = apply_geometry_ops(image, ops[:cut + 1])
+        ops = ops[cut + 1:]
+    matrix, size, resized = plan(image.size, ops)
+    a, b, c, d, e, f = matrix
+    if (b == 0 and d == 0) or (a == 0 and e == 0):
+        return _apply_axis_aligned(image, matrix, size)
+    # Free rotations sample nearest-neighbour like Image.rotate; with a resize in
+    # the run the composite is interpolated instead
+    resample = Image.Resampling.BICUBIC if resized else Image.Resampling.NEAREST
+    return _apply_affine(image, matrix, size, resample)
@@ -1,297 +1,633 @@
 import os
-from PIL import Image, ImageEnhance, ImageFilter
-from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import QBuffer, QIODevice
-import io
+import collections
+from PIL import Image
+from PyQt5.QtCore import QObject, pyqtSignal
 from PyQt5.QtWidgets import QMessageBox
+from image_history import DEFAULT_MEMORY_BUDGET
+from render_worker import RenderWorker
+from autosave import AutosaveQueue
+from render_cache import RenderCache
+from editor_core import EditorCore, EditorError, WARNING, INFORMATION
+from image_prefetcher import ImagePrefetcher, decode_for_display
+from instrumentation import tracer
+import draft_render
+import edit_recipe
+import image_ops
+import image_viewer
+import renditions
+
+# JPEGs are decoded at roughly this size for display and previews; their full
+# resolution is only decoded once an edit is committed or the image is exported
+DISPLAY_DECODE_SIZE = (1024, 1024)
+
+class _AutosaveErrorRelay(QObject):
+    # Autosave errors are raised on the writer thread; this hops them to the GUI thread
+    failed = pyqtSignal(str, object)
 
 class Editor:
-    def __init__(self, ui):
-        self.ui = ui
-        self.image = None
-        self.original_image = None
-        self.image_history = []
-        self.history_index = -1
-        self.current_filename = None
-        self.current_filepath = None
-        
-        self.edits_directory = "edits"
-        if not os.path.exists(self.edits_directory):
-            try:
-                os.makedirs(self.edits_directory)
-            except OSError as e:
-                QMessageBox.critical(self.ui, "Directory Error", f"Could not create 'edits' directory: {e}")
-                print(f"Error creating edits directory: {e}")
+    # Qt adapter over EditorCore: owns the widgets, the render worker and the
+    # autosave queue, and turns EditorError results into message boxes.
 
-        self.filters_with_parameters = [
-            "Left", "Right", "Mirror", "Sharpen", "Color", "Contrast", "Blur"
-        ]
+    def __init__(self, ui, history_memory_budget=DEFAULT_MEMORY_BUDGET, render_cache_directory=None,
+                 progressive=True):
+        self.ui = ui
+        # The on-disk render cache is opt-in: it is only kept with a render_cache_directory
+        self.render_cache = RenderCache(render_cache_directory) if render_cache_directory else None
+        self.core = EditorCore(history_memory_budget=history_memory_budget, render_cache=self.render_cache)
+        self.prefetcher = ImagePrefetcher(decode=lambda path: decode_for_display(path, DISPLAY_DECODE_SIZE))
+
+        # Downscaled copy of the current history entry, used for slider previews
+        self.preview_proxy = None
+        self._preview_proxy_source = None
+        self._preview_proxy_size = None
+
+        # Pixel work runs on the render worker; commits are handed to it one at a
+        # time so each starts from the history entry the previous one produced
+        self.render_worker = RenderWorker()
+        self._pending_commits = collections.deque()
+        self._commit_in_flight = False
+        # (image, viewer pyramid) of the last finished commit, built on the worker
+        self._commit_pyramid = None
+
+        # Progressive display: a committed edit is shown at once as a small draft,
+        # then refined at display size on a second worker, then replaced by the full
+        # render. Drafts start from frames of the last finished commit plus the steps
+        # of the commits still queued; a step of None (recipe changes, reset) cannot
+        # be drafted and the display waits for that commit.
+        self.progressive = progressive
+        self.refine_worker = RenderWorker()
+        self._draft_bases = None
+        self._draft_steps = collections.deque()
+
+        self._autosave_errors = _AutosaveErrorRelay()
+        self._autosave_errors.failed.connect(self._show_autosave_error)
+        self.autosave = AutosaveQueue(on_error=self._autosave_errors.failed.emit, render_cache=self.render_cache)
+
+        self.show_error(self.core.ensure_edits_directory())
+
+        self.filters_with_parameters = self.core.filters_with_parameters
+
+    @property
+    def image(self):
+        return self.core.image
+
+    @image.setter
+    def image(self, image):
+        self.core.image = image
+
+    @property
+    def original_image(self):
+        return self.core.original_image
+
+    def image_size(self):
+        return self.core.image_size()
+
+    @property
+    def history(self):
+        return self.core.history
+
+    @property
+    def current_filename(self):
+        return self.core.current_filename
+
+    @property
+    def current_filepath(self):
+        return self.core.current_filepath
+
+    @property
+    def edits_directory(self):
+        return self.core.edits_directory
+
+    def show_error(self, error):
+        if error is None:
+            return
+        if error.level == INFORMATION:
+            QMessageBox.information(self.ui, error.title, error.message)
+        elif error.level == WARNING:
+            QMessageBox.warning(self.ui, error.title, error.message)
+        else:
+            QMessageBox.critical(self.ui, error.title, error.message)
 
     def load_image(self, filename):
-        full_path = os.path.join(self.ui.current_working_directory, filename)
-        print(f"[Editor.load_image] Attempting to load: {filename}")
         print(f"[Editor.load_image] Current working directory: '{self.ui.current_working_directory}'")
-        print(f"[Editor.load_image] Full image path: '{full_path}'")
-
-        try:
-            pil_image = Image.open(full_path)
-            
-            self.clear_history() 
-
-            self.original_image = pil_image.copy() # Store a copy of the original
-            self.image = pil_image.copy() # Set current image to the loaded one
-            self.current_filename = filename
-            self.current_filepath = full_path
-
-            self.add_to_history(self.image) # Add initial state to history
+        self.cancel_renders()
+        self.clear_preview_proxy()
+        error = self.core.load_image(self.ui.current_working_directory, filename, self.prefetcher.get)
+        if error:
+            self.show_error(error)
+            self.ui.picture_box.setText(error.status)
+        else:
             self.show_image_in_box()
-            print("[Editor.load_image] Image loaded successfully and added to history.")
-
-        except FileNotFoundError:
-            QMessageBox.critical(self.ui, "File Not Found", f"Image file not found: {full_path}")
-            self.ui.picture_box.setText("Image not found.")
-            self._reset_image_state()
-        except Image.UnidentifiedImageError:
-            QMessageBox.critical(self.ui, "Unsupported Image Type", f"Could not open image. The file format might be unsupported or corrupted: {filename}")
-            self.ui.picture_box.setText("Unsupported or corrupted image.")
-            self._reset_image_state()
-        except Exception as e:
-            QMessageBox.critical(self.ui, "Loading Error", f"An error occurred while loading image '{filename}': {e}")
-            self.ui.picture_box.setText("Error loading image.")
-            self._reset_image_state()
+        stats = self.prefetcher.stats()
+        print(f"[Editor.load_image] Prefetch hit rate {stats['hit_rate']:.0%}, "
+              f"{stats['entries']} images cached ({stats['bytes'] / (1024 * 1024):.1f} MB)")
+        if self.render_cache is not None:
+            stats = self.render_cache.stats()
+            print(f"[Editor.load_image] Render cache: {stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['writes_skipped']} unchanged saves skipped ({stats['bytes'] / (1024 * 1024):.1f} MB on disk)")
+
+    def prefetch_images(self, filenames):
+        # Nearest neighbours first; anything queued from an earlier position is dropped
+        directory = self.ui.current_working_directory
+        self.prefetcher.prefetch([os.path.join(directory, filename) for filename in filenames])
 
     def _reset_image_state(self):
-        self.image = None
-        self.original_image = None
-        self.current_filename = None
-        self.current_filepath = None
-        self.clear_history()
-
-    def add_to_history(self, image_state):
-        if self.history_index < len(self.image_history) - 1:
-            self.image_history = self.image_history[:self.history_index + 1]
-        
-        self.image_history.append(image_state.copy())
-        self.history_index = len(self.image_history) - 1
-        print("Image state added to history.")
+        self.cancel_renders()
+        self.clear_preview_proxy()
+        self.core.reset()
+
+    def add_to_history(self, image_state, transpose=None, steps=()):
+        self.core.add_to_history(image_state, transpose, steps)
 
     def clear_history(self):
-        self.image_history = []
-        self.history_index = -1
-        print("Image history cleared.")
+        self.core.clear_history()
+        self.clear_preview_proxy()
+
+    def get_history_memory_usage(self):
+        return self.core.history_memory_usage()
 
     def undo(self):
-        if self.history_index > 0:
-            self.history_index -= 1
-            self.image = self.image_history[self.history_index].copy()
-            self.show_image_in_box()
-            print("Undo applied.")
-        else:
-            QMessageBox.information(self.ui, "Undo", "No more undo steps available.")
-            print("No more undo steps.")
+        self._queue_history_move(self.core.undo, "Undo")
 
     def redo(self):
-        if self.history_index < len(self.image_history) - 1:
-            self.history_index += 1
-            self.image = self.image_history[self.history_index].copy()
-            self.show_image_in_box()
-            print("Redo applied.")
-        else:
-            QMessageBox.information(self.ui, "Redo", "No more redo steps available.")
-            print("No more redo steps.")
-
-    def show_image_in_box(self):
-        if self.image:
-            # Convert PIL Image to QPixmap for display in QLabel
-            image_bytes = io.BytesIO()
-            # Save as PNG to support transparency if present, then convert to QPixmap
+        self._queue_history_move(self.core.redo, "Redo")
+
+    def _queue_history_move(self, move, label):
+        # Queued behind pending commits like an edit: moving the history while one
+        # renders would record it after the wrong entry
+        self._drop_drafts()
+
+        def run():
+            result = move()
+            if isinstance(result, EditorError):
+                raise result
+            return result
+
+        def finish(image):
+            self.image = image
+            self._show_commit()
+
+        def fail(e):
+            if isinstance(e, EditorError):
+                self.show_error(e)
+            else:
+                QMessageBox.critical(self.ui, f"{label} Error", f"An error occurred during {label.lower()}: {e}")
+                print(f"Error during {label.lower()}: {e}")
+
+        self._queue_commit(run, finish, fail)
+
+    def _preview_target_size(self):
+        box = self.ui.picture_box
+        ratio = box.devicePixelRatioF()
+        return (max(int(box.width() * ratio), 1), max(int(box.height() * ratio), 1))
+
+    def get_preview_proxy(self, source, target_size):
+        if self.preview_proxy is not None and self._preview_proxy_source is source and self._preview_proxy_size == target_size:
+            return self.preview_proxy
+
+        proxy = source
+        if source.width > target_size[0] or source.height > target_size[1]:
+            # Same result as thumbnail(), which would resize a full copy of the shared source in place
+            ratio = min(target_size[0] / source.width, target_size[1] / source.height)
+            size = (max(round(source.width * ratio), 1), max(round(source.height * ratio), 1))
+            proxy = source.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        self.preview_proxy = proxy
+        self._preview_proxy_source = source
+        self._preview_proxy_size = target_size
+        print(f"[Editor.get_preview_proxy] Built {proxy.size} preview proxy for {source.size} image.")
+        return proxy
+
+    def clear_preview_proxy(self):
+        self.preview_proxy = None
+        self._preview_proxy_source = None
+        self._preview_proxy_size = None
+
+    def show_image_in_box(self, image=None, scale=None):
+        # scale: full-resolution pixels per pixel of image, for previews and reduced
+        # decodes; the viewer draws them at the size of the image they stand in for
+        image = image if image is not None else self.image
+        if image:
             try:
-                self.image.save(image_bytes, format="PNG")
-                qpixmap = QPixmap()
-                qpixmap.loadFromData(image_bytes.getvalue())
-                self.ui.picture_box.setPixmap(qpixmap)
+                if scale is None:
+                    scale = self.image_size()[0] / image.width if image is self.image else 1.0
+                pyramid = None
+                if self._commit_pyramid is not None and self._commit_pyramid[0] is image:
+                    pyramid = self._commit_pyramid[1]
+                with tracer.span("display", image):
+                    self.ui.picture_box.set_image(image, scale, pyramid)
             except Exception as e:
                 QMessageBox.critical(self.ui, "Display Error", f"Could not display image: {e}")
-                print(f"Error converting PIL image to QPixmap: {e}")
+                print(f"Error displaying image: {e}")
                 self.ui.picture_box.clear()
                 self.ui.picture_box.setText("Error displaying image.")
         else:
             self.ui.picture_box.clear()
             self.ui.picture_box.setText("Image will appear here")
 
-    def save_image(self, path=None):
-        if self.image is None:
-            print("No image to save.")
-            return False
+    def save_image(self, path=None, profile=None):
+        # profile: an export_profiles name; defaults to the core's export or autosave profile
+        if path is None and self.image is not None:
+            # Autosaves of committed edits are written behind, off the GUI thread
+            final_save_path = self.core.autosave_path()
+            if final_save_path:
+                self.autosave.submit(final_save_path, self.image, self.core.render_key(self.recipe()),
+                                     profile or self.core.autosave_profile)
+                return True
+
+        if path is not None and self.image is not None:
+            self._queue_save(path, profile)
+            return True
 
-        final_save_path = path if path else os.path.join(self.edits_directory, self.current_filename)
-        
-        if not final_save_path:
-            QMessageBox.warning(self.ui, "Save Error", "Cannot determine a valid save path.")
-            print("Cannot determine save path.")
+        error = self.core.save_image(path, profile)
+        if error:
+            if self.image is not None:
+                self.show_error(error)
             return False
+        return True
+
+    def _queue_save(self, path, profile):
+        # Save As waits for the commits queued before it, and its full decode and
+        # encode run on the worker
+        def run():
+            image = self.core.ensure_full_image()
+            return image, self.core.save_image(path, profile, image)
+
+        def finish(result):
+            image, error = result
+            if self.image is not image:
+                # The reduced decode shown until now was replaced by the full one
+                self.image = image
+            if error:
+                self.show_error(error)
+
+        def fail(e):
+            QMessageBox.critical(self.ui, "Save Error", f"An error occurred while saving image to {path}: {e}")
+            print(f"Error saving image to {path}: {e}")
+
+        print(f"Saving image to {path}")
+        self._queue_task(run, finish, fail)
+
+    def set_export_profile(self, profile):
+        self.core.export_profile = profile
+        print(f"Save As profile: {profile}")
+
+    def set_autosave_profile(self, profile):
+        self.core.autosave_profile = profile
+        print(f"Autosave profile: {profile}")
+
+    def _show_autosave_error(self, path, e):
+        if isinstance(e, PermissionError):
+            QMessageBox.critical(self.ui, "Save Error", f"Permission denied to save to: {path}\nPlease choose a different location.")
+        else:
+            QMessageBox.critical(self.ui, "Save Error", f"An error occurred while saving image to {path}: {e}")
 
-        file_extension = os.path.splitext(final_save_path)[1].lower()
+    def flush_autosave(self, timeout=None):
+        print("Flushing pending autosaves...")
+        return self.autosave.flush(timeout)
 
-        try:
-            if file_extension in ['.jpg', '.jpeg']:
-                if self.image.mode == 'RGBA':
-                    rgb_image = Image.new("RGB", self.image.size, (255, 255, 255))
-                    rgb_image.paste(self.image, mask=self.image.split()[3])
-                    rgb_image.save(final_save_path, quality=95)
-                else:
-                    self.image.save(final_save_path, quality=95)
-                print(f"Image saved to: {final_save_path} (converted to RGB for JPEG)")
-            else:
-                self.image.save(final_save_path)
-                print(f"Image saved to: {final_save_path}")
-            return True
-        except PermissionError:
-            QMessageBox.critical(self.ui, "Save Error", f"Permission denied to save to: {final_save_path}\nPlease choose a different location.")
-            print(f"Permission denied saving image to {final_save_path}")
-            return False
-        except Exception as e:
-            QMessageBox.critical(self.ui, "Save Error", f"An error occurred while saving image to {final_save_path}: {e}")
-            print(f"Error saving image to {final_save_path}: {e}")
-            return False
+    def _get_filter_function(self, filter_name, scale=1.0):
+        return image_ops.get_filter_function(filter_name, scale)
 
     def apply_filter(self, filter_name, slider_value=50, is_slider_change=False):
         if self.image is None:
             print("No image loaded to apply filter.")
             return
 
-        temp_image = self.image_history[self.history_index].copy()
+        if is_slider_change:
+            self.preview_filter(filter_name, slider_value)
+            return
 
-        filter_function = None
-        try:
+        renderer = self.core.filter_renderer(filter_name, slider_value)
+        if isinstance(renderer, EditorError):
+            self.show_error(renderer)
+            return
+        render, transpose = renderer
+
+        def finish(image):
+            self.image = image
+            self._show_commit()
+            self.save_image()
             if filter_name == "Original":
-                if self.original_image:
-                    temp_image = self.original_image.copy()
-                else:
-                    QMessageBox.warning(self.ui, "Original Image", "Original image not available for reset.")
-                    print("Original image not available.")
-                    return
-            elif filter_name == "Left":
-                filter_function = lambda img, val: self.apply_left(img, val)
-            elif filter_name == "Right":
-                filter_function = lambda img, val: self.apply_right(img, val)
-            elif filter_name == "Mirror":
-                filter_function = lambda img, val: self.apply_mirror(img, val)
-            elif filter_name == "Sharpen":
-                filter_function = lambda img, val: self.apply_sharpen(img, val)
-            elif filter_name == "B/W":
-                filter_function = lambda img, val: self.apply_grayscale(img)
-            elif filter_name == "Color":
-                filter_function = lambda img, val: self.apply_color(img, val)
-            elif filter_name == "Contrast":
-                filter_function = lambda img, val: self.apply_contrast(img, val)
-            elif filter_name == "Blur":
-                filter_function = lambda img, val: self.apply_blur(img, val)
+                print("Reset to original image. (Saved and added to history)")
             else:
-                QMessageBox.warning(self.ui, "Unknown Filter", f"Unknown filter selected: {filter_name}")
-                print(f"Unknown filter: {filter_name}")
-                return
+                print(f"Applied filter: {filter_name} with value {slider_value}. (Saved and added to history)")
 
-            if filter_function:
-                if filter_name == "B/W":
-                    self.image = filter_function(temp_image, None)
-                else:
-                    self.image = filter_function(temp_image, slider_value)
-                
-                self.show_image_in_box()
-
-                if not is_slider_change:
-                    self.add_to_history(self.image)
-                    self.save_image() 
-                    print(f"Applied filter: {filter_name} with value {slider_value}. (Saved and added to history)")
-                else:
-                    print(f"Applied filter: {filter_name} with value {slider_value}. (Preview only)")
-            elif filter_name == "Original":
-                self.add_to_history(self.image)
-                self.save_image()
-                print("Reset to original image. (Saved and added to history)")
-        except Exception as e:
+        def fail(e):
             QMessageBox.critical(self.ui, "Filter Error", f"An error occurred while applying '{filter_name}' filter: {e}")
             print(f"Error applying filter {filter_name}: {e}")
-            self.image = self.image_history[self.history_index].copy() 
+            current = self.history.current()
+            if current is not None:
+                self.image = current
             self.show_image_in_box()
 
+        step = (filter_name, slider_value) if filter_name != edit_recipe.RESET_STEP else None
+        self._queue_commit(lambda: self.core.render_commit(render, (filter_name, slider_value), transpose), finish, fail, step)
+
+    def preview_filter(self, filter_name, slider_value):
+        # Slider previews run on the display-sized proxy only; the full-resolution
+        # render happens once, when the slider is released. Superseded slider
+        # values are dropped by the render worker.
+        if self._get_filter_function(filter_name) is None:
+            print(f"Unknown filter for preview: {filter_name}")
+            return
+        # Before the first commit of a large file this is still its reduced decode
+        source = self.history.current() if self.core.is_full_resolution() else self.image
+        full_width = self.core.image_size()[0]
+        target_size = self._preview_target_size()
+
+        def render():
+            proxy = self.get_preview_proxy(source, target_size)
+            filter_function = self._get_filter_function(filter_name, proxy.width / full_width)
+            with tracer.span("preview", proxy, op=filter_name):
+                return filter_function(proxy, slider_value), full_width / proxy.width
+
+        def finish(result):
+            preview, scale = result
+            self.show_image_in_box(preview, scale)
+            print(f"Applied filter: {filter_name} with value {slider_value}. (Preview only)")
+
+        def fail(e):
+            print(f"Error previewing filter {filter_name}: {e}")
+            self.show_image_in_box()
+
+        # A refinement landing later would cover the slider preview
+        self.refine_worker.cancel_all()
+        self.render_worker.submit_preview(render, finish, fail)
+
+    def _queue_commit(self, run, finish, fail, step=None):
+        # run() renders on the worker and records the history step; it starts from
+        # the entry the previous commit produced. step is the (name, argument) the
+        # commit appends, used to draft it.
+        self._pending_commits.append((run, finish, fail, True))
+        self._draft_steps.append(step)
+        if self.progressive:
+            self._show_draft()
+        if not self._commit_in_flight:
+            self._start_next_commit()
+
+    def _queue_task(self, run, finish, fail):
+        # Worker jobs that read the image without changing it (exports) wait for
+        # the commits queued before them
+        self._pending_commits.append((run, finish, fail, False))
+        if not self._commit_in_flight:
+            self._start_next_commit()
+
+    def _start_next_commit(self):
+        if not self._pending_commits:
+            self._commit_in_flight = False
+            return
+        self._commit_in_flight = True
+        run, finish, fail, changes_image = self._pending_commits.popleft()
+        on_fail = lambda e: self._end_commit(fail, e, changes_image=changes_image)
+        if not changes_image:
+            self.render_worker.submit(run, lambda value: self._end_commit(finish, value, changes_image=False), on_fail)
+            return
+
+        display_size = self._preview_target_size()
+        zoom_state = self.ui.picture_box.zoom_state()
+        progressive = self.progressive
+
+        def job():
+            # The viewer level the result is drawn from, and the draft frames cut
+            # from it, are made on the worker instead of in the next repaint
+            image = run()
+            pyramid = image_viewer.build_pyramid(image, display_size, zoom_state)
+            frames = None
+            if progressive:
+                frames = draft_render.make_frames(pyramid.fit_level(display_size), image.size, display_size)
+            return image, frames, pyramid
+
+        self.render_worker.submit(job, lambda result: self._end_commit(finish, *result), on_fail)
+
+    def _end_commit(self, handler, value, draft_bases=None, pyramid=None, changes_image=True):
+        if changes_image and self._draft_steps:
+            self._draft_steps.popleft()
+        if draft_bases is not None:
+            self._draft_bases = draft_bases
+        if pyramid is not None:
+            self._commit_pyramid = (value, pyramid)
+        try:
+            handler(value)
+        finally:
+            self._start_next_commit()
+
+    def _show_commit(self):
+        # A result with later commits queued behind it is already superseded on
+        # screen by their drafts
+        if self._draft_steps:
+            return
+        self.refine_worker.cancel_all()
+        self.show_image_in_box()
+
+    def _show_draft(self):
+        if None in self._draft_steps:
+            return
+        if self._draft_bases is None:
+            self._draft_bases = self._frames_of_current_image()
+            if self._draft_bases is None:
+                return
+        draft_base, display_base = self._draft_bases
+        steps = list(self._draft_steps)
+        try:
+            with tracer.span("draft", draft_base[0], steps=len(steps)):
+                image, logical_size = draft_render.apply_steps(draft_base, steps)
+        except Exception as e:
+            print(f"[Editor] Could not draft {steps[-1][0]}: {e}")
+            return
+        self.show_image_in_box(image, logical_size[0] / image.width)
+
+        display_size = self._preview_target_size()
+
+        def refine():
+            with tracer.span("refine", display_base[0], steps=len(steps)):
+                frame = draft_render.make_frame(display_base[0], display_base[1], display_size)
+                return draft_render.apply_steps(frame, steps)
+
+        def finish(frame):
+            # The full render may have landed first
+            if self._draft_steps:
+                image, logical_size = frame
+                self.show_image_in_box(image, logical_size[0] / image.width)
+
+        # A newer commit's refinement replaces this one if it has not started yet
+        self.refine_worker.submit_preview(refine, finish, lambda e: print(f"[Editor] Refinement failed: {e}"))
+
+    def _frames_of_current_image(self):
+        # Cut from a display-sized image that already exists, so the cost does not grow
+        # with the image: the viewer's fit level while it shows the current image,
+        # else the slider preview proxy. Without either there is no draft and the
+        # display waits for the commit.
+        box = self.ui.picture_box
+        display_size = self._preview_target_size()
+        logical_size = self.image_size()
+        source = self.history.current() if self.core.is_full_resolution() else self.image
+        level = None
+        if box.shown_image() is self.image or box.shown_image() is source:
+            level = box.built_fit_level(display_size)
+        if level is None and self.preview_proxy is not None and self._preview_proxy_source is source:
+            level = self.preview_proxy
+        if level is None:
+            return None
+        # The display frame is up to twice the display size; the refinement pass
+        # scales it down on its own thread
+        return draft_render.make_frame(level, logical_size, draft_render.DRAFT_SIZE), (level, logical_size)
+
+    def _drop_drafts(self):
+        self.refine_worker.cancel_all()
+        self._draft_bases = None
+
+    def cancel_renders(self):
+        self._pending_commits.clear()
+        self._draft_steps.clear()
+        self._commit_in_flight = False
+        self._commit_pyramid = None
+        self.render_worker.cancel_all()
+        self._drop_drafts()
+
+    def is_rendering(self):
+        return self._commit_in_flight or not self.render_worker.is_idle() or not self.refine_worker.is_idle()
+
     def apply_left(self, image_to_process, value):
-        angle = -90 * (value / 100.0)
-        return image_to_process.rotate(angle, expand=True)
+        return image_ops.apply_left(image_to_process, value)
 
     def apply_right(self, image_to_process, value):
-        angle = 90 * (value / 100.0)
-        return image_to_process.rotate(angle, expand=True)
+        return image_ops.apply_right(image_to_process, value)
 
     def apply_mirror(self, image_to_process, value):
-        if value > 50:
-            return image_to_process.transpose(Image.FLIP_LEFT_RIGHT)
-        else:
-            return image_to_process
+        return image_ops.apply_mirror(image_to_process, value)
 
     def apply_sharpen(self, image_to_process, value):
-        enhancer = ImageEnhance.Sharpness(image_to_process)
-        factor = 0.1 + (value / 100.0) * 4.9 
-        return enhancer.enhance(factor)
+        return image_ops.apply_sharpen(image_to_process, value)
 
     def apply_grayscale(self, image_to_process):
-        return image_to_process.convert("L").convert("RGB")
+        return image_ops.apply_grayscale(image_to_process)
 
     def apply_color(self, image_to_process, value):
-        enhancer = ImageEnhance.Color(image_to_process)
-        factor = value / 50.0 
-        return enhancer.enhance(factor)
+        return image_ops.apply_color(image_to_process, value)
 
     def apply_contrast(self, image_to_process, value):
-        enhancer = ImageEnhance.Contrast(image_to_process)
-        factor = value / 50.0 
-        return enhancer.enhance(factor)
+        return image_ops.apply_contrast(image_to_process, value)
 
-    def apply_blur(self, image_to_process, value):
-        radius = value / 10.0
-        return image_to_process.filter(ImageFilter.GaussianBlur(radius))
+    def apply_blur(self, image_to_process, value, scale=1.0):
+        return image_ops.apply_blur(image_to_process, value, scale)
     
     def resize_image(self, new_width, new_height):
         if self.image is None:
             print("No image loaded to resize.")
             return
 
-        try:
-            print(f"Resizing image from {self.image.size} to {new_width}x{new_height}")
-            self.image = self.image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            self.add_to_history(self.image)
-            self.show_image_in_box()
+        print(f"Resizing image from {self.image_size()} to {new_width}x{new_height}")
+
+        def finish(image):
+            self.image = image
+            self._show_commit()
             self.save_image()
             QMessageBox.information(self.ui, "Resize Success", "Image resized successfully!")
             print("Image resized successfully.")
 
-        except Exception as e:
+        def fail(e):
             QMessageBox.critical(self.ui, "Resize Error", f"An error occurred during image resizing: {e}")
             print(f"Error during image resizing: {e}")
 
+        render = lambda base: image_ops.resize_image(base, new_width, new_height)
+        step = ("Resize", (new_width, new_height))
+        self._queue_commit(lambda: self.core.render_commit(render, step), finish, fail, step)
+
     def crop_image(self, x, y, width, height):
-        if self.image is None:
-            QMessageBox.warning(self.ui, "No Image", "No image loaded to crop.")
+        error = self.core.validate_crop(x, y, width, height)
+        if error:
+            self.show_error(error)
             return
 
-        try:
-            # Ensure crop box is within image bounds
-            img_width, img_height = self.image.size
-            if x < 0 or y < 0 or x + width > img_width or y + height > img_height:
-                QMessageBox.warning(self.ui, "Invalid Crop Area", "Crop area is outside image boundaries.")
-                return
+        print(f"Cropping image from ({x}, {y}) with size ({width}, {height})")
 
-            print(f"Cropping image from ({x}, {y}) with size ({width}, {height})")
-            self.image = self.image.crop((x, y, x + width, y + height))
-            
-            self.add_to_history(self.image)
-            self.show_image_in_box()
+        def finish(image):
+            self.image = image
+            self._show_commit()
             self.save_image()
             QMessageBox.information(self.ui, "Crop Success", "Image cropped successfully!")
             print("Image cropped successfully.")
 
-        except Exception as e:
+        def fail(e):
             QMessageBox.critical(self.ui, "Crop Error", f"An error occurred during image cropping: {e}")
-            print(f"Error during image cropping: {e}")
\ No newline at end of file
+            print(f"Error during image cropping: {e}")
+
+        render = lambda base: image_ops.crop_image(base, x, y, width, height)
+        step = ("Crop", (x, y, width, height))
+        self._queue_commit(lambda: self.core.render_commit(render, step), finish, fail, step)
+
+    def export_renditions(self, output_directory, size_specs, format_specs):
+        # Sizes x formats of the current edit from one full-resolution image; adds no history step
+        if self.image is None:
+            print("No image loaded to export.")
+            return
+        try:
+            sizes = [renditions.parse_size(spec) for spec in size_specs]
+            extensions = [renditions.parse_format(spec) for spec in format_specs]
+        except ValueError as e:
+            QMessageBox.warning(self.ui, "Export Error", str(e))
+            return
+        stem = os.path.splitext(self.current_filename or "image")[0]
+        profile = self.core.export_profile
+
+        def run():
+            return renditions.export_renditions(self.core.ensure_full_image(), output_directory, stem, sizes, extensions,
+                                                profile)
+
+        def finish(failures):
+            if failures:
+                details = "\n".join(f"{path}: {error}" for path, error in failures[:10])
+                QMessageBox.critical(self.ui, "Export Error", f"{len(failures)} renditions could not be written:\n{details}")
+            else:
+                QMessageBox.information(self.ui, "Export Success",
+                                        f"Exported {len(sizes) * len(extensions)} renditions to {output_directory}.")
+
+        def fail(e):
+            QMessageBox.critical(self.ui, "Export Error", f"An error occurred while exporting renditions: {e}")
+            print(f"Error exporting renditions: {e}")
+
+        print(f"Exporting {len(sizes)} sizes x {len(extensions)} formats to {output_directory}")
+        self._queue_task(run, finish, fail)
+
+    def recipe(self):
+        return self.core.recipe()
+
+    def _change_recipe(self, change, label):
+        if self.image is None:
+            print("No image loaded to edit.")
+            return
+
+        def finish(image):
+            self.image = image
+            self._show_commit()
+            self.save_image()
+            stats = self.core.recipe_cache.stats()
+            print(f"Recipe changed ({label}): {len(self.recipe())} steps. "
+                  f"(Cache: {stats['entries']} results, {stats['bytes'] / (1024 * 1024):.1f} MB)")
+
+        def fail(e):
+            QMessageBox.critical(self.ui, "Recipe Error", f"Could not change the edit recipe: {e}")
+            print(f"Error changing recipe ({label}): {e}")
+
+        self._queue_commit(lambda: self.core.render_recipe_change(change, label), finish, fail)
+
+    def edit_recipe_step(self, index, argument):
+        # Re-runs only the steps from index on, starting from a cached intermediate result
+        self._change_recipe(lambda steps: edit_recipe.replace_step(steps, index, argument), "Edit step")
+
+    def remove_recipe_step(self, index):
+        self._change_recipe(lambda steps: edit_recipe.remove_step(steps, index), "Remove step")
+
+    def save_recipe(self, path):
+        error = self.core.save_recipe(path)
+        self.show_error(error)
+        return error is None
+
+    def apply_recipe_file(self, path):
+        try:
+            steps = edit_recipe.load_recipe(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self.ui, "Recipe Error", f"Could not load recipe {path}: {e}")
+            print(f"Error loading recipe {path}: {e}")
+            return
+        self._change_recipe(lambda current: steps, "Apply recipe")
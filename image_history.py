@@ -0,0 +1,274 @@
+import hashlib
+import queue
+import threading
+import zlib
+
+from PIL import Image
+
+import image_ops
+from instrumentation import tracer
+
+DEFAULT_MEMORY_BUDGET = 1024 * 1024 * 1024  # 1 GB of undo history
+TILE_SIZE = 256
+# The newest entries stay uncompressed so stepping back one or two edits never pays for zlib
+RAW_ENTRIES = 2
+COMPRESS_LEVEL = 1
+
+# Lossless transposes that can be stored as a recipe over the previous entry instead of pixels
+REVERSIBLE_TRANSPOSES = {
+    Image.Transpose.FLIP_LEFT_RIGHT,
+    Image.Transpose.FLIP_TOP_BOTTOM,
+    Image.Transpose.ROTATE_90,
+    Image.Transpose.ROTATE_180,
+    Image.Transpose.ROTATE_270,
+    Image.Transpose.TRANSPOSE,
+    Image.Transpose.TRANSVERSE,
+}
+
+
+class _Tile:
+    __slots__ = ("box", "digest", "raw", "compressed")
+
+    def __init__(self, box, raw):
+        self.box = box
+        self.digest = hashlib.blake2b(raw, digest_size=16).digest()
+        self.raw = raw
+        self.compressed = None
+
+    def nbytes(self):
+        raw = self.raw
+        return len(raw) if raw is not None else len(self.compressed)
+
+    def pixels(self):
+        raw = self.raw
+        if raw is None:
+            raw = zlib.decompress(self.compressed)
+        return raw
+
+    def compress(self):
+        raw = self.raw
+        if raw is None:
+            return
+        # compressed is published before raw is dropped, so readers always find one of them
+        self.compressed = zlib.compress(raw, COMPRESS_LEVEL)
+        self.raw = None
+
+
+class _Entry:
+    __slots__ = ("mode", "size", "tiles", "parent", "transpose", "pending_image", "steps")
+
+    def __init__(self, mode, size, parent=None, transpose=None, pending_image=None, steps=()):
+        self.mode = mode
+        self.size = size
+        # The edit recipe that produces this entry from the original image
+        self.steps = steps
+        self.tiles = None
+        self.parent = parent
+        self.transpose = transpose
+        # Held as a whole image until the background thread has split it into tiles
+        self.pending_image = pending_image
+
+    def own_tiles(self):
+        if self.parent is not None:
+            return self.parent.own_tiles()
+        return self.tiles or ()
+
+    def pending_nbytes(self):
+        image = self.pending_image
+        if image is None or self.parent is not None:
+            return 0
+        return image.width * image.height * len(image.getbands())
+
+    def materialize(self):
+        if self.parent is not None:
+            return self.parent.materialize().transpose(self.transpose)
+        image = self.pending_image
+        if image is not None:
+            return image
+        image = Image.new(self.mode, self.size)
+        for tile in self.tiles:
+            left, top, right, bottom = tile.box
+            image.paste(Image.frombytes(self.mode, (right - left, bottom - top), tile.pixels()), tile.box)
+        return image
+
+
+def _tile_boxes(size):
+    width, height = size
+    for top in range(0, height, TILE_SIZE):
+        for left in range(0, width, TILE_SIZE):
+            yield (left, top, min(left + TILE_SIZE, width), min(top + TILE_SIZE, height))
+
+
+class ImageHistory:
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self.entries = []
+        self.index = -1
+        self._current_image = None
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._worker = threading.Thread(target=self._work_loop, name="history-worker", daemon=True)
+        self._worker.start()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self._lock:
+            self.entries = []
+            self.index = -1
+            self._current_image = None
+
+    def add(self, image, transpose=None, steps=(), previous=None):
+        # Returns immediately; the background thread splits the image into tiles later.
+        # Only tiles that differ from the previous entry are stored; unchanged tiles are
+        # shared. A lossless transpose of the previous entry is stored as a recipe.
+        # previous is the entry image was rendered from (default: the current one);
+        # the redo steps after it are dropped.
+        with self._lock:
+            if previous is None or previous not in self.entries:
+                # An evicted base cannot hold a transpose recipe
+                if previous is not None:
+                    transpose = None
+                position = self.index
+            else:
+                position = self.entries.index(previous)
+            if position < len(self.entries) - 1:
+                self.entries = self.entries[:position + 1]
+            previous = self.entries[-1] if self.entries else None
+
+            if previous is not None and transpose in REVERSIBLE_TRANSPOSES and previous.parent is None:
+                entry = _Entry(image.mode, image.size, parent=previous, transpose=transpose, steps=steps)
+            else:
+                entry = _Entry(image.mode, image.size, pending_image=image, steps=steps)
+                self._jobs.put((self._tile_entry, entry, previous))
+
+            self.entries.append(entry)
+            self.index = len(self.entries) - 1
+            self._current_image = image_ops.freeze(image)
+            self._evict_over_budget()
+            if len(self.entries) > RAW_ENTRIES:
+                self._jobs.put((self._compress_entry, self.entries[-RAW_ENTRIES - 1], None))
+
+    def _tile_entry(self, entry, previous):
+        # Jobs run in submission order, so previous has already been tiled
+        with tracer.span("history_tile", entry.pending_image):
+            entry.tiles = self._build_tiles(entry.pending_image, previous)
+        # tiles are published before the image is dropped, so readers always find one of them
+        entry.pending_image = None
+
+    def _build_tiles(self, image, previous):
+        previous_tiles = {}
+        if previous is not None and previous.mode == image.mode and previous.size == image.size:
+            previous_tiles = {tile.box: tile for tile in previous.own_tiles()}
+
+        tiles = []
+        for box in _tile_boxes(image.size):
+            tile = _Tile(box, image.crop(box).tobytes())
+            old_tile = previous_tiles.get(box)
+            if old_tile is not None and old_tile.digest == tile.digest:
+                tile = old_tile
+            tiles.append(tile)
+        return tiles
+
+    def current(self):
+        with self._lock:
+            if self.index < 0:
+                return None
+            if self._current_image is None:
+                entry = self.entries[self.index]
+                with tracer.span("history_materialize", size=f"{entry.size[0]}x{entry.size[1]}", mode=entry.mode):
+                    self._current_image = image_ops.freeze(entry.materialize())
+            return self._current_image
+
+    def current_entry(self):
+        # Opaque handle for add(previous=...)
+        with self._lock:
+            return self.entries[self.index] if self.index >= 0 else None
+
+    def current_steps(self):
+        with self._lock:
+            if self.index < 0:
+                return ()
+            return self.entries[self.index].steps
+
+    def can_undo(self):
+        return self.index > 0
+
+    def can_redo(self):
+        return self.index < len(self.entries) - 1
+
+    def undo(self):
+        with self._lock:
+            if self.index <= 0:
+                return None
+            self.index -= 1
+            self._current_image = None
+        return self.current()
+
+    def redo(self):
+        with self._lock:
+            if self.index >= len(self.entries) - 1:
+                return None
+            self.index += 1
+            self._current_image = None
+        return self.current()
+
+    def wait_idle(self):
+        self._jobs.join()
+
+    def _unique_tiles(self):
+        tiles = {}
+        for entry in self.entries:
+            for tile in entry.own_tiles():
+                tiles[id(tile)] = tile
+        return tiles.values()
+
+    def _memory_usage_locked(self):
+        return (sum(tile.nbytes() for tile in self._unique_tiles())
+                + sum(entry.pending_nbytes() for entry in self.entries))
+
+    def memory_usage(self):
+        with self._lock:
+            return self._memory_usage_locked()
+
+    def stats(self):
+        with self._lock:
+            tiles = list(self._unique_tiles())
+            return {
+                "entries": len(self.entries),
+                "index": self.index,
+                "memory_budget": self.memory_budget,
+                "memory_usage": self._memory_usage_locked(),
+                "pending_entries": sum(1 for entry in self.entries if entry.pending_image is not None),
+                "raw_tiles": sum(1 for tile in tiles if tile.raw is not None),
+                "compressed_tiles": sum(1 for tile in tiles if tile.raw is None),
+                "recipe_entries": sum(1 for entry in self.entries if entry.parent is not None),
+            }
+
+    def _evict_over_budget(self):
+        # Oldest undo steps go first; the current entry is always kept
+        while self.index > 0 and self._memory_usage_locked() > self.memory_budget:
+            evicted = self.entries.pop(0)
+            self.index -= 1
+            print(f"[ImageHistory] Memory budget exceeded, dropped oldest undo step {evicted.size} {evicted.mode}.")
+
+    def _compress_entry(self, entry, unused=None):
+        with self._lock:
+            recent = {id(tile) for newer in self.entries[-RAW_ENTRIES:] for tile in newer.own_tiles()}
+        with tracer.span("history_compress", size=f"{entry.size[0]}x{entry.size[1]}", mode=entry.mode):
+            for tile in entry.own_tiles():
+                if id(tile) not in recent:
+                    tile.compress()
+
+    def _work_loop(self):
+        while True:
+            job, entry, argument = self._jobs.get()
+            try:
+                job(entry, argument)
+                with self._lock:
+                    self._evict_over_budget()
+            except Exception as e:
+                print(f"[ImageHistory] Background job failed: {e}")
+            finally:
+                self._jobs.task_done()
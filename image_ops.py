@@ -0,0 +1,171 @@
+from PIL import Image, ImageEnhance, ImageFilter
+
+import geometry_ops
+import point_ops
+import strip_parallel
+
+# Pixel operations shared by the GUI editor and the headless tools. Nothing in
+# here may import Qt; worker processes load this module on their own.
+
+FILTER_NAMES = ["Left", "Right", "Mirror", "Sharpen", "B/W", "Color", "Contrast", "Blur"]
+FILTERS_WITH_PARAMETERS = ["Left", "Right", "Mirror", "Sharpen", "Color", "Contrast", "Blur"]
+GEOMETRY_OPS = ["Resize", "Crop"]
+DEFAULT_FILTER_VALUE = 50
+
+
+def freeze(image):
+    # Images held by the editor (history entries, the current image, the original,
+    # prefetched decodes) are shared by reference instead of copied defensively, so
+    # nothing may change them in place: every operation returns a new image, or its
+    # input when it changes nothing. The readonly flag records that; Pillow then
+    # gives the image a private buffer before any in-place write (paste, putalpha)
+    # instead of writing into pixels it shares with a mapped file or another image.
+    image.readonly = 1
+    return image
+
+
+def apply_left(image, value):
+    angle = -90 * (value / 100.0)
+    return image.rotate(angle, expand=True)
+
+
+def apply_right(image, value):
+    angle = 90 * (value / 100.0)
+    return image.rotate(angle, expand=True)
+
+
+def apply_mirror(image, value):
+    if value > 50:
+        return image.transpose(Image.FLIP_LEFT_RIGHT)
+    else:
+        return image
+
+
+def apply_sharpen(image, value):
+    factor = 0.1 + (value / 100.0) * 4.9
+    return strip_parallel.map_strips(image, strip_parallel.SHARPEN_HALO,
+                                     lambda strip: ImageEnhance.Sharpness(strip).enhance(factor))
+
+
+def apply_grayscale(image):
+    return image.convert("L").convert("RGB")
+
+
+def apply_color(image, value):
+    return point_ops.apply_point_ops(image, [("Color", value)])
+
+
+def apply_contrast(image, value):
+    return point_ops.apply_point_ops(image, [("Contrast", value)])
+
+
+def apply_blur(image, value, scale=1.0):
+    # scale shrinks the radius when blurring a downscaled preview proxy
+    radius = value / 10.0 * scale
+    return strip_parallel.map_strips(image, strip_parallel.blur_halo(radius),
+                                     lambda strip: strip.filter(ImageFilter.GaussianBlur(radius)))
+
+
+def resize_image(image, width, height):
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def crop_image(image, x, y, width, height):
+    img_width, img_height = image.size
+    if x < 0 or y < 0 or x + width > img_width or y + height > img_height:
+        raise ValueError("Crop area is outside image boundaries.")
+    return image.crop((x, y, x + width, y + height))
+
+
+def get_filter_function(filter_name, scale=1.0):
+    if filter_name == "Left":
+        return apply_left
+    elif filter_name == "Right":
+        return apply_right
+    elif filter_name == "Mirror":
+        return apply_mirror
+    elif filter_name == "Sharpen":
+        return apply_sharpen
+    elif filter_name == "B/W":
+        return lambda img, val: apply_grayscale(img)
+    elif filter_name == "Color":
+        return apply_color
+    elif filter_name == "Contrast":
+        return apply_contrast
+    elif filter_name == "Blur":
+        return lambda img, val: apply_blur(img, val, scale)
+    return None
+
+
+def parse_op(spec):
+    # "Contrast=70", "B/W", "Resize=800x600", "Crop=10,10,400,300"
+    name, _, argument = spec.partition("=")
+    name = name.strip()
+    argument = argument.strip()
+    try:
+        if name == "Resize":
+            width, height = (int(part) for part in argument.lower().split("x"))
+            if width <= 0 or height <= 0:
+                raise ValueError
+            return (name, (width, height))
+        if name == "Crop":
+            x, y, width, height = (int(part) for part in argument.split(","))
+            if width <= 0 or height <= 0:
+                raise ValueError
+            return (name, (x, y, width, height))
+        if name in FILTER_NAMES:
+            value = int(argument) if argument else DEFAULT_FILTER_VALUE
+            if not 0 <= value <= 100:
+                raise ValueError
+            return (name, value)
+    except ValueError:
+        raise ValueError(f"Invalid argument for '{name}': '{argument}'") from None
+    raise ValueError(f"Unknown operation: '{name}'")
+
+
+def format_op(name, argument):
+    # Inverse of parse_op
+    if name == "Resize":
+        return f"Resize={argument[0]}x{argument[1]}"
+    if name == "Crop":
+        return "Crop=" + ",".join(str(part) for part in argument)
+    return f"{name}={argument}"
+
+
+def apply_op(image, name, argument):
+    if name == "Resize":
+        return resize_image(image, *argument)
+    if name == "Crop":
+        return crop_image(image, *argument)
+    filter_function = get_filter_function(name)
+    if filter_function is None:
+        raise ValueError(f"Unknown operation: '{name}'")
+    return filter_function(image, argument)
+
+
+def _run_function(name):
+    if name in point_ops.POINT_OPS:
+        return point_ops.apply_point_ops
+    if name in geometry_ops.GEOMETRIC_OPS:
+        return geometry_ops.apply_geometry_ops
+    return None
+
+
+def apply_ops(image, ops):
+    # Consecutive colour/contrast/B&W steps run as one fused pass, consecutive
+    # rotate/mirror/crop/resize steps as one resample
+    run = []
+    run_function = None
+    for name, argument in ops:
+        function = _run_function(name)
+        if run and function is not run_function:
+            image = run_function(image, run)
+            run = []
+        if function is None:
+            image = apply_op(image, name, argument)
+        else:
+            run.append((name, argument))
+            run_function = function
+    if run:
+        image = run_function(image, run)
+    return image
@@ -0,0 +1,141 @@
+import collections
+import concurrent.futures
+import os
+import threading
+
+from PIL import Image
+
+from instrumentation import tracer
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_NEIGHBORS = 2
+PREFETCH_WORKERS = 2
+
+
+def decode_image(path):
+    with tracer.span("decode", path=os.path.basename(path)) as span:
+        image = Image.open(path)
+        # load() decodes everything up front and releases the file handle
+        image.load()
+        span.output(image)
+        return image
+
+
+def decode_for_display(path, max_size):
+    # Decodes at a reduced resolution that still covers max_size where the decoder
+    # can scale by itself (JPEG, through libjpeg's DCT scaling by 1/2 to 1/8).
+    # Other formats are decoded once at full size: reducing that decode would only
+    # mean decoding the file a second time on the first commit.
+    with tracer.span("decode", path=os.path.basename(path), reduced=True) as span:
+        image = Image.open(path)
+        if image.format == "JPEG":
+            image.draft(image.mode if image.mode in ("RGB", "L") else None, max_size)
+        image.load()
+        span.output(image)
+        return image
+
+
+def _image_nbytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class ImagePrefetcher:
+    # Decodes the files around the current one in the background and keeps the
+    # results in a byte-bounded LRU, so stepping through a folder rarely waits on disk.
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, neighbors=DEFAULT_NEIGHBORS, workers=PREFETCH_WORKERS, decode=decode_image):
+        self.decode = decode
+        self.max_bytes = max_bytes
+        self.neighbors = neighbors
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+        self._in_flight = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, path):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, path):
+        # Returns a decoded image, waiting on an in-flight decode rather than starting a second one
+        key = self._key(path)
+        with self._lock:
+            image = self._cache.get(key)
+            if image is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return image
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass
+        image = self.decode(path)
+        self._store(key, image)
+        return image
+
+    def prefetch(self, paths):
+        keys = {}
+        for path in paths:
+            try:
+                keys[self._key(path)] = path
+            except OSError:
+                continue
+        with self._lock:
+            # Queued decodes that fell out of the window are no longer worth doing
+            for key, future in list(self._in_flight.items()):
+                if key not in keys and future.cancel():
+                    del self._in_flight[key]
+            for key, path in keys.items():
+                if key in self._cache or key in self._in_flight:
+                    continue
+                self._in_flight[key] = self._executor.submit(self._decode, key, path)
+
+    def _decode(self, key, path):
+        try:
+            image = self.decode(path)
+            self._store(key, image)
+            return image
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _store(self, key, image):
+        nbytes = _image_nbytes(image)
+        with self._lock:
+            if nbytes > self.max_bytes or key in self._cache:
+                return
+            self._cache[key] = image
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._bytes -= _image_nbytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            for future in self._in_flight.values():
+                future.cancel()
+            self._in_flight.clear()
+            self._cache.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._cache),
+                "in_flight": len(self._in_flight),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,323 @@
+import collections
+import math
+
+from PIL import Image
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QPainter, QPixmap
+from PyQt5.QtWidgets import QLabel
+
+from instrumentation import tracer
+from qt_image import displayable, pil_to_qimage
+
+# Picture area with zoom and pan. The shown image is kept as a mipmap pyramid,
+# each level half the size of the one below, and a repaint draws only the tiles
+# of the one level matching the zoom that intersect the viewport, so it costs
+# the same for a 1 MP and a 200 MP image. Levels are built on first use from the
+# nearest finer level, so after an edit only the level on screen is rebuilt, and
+# only the visible tiles of it are converted to pixmaps. build_pyramid() makes
+# that level ahead of set_image(), e.g. on the render worker after a commit.
+#   wheel: zoom at the cursor   drag: pan   double-click: fit <-> 100%
+#   keys: + / - zoom, 0 fit, 1 100%
+
+TILE_SIZE = 256
+# The coarsest level is the first one to fit in this many pixels
+MIN_LEVEL_SIZE = 256
+MAX_CACHED_TILES = 512
+ZOOM_STEP = 1.25
+MAX_ZOOM = 32.0
+# Past this many screen pixels per image pixel, pixels are drawn as hard squares
+SMOOTH_ZOOM_LIMIT = 2.0
+REDUCE_MODES = ("L", "RGB", "RGBA", "RGBX")
+
+
+def level_for_zoom(screen_pixels):
+    # Pyramid level to draw at this many device pixels per image pixel
+    if screen_pixels >= 1:
+        return 0
+    return int(math.floor(math.log2(1 / screen_pixels)))
+
+
+class ImagePyramid:
+    def __init__(self, image):
+        self.size = image.size
+        width, height = image.size
+        count = 1
+        while max(width, height) > MIN_LEVEL_SIZE:
+            width, height = (width + 1) // 2, (height + 1) // 2
+            count += 1
+        self.levels = [image] + [None] * (count - 1)
+
+    def level(self, index):
+        index = min(max(index, 0), len(self.levels) - 1)
+        if self.levels[index] is None:
+            finer = index - 1
+            while self.levels[finer] is None:
+                finer -= 1
+            source = self.levels[finer]
+            factor = 2 ** (index - finer)
+            with tracer.span("pyramid_level", source, level=index):
+                if source.mode in REDUCE_MODES:
+                    self.levels[index] = source.reduce(factor)
+                else:
+                    size = (max(math.ceil(source.width / factor), 1), max(math.ceil(source.height / factor), 1))
+                    self.levels[index] = source.resize(size, Image.Resampling.BOX)
+        return index, self.levels[index]
+
+    def fit_index(self, display_size):
+        # The level drawn when the whole image is fitted into display_size device pixels
+        screen = min(display_size[0] / self.size[0], display_size[1] / self.size[1])
+        return min(level_for_zoom(screen), len(self.levels) - 1)
+
+    def fit_level(self, display_size):
+        return self.level(self.fit_index(display_size))[1]
+
+
+def build_pyramid(image, display_size, zoom_state=None):
+    # The pyramid set_image() would make for image, with the level the next repaint
+    # draws already built, so the reduce() can run off the GUI thread. zoom_state
+    # is ImageViewer.zoom_state(), taken on the GUI thread.
+    pyramid = ImagePyramid(displayable(image))
+    if zoom_state is not None:
+        size, screen_pixels = zoom_state
+        # set_image() keeps the zoom only while the size stays the same
+        if abs(image.width - size[0]) <= 1 and abs(image.height - size[1]) <= 1:
+            pyramid.level(level_for_zoom(screen_pixels))
+            return pyramid
+    pyramid.fit_level(display_size)
+    return pyramid
+
+
+class ImageViewer(QLabel):
+    # Drop-in for the QLabel picture box: setText()/clear() still show a message,
+    # set_image() shows a PIL image.
+
+    def __init__(self, text="", parent=None):
+        super().__init__(text, parent)
+        self._pyramid = None
+        self._source = None
+        # Logical (full-resolution) pixels per pixel of the shown image: previews and
+        # reduced decodes are drawn at the size of the image they stand in for
+        self._scale = 1.0
+        # Screen pixels per logical pixel, or None to fit the viewport
+        self._zoom = None
+        # Logical image point shown at the middle of the viewport
+        self._center = (0.0, 0.0)
+        self._tiles = collections.OrderedDict()
+        self._drag = None
+        self.setFocusPolicy(Qt.ClickFocus)
+
+    def set_image(self, image, scale=1.0, pyramid=None):
+        # pyramid: from build_pyramid(image, ...), when it was made ahead
+        if image is not self._source:
+            previous_size = self._logical_size()
+            self._source = image
+            self._pyramid = pyramid if pyramid is not None else ImagePyramid(displayable(image))
+            self._tiles.clear()
+            self._scale = scale
+            size = self._logical_size()
+            # Zoom and position survive edits that keep the size, e.g. filters and previews
+            if previous_size is None or abs(size[0] - previous_size[0]) > 1 or abs(size[1] - previous_size[1]) > 1:
+                self._zoom = None
+                self._center = (size[0] / 2, size[1] / 2)
+        super().clear()
+        self.update()
+
+    def clear(self):
+        self._drop_image()
+        super().clear()
+
+    def setText(self, text):
+        self._drop_image()
+        super().setText(text)
+
+    def _drop_image(self):
+        self._pyramid = None
+        self._source = None
+        self._tiles.clear()
+        self._drag = None
+
+    def shown_image(self):
+        return self._source
+
+    def zoom_state(self):
+        # (logical size, device pixels per logical pixel) while zoomed away from fit, else None
+        if self._pyramid is None or self._zoom is None:
+            return None
+        return self._logical_size(), self._zoom * self.devicePixelRatioF()
+
+    def built_fit_level(self, display_size):
+        # The fit level if a repaint or build_pyramid() has made it already, else None
+        if self._pyramid is None:
+            return None
+        return self._pyramid.levels[self._pyramid.fit_index(display_size)]
+
+    def _logical_size(self):
+        if self._pyramid is None:
+            return None
+        width, height = self._pyramid.size
+        return (width * self._scale, height * self._scale)
+
+    def fit_zoom(self):
+        width, height = self._logical_size()
+        # A widget not laid out yet has no size; keep the zoom positive regardless
+        return max(min(self.width() / width, self.height() / height), 1e-6)
+
+    def zoom(self):
+        return self._zoom if self._zoom is not None else self.fit_zoom()
+
+    def set_zoom(self, zoom, anchor=None):
+        # anchor: widget point that keeps showing the same image point
+        if self._pyramid is None:
+            return
+        minimum = min(self.fit_zoom(), 1.0 / self.devicePixelRatioF()) / 2
+        old_zoom = self.zoom()
+        zoom = min(max(zoom, minimum), MAX_ZOOM)
+        if anchor is not None:
+            offset_x = anchor[0] - self.width() / 2
+            offset_y = anchor[1] - self.height() / 2
+            point_x = self._center[0] + offset_x / old_zoom
+            point_y = self._center[1] + offset_y / old_zoom
+            self._center = (point_x - offset_x / zoom, point_y - offset_y / zoom)
+        self._zoom = zoom
+        self._clamp_center()
+        self.update()
+
+    def fit(self):
+        if self._pyramid is None:
+            return
+        width, height = self._logical_size()
+        self._zoom = None
+        self._center = (width / 2, height / 2)
+        self.update()
+
+    def actual_size(self):
+        # One image pixel per device pixel
+        self.set_zoom(1.0 / self.devicePixelRatioF())
+
+    def _clamp_center(self):
+        width, height = self._logical_size()
+        zoom = self.zoom()
+        center = []
+        for value, extent, view in ((self._center[0], width, self.width()), (self._center[1], height, self.height())):
+            half_view = view / 2 / zoom
+            if extent <= 2 * half_view:
+                center.append(extent / 2)
+            else:
+                center.append(min(max(value, half_view), extent - half_view))
+        self._center = tuple(center)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self._pyramid is None:
+            return
+        if self._zoom is None:
+            self._clamp_center()
+        # Screen pixels per pixel of the shown image
+        pixel_zoom = self.zoom() * self._scale
+        dpr = self.devicePixelRatioF()
+        index, level = self._pyramid.level(level_for_zoom(pixel_zoom * dpr))
+        factor = 2 ** index
+        level_zoom = pixel_zoom * factor
+        center_x = self._center[0] / self._scale / factor
+        center_y = self._center[1] / self._scale / factor
+        half_width = self.width() / 2
+        half_height = self.height() / 2
+
+        def to_widget_x(x):
+            return round(half_width + (x - center_x) * level_zoom)
+
+        def to_widget_y(y):
+            return round(half_height + (y - center_y) * level_zoom)
+
+        first_x = max(int((center_x - half_width / level_zoom) // TILE_SIZE), 0)
+        last_x = min(int((center_x + half_width / level_zoom) // TILE_SIZE), (level.width - 1) // TILE_SIZE)
+        first_y = max(int((center_y - half_height / level_zoom) // TILE_SIZE), 0)
+        last_y = min(int((center_y + half_height / level_zoom) // TILE_SIZE), (level.height - 1) // TILE_SIZE)
+
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, level_zoom * dpr < SMOOTH_ZOOM_LIMIT)
+        with tracer.span("display_paint", level=index, tiles=(last_x - first_x + 1) * (last_y - first_y + 1)):
+            for tile_y in range(first_y, last_y + 1):
+                for tile_x in range(first_x, last_x + 1):
+                    pixmap = self._tile(index, level, tile_x, tile_y)
+                    left, top = tile_x * TILE_SIZE, tile_y * TILE_SIZE
+                    # Edges are rounded from shared tile boundaries, so neighbours meet without seams
+                    x0, y0 = to_widget_x(left), to_widget_y(top)
+                    x1, y1 = to_widget_x(left + pixmap.width()), to_widget_y(top + pixmap.height())
+                    painter.drawPixmap(QRectF(x0, y0, x1 - x0, y1 - y0), pixmap, QRectF(pixmap.rect()))
+        painter.end()
+
+    def _tile(self, index, level, tile_x, tile_y):
+        key = (index, tile_x, tile_y)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            return pixmap
+        left, top = tile_x * TILE_SIZE, tile_y * TILE_SIZE
+        box = (left, top, min(left + TILE_SIZE, level.width), min(top + TILE_SIZE, level.height))
+        pixmap = QPixmap.fromImage(pil_to_qimage(level.crop(box)))
+        self._tiles[key] = pixmap
+        if len(self._tiles) > MAX_CACHED_TILES:
+            self._tiles.popitem(last=False)
+        return pixmap
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self._pyramid is not None and self._zoom is not None:
+            self._clamp_center()
+
+    def wheelEvent(self, event):
+        if self._pyramid is None:
+            return super().wheelEvent(event)
+        steps = event.angleDelta().y() / 120
+        position = event.pos()
+        self.set_zoom(self.zoom() * ZOOM_STEP ** steps, (position.x(), position.y()))
+        event.accept()
+
+    def mousePressEvent(self, event):
+        if self._pyramid is not None and event.button() == Qt.LeftButton:
+            self._drag = (event.pos(), self._center)
+            self.setCursor(Qt.ClosedHandCursor)
+            event.accept()
+        else:
+            super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self._drag is None:
+            return super().mouseMoveEvent(event)
+        start, center = self._drag
+        zoom = self.zoom()
+        self._center = (center[0] - (event.pos().x() - start.x()) / zoom,
+                        center[1] - (event.pos().y() - start.y()) / zoom)
+        self._clamp_center()
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        if self._drag is not None:
+            self._drag = None
+            self.unsetCursor()
+        super().mouseReleaseEvent(event)
+
+    def mouseDoubleClickEvent(self, event):
+        if self._pyramid is None:
+            return super().mouseDoubleClickEvent(event)
+        if self._zoom is None:
+            position = event.pos()
+            self.set_zoom(1.0 / self.devicePixelRatioF(), (position.x(), position.y()))
+        else:
+            self.fit()
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        if self._pyramid is None:
+            return super().keyPressEvent(event)
+        if key in (Qt.Key_Plus, Qt.Key_Equal):
+            self.set_zoom(self.zoom() * ZOOM_STEP)
+        elif key == Qt.Key_Minus:
+            self.set_zoom(self.zoom() / ZOOM_STEP)
+        elif key == Qt.Key_0:
+            self.fit()
+        elif key == Qt.Key_1:
+            self.actual_size()
+        else:
+            super().keyPressEvent(event)
@@ -0,0 +1,211 @@
+import atexit
+import collections
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+from PIL import Image
+
+# Timing spans around the expensive steps (decode, filter, history, display,
+# encode). Off by default: a disabled span() hands back one shared no-op object.
+#   PHOTOQT_TRACE=1               record spans; a stats summary is printed at exit
+#   PHOTOQT_TRACE=trace.json      ...and write a Chrome trace (chrome://tracing, Perfetto)
+#   PHOTOQT_TRACE_MEMORY=1        add each span's tracemalloc peak
+# tracemalloc only sees Python allocations; Pillow's pixel buffers bypass it, so
+# spans also carry the size and mode of the images involved and how many images
+# Pillow created meanwhile (a process-wide count, other threads included).
+
+TRACE_ENV = "PHOTOQT_TRACE"
+TRACE_MEMORY_ENV = "PHOTOQT_TRACE_MEMORY"
+MAX_EVENTS = 100_000
+# The summary covers the most recent spans of each name
+STATS_WINDOW = 256
+
+
+def describe_image(image):
+    width, height = image.size
+    return {"size": f"{width}x{height}", "mode": image.mode, "megapixels": round(width * height / 1e6, 2)}
+
+
+def _images_created():
+    return Image.core.get_stats()["new_count"]
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def set(self, **args):
+        pass
+
+    def output(self, image):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start", "images_start", "memory_start", "memory_peak")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def output(self, image):
+        if image is not None:
+            width, height = image.size
+            self.args["output"] = f"{width}x{height} {image.mode}"
+
+    def __enter__(self):
+        if self.tracer.trace_memory:
+            self.tracer._memory_enter(self)
+        self.images_start = _images_created()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter_ns() - self.start
+        self.args["images_allocated"] = _images_created() - self.images_start
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        if self.tracer.trace_memory:
+            self.args["tracemalloc_peak_kb"] = self.tracer._memory_exit(self)
+        self.tracer._record(self, duration)
+        return False
+
+
+class Tracer:
+    def __init__(self, max_events=MAX_EVENTS):
+        self.enabled = False
+        self.trace_memory = False
+        self._lock = threading.Lock()
+        self._events = collections.deque(maxlen=max_events)
+        self._recent = collections.defaultdict(lambda: collections.deque(maxlen=STATS_WINDOW))
+        self._counts = collections.Counter()
+        self._thread_names = {}
+        self._epoch = time.perf_counter_ns()
+        self._memory_lock = threading.Lock()
+        self._memory_spans = set()
+
+    def enable(self, trace_memory=False):
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.trace_memory = trace_memory
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.trace_memory = False
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            self._recent.clear()
+            self._counts.clear()
+
+    def span(self, name, image=None, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        if image is not None:
+            args.update(describe_image(image))
+        return _Span(self, name, args)
+
+    def _memory_enter(self, span):
+        # The traced peak is process-wide, so resetting it for a new span first
+        # folds it into every span still open (outer spans, other threads)
+        with self._memory_lock:
+            current, peak = tracemalloc.get_traced_memory()
+            for active in self._memory_spans:
+                active.memory_peak = max(active.memory_peak, peak)
+            tracemalloc.reset_peak()
+            span.memory_start = current
+            span.memory_peak = current
+            self._memory_spans.add(span)
+
+    def _memory_exit(self, span):
+        with self._memory_lock:
+            _, peak = tracemalloc.get_traced_memory()
+            self._memory_spans.discard(span)
+            return max(span.memory_peak, peak, span.memory_start) // 1024 - span.memory_start // 1024
+
+    def _record(self, span, duration):
+        thread = threading.current_thread()
+        with self._lock:
+            self._thread_names[thread.ident] = thread.name
+            self._events.append((span.name, span.start - self._epoch, duration, thread.ident, span.args))
+            self._recent[span.name].append(duration)
+            self._counts[span.name] += 1
+
+    def chrome_trace(self):
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+        pid = os.getpid()
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                        for tid, name in thread_names.items()]
+        for name, start, duration, tid, args in events:
+            trace_events.append({"name": name, "cat": name.split("_")[0], "ph": "X", "pid": pid, "tid": tid,
+                                 "ts": start / 1000, "dur": duration / 1000, "args": args})
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+    def summary(self):
+        with self._lock:
+            recent = {name: sorted(durations) for name, durations in self._recent.items()}
+            counts = dict(self._counts)
+        stats = {}
+        for name, durations in recent.items():
+            if not durations:
+                continue
+            stats[name] = {
+                "count": counts[name],
+                "window": len(durations),
+                "mean_ms": sum(durations) / len(durations) / 1e6,
+                "p50_ms": durations[len(durations) // 2] / 1e6,
+                "p95_ms": durations[min(int(len(durations) * 0.95), len(durations) - 1)] / 1e6,
+                "max_ms": durations[-1] / 1e6,
+            }
+        return stats
+
+    def format_summary(self):
+        lines = [f"{'span':<22} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+        for name, stats in sorted(self.summary().items()):
+            lines.append(f"{name:<22} {stats['count']:>7} {stats['mean_ms']:>9.1f} {stats['p50_ms']:>9.1f} "
+                         f"{stats['p95_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+        return "\n".join(lines)
+
+
+tracer = Tracer()
+
+
+def _report_at_exit(path):
+    if path:
+        tracer.write_chrome_trace(path)
+        print(f"[instrumentation] Chrome trace written to {path}")
+    print(tracer.format_summary())
+
+
+def configure_from_environment():
+    setting = os.environ.get(TRACE_ENV, "")
+    if not setting or setting == "0":
+        return
+    tracer.enable(trace_memory=os.environ.get(TRACE_MEMORY_ENV, "") not in ("", "0"))
+    atexit.register(_report_at_exit, None if setting == "1" else setting)
+
+
+configure_from_environment()
@@ -1,24 +1,30 @@
 import sys
 import os
-from PyQt5.QtWidgets import QApplication, QWidget, QFileDialog, QDialog, QMessageBox # Added QMessageBox
+from PyQt5.QtWidgets import QApplication, QWidget, QFileDialog, QDialog, QMessageBox, QInputDialog # Added QMessageBox
 
 from resize_dialog import ResizeDialog
 from photoqt_ui import PhotoQTUI
 from image_editor import Editor
 from crop_dialog import CropDialog
+import export_profiles
+import image_ops
+import render_cache
+import renditions
 
 class MainAppController(QWidget):
     def __init__(self):
         super().__init__()
         self.ui = PhotoQTUI()
-        self.editor = Editor(self.ui)
+        self.editor = Editor(self.ui, render_cache_directory=render_cache.directory_from_environment())
         self.setup_connections()
         self.ui.show()
 
     def setup_connections(self):
         # File/Directory Operations
         self.ui.btn_folder.clicked.connect(self.select_directory_and_load)
-        self.ui.file_list.currentItemChanged.connect(self.load_selected_image)
+        self.ui.file_list.current_filename_changed.connect(self.load_selected_image)
+        self.ui.files_found.connect(self.select_first_image)
+        self.ui.directory_scanned.connect(self.handle_scanned_directory)
         
         # Filter Operations
         self.ui.filter_box.currentTextChanged.connect(self.handle_filter_selection)
@@ -34,38 +40,56 @@ class MainAppController(QWidget):
 
         # Save Operations
         self.ui.btn_save_as.clicked.connect(self.save_image_as_dialog)
+        self.ui.btn_export_renditions.clicked.connect(self.export_renditions_dialog)
+        self.ui.autosave_profile_box.currentTextChanged.connect(self.editor.set_autosave_profile)
 
         # New feature connections
         self.ui.btn_resize.clicked.connect(self.open_resize_dialog)
         self.ui.btn_crop.clicked.connect(self.open_crop_dialog)
+        self.ui.btn_save_recipe.clicked.connect(self.save_recipe_dialog)
+        self.ui.btn_apply_recipe.clicked.connect(self.apply_recipe_dialog)
+        self.ui.btn_edit_step.clicked.connect(self.edit_recipe_step_dialog)
+        self.ui.btn_remove_step.clicked.connect(self.remove_recipe_step_dialog)
 
     def select_directory_and_load(self):
         try:
-            if self.ui.select_directory():
-                if self.ui.file_list.count() > 0:
-                    self.ui.file_list.setCurrentRow(0)
-                else:
-                    self.editor.image = None
-                    self.ui.picture_box.clear()
-                    self.ui.picture_box.setText("No images found in this folder.")
-                    self.editor.clear_history()
-                    QMessageBox.information(self, "No Images", "No supported image files found in the selected directory.")
-            else:
-                pass
+            self.ui.select_directory()
         except Exception as e:
             QMessageBox.critical(self, "Directory Error", f"An unexpected error occurred while loading directory: {e}")
             print(f"Error in select_directory_and_load: {e}")
 
-    def load_selected_image(self, current_item):
-        if current_item:
-            filename = current_item.text()
+    def select_first_image(self, count):
+        # The first batch of a scan opens its first image; later batches leave the selection alone
+        if count > 0 and self.ui.file_list.currentRow() < 0:
+            self.ui.file_list.setCurrentRow(0)
+
+    def handle_scanned_directory(self, count):
+        if count == 0:
+            self.editor.image = None
+            self.ui.picture_box.clear()
+            self.ui.picture_box.setText("No images found in this folder.")
+            self.editor.clear_history()
+
+    def load_selected_image(self, filename):
+        if filename:
             self.editor.load_image(filename)
+            self.prefetch_neighbors()
         else:
             self.editor.image = None
             self.ui.picture_box.clear()
             self.ui.picture_box.setText("No image selected.")
             self.editor.clear_history()
 
+    def prefetch_neighbors(self):
+        row = self.ui.file_list.currentRow()
+        count = self.ui.file_list.count()
+        neighbors = self.editor.prefetcher.neighbors
+        filenames = []
+        for offset in range(1, neighbors + 1):
+            for neighbor_row in (row + offset, row - offset):
+                if 0 <= neighbor_row < count:
+                    filenames.append(self.ui.file_list.filename(neighbor_row))
+        self.editor.prefetch_images(filenames)
 
     def handle_filter_selection(self, filter_name):
         if self.editor.image is None:
@@ -108,21 +132,46 @@ class MainAppController(QWidget):
         initial_save_path = os.path.join(self.editor.edits_directory, initial_filename)
 
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Image As", initial_save_path, 
-                                                 "PNG Image (*.png);;JPEG Image (*.jpg *.jpeg);;All Files (*.*)")
+                                                 "PNG Image (*.png);;JPEG Image (*.jpg *.jpeg);;WebP Image (*.webp);;All Files (*.*)")
         
         if file_path:
             print(f"User selected save path: {file_path}")
-            if not self.editor.save_image(path=file_path):
-                QMessageBox.critical(self, "Save Error", "Failed to save the image. Please check permissions or try a different location/format.")
+            profile, accepted = QInputDialog.getItem(self, "Export Profile", "Encoder profile:", export_profiles.PROFILE_NAMES,
+                                                     export_profiles.PROFILE_NAMES.index(self.editor.core.export_profile), False)
+            if not accepted:
+                print("Save As operation cancelled by user.")
+                return
+            self.editor.set_export_profile(profile)
+            # Runs after any edits still rendering; the editor reports failures
+            self.editor.save_image(path=file_path)
         else:
             print("Save As operation cancelled by user.")
 
+    def export_renditions_dialog(self):
+        if self.editor.image is None:
+            QMessageBox.warning(self, "No Image", "There is no image loaded to export.")
+            return
+
+        output_directory = QFileDialog.getExistingDirectory(self, "Export Renditions To", self.editor.edits_directory)
+        if not output_directory:
+            print("Export Renditions operation cancelled by user.")
+            return
+        sizes, accepted = QInputDialog.getText(self, "Export Renditions", "Sizes (NAME=longest side, NAME=WxH or NAME=full):",
+                                               text=" ".join(renditions.DEFAULT_SIZES))
+        if not accepted:
+            return
+        formats, accepted = QInputDialog.getText(self, "Export Renditions", "Formats:",
+                                                 text=" ".join(renditions.DEFAULT_FORMATS))
+        if not accepted:
+            return
+        self.editor.export_renditions(output_directory, sizes.replace(",", " ").split(), formats.replace(",", " ").split())
+
     def open_resize_dialog(self):
         if self.editor.image is None:
             QMessageBox.warning(self, "No Image Loaded", "Please load an image before resizing.")
             return
 
-        current_width, current_height = self.editor.image.size
+        current_width, current_height = self.editor.image_size()
         print(f"Current image dimensions: {current_width}x{current_height}")
 
         dialog = ResizeDialog(current_width, current_height, self)
@@ -138,7 +187,7 @@ class MainAppController(QWidget):
             QMessageBox.warning(self, "No Image Loaded", "Please load an image before cropping.")
             return
 
-        current_width, current_height = self.editor.image.size
+        current_width, current_height = self.editor.image_size()
         dialog = CropDialog(current_width, current_height, self)
         if dialog.exec_() == QDialog.Accepted:
             x, y, w, h = dialog.get_crop_rect()
@@ -149,8 +198,76 @@ class MainAppController(QWidget):
         else:
             print("Crop operation cancelled.")
 
+    def save_recipe_dialog(self):
+        if self.editor.image is None:
+            QMessageBox.warning(self, "No Image", "There is no image loaded whose edits could be saved.")
+            return
+        if not self.editor.recipe():
+            QMessageBox.information(self, "Empty Recipe", "The current image has no edits to save.")
+            return
+
+        base_name = os.path.splitext(self.editor.current_filename or "image")[0]
+        initial_save_path = os.path.join(self.editor.edits_directory, base_name + ".recipe.json")
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Recipe", initial_save_path,
+                                                 "Edit Recipe (*.json);;All Files (*.*)")
+        if file_path:
+            self.editor.save_recipe(file_path)
+        else:
+            print("Save Recipe operation cancelled by user.")
+
+    def apply_recipe_dialog(self):
+        if self.editor.image is None:
+            QMessageBox.warning(self, "No Image Loaded", "Please load an image before applying a recipe.")
+            return
+
+        file_path, _ = QFileDialog.getOpenFileName(self, "Apply Recipe", self.editor.edits_directory,
+                                                 "Edit Recipe (*.json);;All Files (*.*)")
+        if file_path:
+            self.editor.apply_recipe_file(file_path)
+        else:
+            print("Apply Recipe operation cancelled by user.")
+
+    def choose_recipe_step(self, title):
+        # Returns the index of the chosen step of the current recipe, or None
+        if self.editor.image is None:
+            QMessageBox.warning(self, "No Image Loaded", "Please load an image before editing its recipe.")
+            return None
+        steps = self.editor.recipe()
+        if not steps:
+            QMessageBox.information(self, "Empty Recipe", "The current image has no edits to change.")
+            return None
+        items = [f"{index + 1}. {image_ops.format_op(name, argument)}" for index, (name, argument) in enumerate(steps)]
+        item, accepted = QInputDialog.getItem(self, title, "Step:", items, len(items) - 1, False)
+        if not accepted:
+            print(f"{title} operation cancelled by user.")
+            return None
+        return items.index(item)
+
+    def edit_recipe_step_dialog(self):
+        index = self.choose_recipe_step("Edit Recipe Step")
+        if index is None:
+            return
+        name, argument = self.editor.recipe()[index]
+        current = image_ops.format_op(name, argument).partition("=")[2]
+        text, accepted = QInputDialog.getText(self, "Edit Recipe Step", f"New value for {name}:", text=current)
+        if not accepted:
+            print("Edit Recipe Step operation cancelled by user.")
+            return
+        try:
+            _, argument = image_ops.parse_op(f"{name}={text}")
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Value", str(e))
+            return
+        self.editor.edit_recipe_step(index, argument)
+
+    def remove_recipe_step_dialog(self):
+        index = self.choose_recipe_step("Remove Recipe Step")
+        if index is not None:
+            self.editor.remove_recipe_step(index)
+
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     main_app_controller = MainAppController()
+    app.aboutToQuit.connect(main_app_controller.editor.flush_autosave)
     sys.exit(app.exec_())
\ No newline at end of file
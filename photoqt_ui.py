@@ -1,10 +1,17 @@
-from PyQt5.QtWidgets import (QWidget, QFileDialog, QLabel, QListWidget, QPushButton, QHBoxLayout, 
+from PyQt5.QtWidgets import (QWidget, QFileDialog, QLabel, QPushButton, QHBoxLayout, 
                              QVBoxLayout, QComboBox, QSizePolicy, QApplication, QSlider, QMessageBox)
-from PyQt5.QtCore import Qt
-import os
+from PyQt5.QtCore import Qt, pyqtSignal
+import export_profiles
 import themes
+from file_list import DirectoryScanner, DirectoryWatcher, FileListView
+from image_viewer import ImageViewer
+from thumbnail_loader import ThumbnailLoader
 
 class PhotoQTUI(QWidget):
+    # Rows listed so far while a directory is scanned, then the final count
+    files_found = pyqtSignal(int)
+    directory_scanned = pyqtSignal(int)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("PhotoQT")
@@ -17,15 +24,28 @@ class PhotoQTUI(QWidget):
 
     def _init_widgets(self):
         self.btn_folder = QPushButton("Folder")
-        self.file_list = QListWidget()
+        self.file_list = FileListView()
         self.file_list.setMinimumWidth(150) 
+        self.thumbnail_loader = ThumbnailLoader(self.file_list, parent=self)
+        self._scan_generation = None
+        self.directory_scanner = DirectoryScanner(self)
+        self.directory_scanner.names_found.connect(self._add_scanned_files)
+        self.directory_scanner.scan_finished.connect(self._finish_scan)
+        self.directory_scanner.scan_failed.connect(self._fail_scan)
+        self.directory_watcher = DirectoryWatcher(self.file_list.model(), self)
+        self.directory_watcher.changed.connect(self.thumbnail_loader.files_changed)
 
         self.btn_undo = QPushButton("Undo")
         self.btn_redo = QPushButton("Redo")
 
         self.btn_save_as = QPushButton("Save As...") 
+        self.btn_export_renditions = QPushButton("Export Renditions...")
         self.btn_resize = QPushButton("Resize")
         self.btn_crop = QPushButton("Crop")
+        self.btn_save_recipe = QPushButton("Save Recipe...")
+        self.btn_apply_recipe = QPushButton("Apply Recipe...")
+        self.btn_edit_step = QPushButton("Edit Recipe Step...")
+        self.btn_remove_step = QPushButton("Remove Recipe Step...")
 
         self.filter_box = QComboBox()
         self.filter_box.addItems(["Original", "Left", "Right", "Mirror", "Sharpen", "B/W", "Color", "Contrast", "Blur"])
@@ -33,11 +53,15 @@ class PhotoQTUI(QWidget):
         
         self.theme_box = QComboBox()
         self.theme_box.addItems(["Dark Theme", "Light Theme"])
+
+        self.autosave_profile_label = QLabel("Autosave Profile:")
+        self.autosave_profile_box = QComboBox()
+        self.autosave_profile_box.addItems(export_profiles.PROFILE_NAMES)
+        self.autosave_profile_box.setCurrentText(export_profiles.DEFAULT_PROFILE)
         
-        self.picture_box = QLabel("Image will appear here")
+        self.picture_box = ImageViewer("Image will appear here")
         self.picture_box.setObjectName("picture_box")
         self.picture_box.setAlignment(Qt.AlignCenter)
-        self.picture_box.setScaledContents(True)
         self.picture_box.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
         self.filter_param_label = QLabel("Filter Intensity:")
@@ -66,9 +90,16 @@ class PhotoQTUI(QWidget):
         col1.addWidget(self.filter_param_slider)
 
         col1.addWidget(self.theme_box) 
+        col1.addWidget(self.autosave_profile_label)
+        col1.addWidget(self.autosave_profile_box)
         col1.addWidget(self.btn_save_as)
+        col1.addWidget(self.btn_export_renditions)
         col1.addWidget(self.btn_resize)
         col1.addWidget(self.btn_crop)
+        col1.addWidget(self.btn_save_recipe)
+        col1.addWidget(self.btn_apply_recipe)
+        col1.addWidget(self.btn_edit_step)
+        col1.addWidget(self.btn_remove_step)
 
         col1.addWidget(self.btn_undo)
         col1.addWidget(self.btn_redo)
@@ -95,41 +126,53 @@ class PhotoQTUI(QWidget):
             QMessageBox.critical(self, "Application Error", "Could not apply theme: Application instance not found.")
 
 
-    def _filter_files_by_extensions(self, files, extensions):
-        return [f for f in files if any(f.lower().endswith(ext) for ext in extensions)]
-
     def select_directory(self):
         selected_directory = QFileDialog.getExistingDirectory(self, "Select Image Directory")
         if selected_directory:
-            self.current_working_directory = selected_directory
-            extensions = ['.jpg', '.jpeg', '.png', '.svg', '.bmp', '.tiff']
-            try:
-                filenames = self._filter_files_by_extensions(os.listdir(self.current_working_directory), extensions)
-                self.file_list.clear()
-                if not filenames:
-                    QMessageBox.information(self, "No Images Found", "No supported image files found in the selected directory.")
-                    return False # Indicate no images were loaded
-                for filename in filenames:
-                    self.file_list.addItem(filename)
-                return True
-            except PermissionError:
-                QMessageBox.critical(self, "Permission Denied", f"Permission denied to access directory: {self.current_working_directory}")
-                self.file_list.clear()
-                return False
-            except FileNotFoundError:
-                QMessageBox.critical(self, "Directory Not Found", f"The selected directory does not exist: {self.current_working_directory}")
-                self.file_list.clear()
-                return False
-            except Exception as e:
-                QMessageBox.critical(self, "Error Listing Directory", f"An unexpected error occurred while listing directory: {e}")
-                print(f"Error listing directory: {e}")
-                self.file_list.clear()
-                return False
+            self.open_directory(selected_directory)
+            return True
         return False 
 
+    def open_directory(self, directory):
+        # Returns at once; rows are added as the scan finds them
+        self.current_working_directory = directory
+        self.file_list.model().clear()
+        self.thumbnail_loader.reset(directory)
+        self.directory_watcher.watch(directory, paused=True)
+        self._scan_generation = self.directory_scanner.scan(directory)
+
+    def _add_scanned_files(self, generation, filenames):
+        if generation != self._scan_generation:
+            return
+        self.file_list.model().append_names(filenames)
+        self.files_found.emit(self.file_list.count())
+
+    def _finish_scan(self, generation, filenames):
+        if generation != self._scan_generation:
+            return
+        self._scan_generation = None
+        self.directory_watcher.resume()
+        print(f"Listed {len(filenames)} images in {self.current_working_directory}")
+        if not filenames:
+            QMessageBox.information(self, "No Images Found", "No supported image files found in the selected directory.")
+        self.directory_scanned.emit(len(filenames))
+
+    def _fail_scan(self, generation, e):
+        if generation != self._scan_generation:
+            return
+        self._scan_generation = None
+        self.directory_watcher.stop()
+        self.file_list.model().clear()
+        if isinstance(e, PermissionError):
+            QMessageBox.critical(self, "Permission Denied", f"Permission denied to access directory: {self.current_working_directory}")
+        elif isinstance(e, FileNotFoundError):
+            QMessageBox.critical(self, "Directory Not Found", f"The selected directory does not exist: {self.current_working_directory}")
+        else:
+            QMessageBox.critical(self, "Error Listing Directory", f"An unexpected error occurred while listing directory: {e}")
+            print(f"Error listing directory: {e}")
+
     def get_selected_filename(self):
-        current_item = self.file_list.currentItem()
-        return current_item.text() if current_item else None
+        return self.file_list.current_filename()
 
     def get_selected_filter_name(self):
         return self.filter_box.currentText()
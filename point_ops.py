@@ -0,0 +1,99 @@
+import struct
+
+from PIL import ImageEnhance
+
+# Colour, contrast and B/W are point operations: each output pixel depends only on
+# the same input pixel, plus one global mean for contrast. Contrast is a 256-entry
+# lookup table once that mean is known, so it runs as one Image.point() pass instead
+# of ImageEnhance's degenerate image + blend. Once a chain has gone through B/W the
+# pixels are gray, so everything up to the end of the chain collapses into a single
+# table on the L image, with each contrast mean read off the remapped histogram.
+# The blend arithmetic mirrors Pillow's C code, single precision included, so the
+# results are bit-identical to ImageEnhance.
+
+POINT_OPS = ["B/W", "Color", "Contrast"]
+_IDENTITY = list(range(256))
+
+
+def _f32(value):
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+def _blend_value(degenerate, value, factor):
+    # Image.blend: in1 + alpha * (in2 - in1) in float, then clipped and truncated
+    temp = _f32(degenerate + _f32(factor * (value - degenerate)))
+    if temp <= 0.0:
+        return 0
+    if temp >= 255.0:
+        return 255
+    return int(temp)
+
+
+def contrast_table(mean, factor):
+    factor = _f32(factor)
+    return [_blend_value(mean, value, factor) for value in range(256)]
+
+
+def histogram_mean(histogram):
+    # Same rounding as ImageEnhance.Contrast's int(ImageStat mean + 0.5)
+    return int(sum(value * count for value, count in enumerate(histogram)) / sum(histogram) + 0.5)
+
+
+def _point_table(image, table):
+    # Colour channels share the table; alpha passes through
+    if image.mode == "RGBA":
+        return table * 3 + _IDENTITY
+    return table * len(image.getbands())
+
+
+def _gray_table(histogram, ops):
+    # One table for a chain run on an L image; colour is a no-op on one channel
+    table = _IDENTITY
+    for name, value in ops:
+        if name == "Contrast" and value != 50:
+            remapped = [0] * 256
+            for source_value, count in enumerate(histogram):
+                remapped[table[source_value]] += count
+            step = contrast_table(histogram_mean(remapped), value / 50.0)
+            table = [step[index] for index in table]
+    return table
+
+
+def apply_point_ops(image, ops):
+    # ops: [(name, value)] with names from POINT_OPS, applied in order
+    if image.mode not in ("L", "RGB", "RGBA"):
+        return _apply_enhance(image, ops)
+
+    for index, (name, value) in enumerate(ops):
+        if name not in POINT_OPS:
+            raise ValueError(f"Not a point operation: '{name}'")
+        if name == "B/W" or image.mode == "L":
+            # On an L image B/W only means converting to RGB at the end
+            to_rgb = image.mode != "L" or any(op_name == "B/W" for op_name, _ in ops[index:])
+            gray = image.convert("L") if image.mode != "L" else image
+            table = _gray_table(gray.histogram(), ops[index:])
+            result = gray.point(table) if table is not _IDENTITY else gray
+            return result.convert("RGB") if to_rgb else result
+        if value == 50:
+            # Factor 1.0 reproduces the input exactly for both
+            continue
+        if name == "Color":
+            image = ImageEnhance.Color(image).enhance(value / 50.0)
+        else:
+            mean = histogram_mean(image.convert("L").histogram())
+            image = image.point(_point_table(image, contrast_table(mean, value / 50.0)))
+    return image
+
+
+def _apply_enhance(image, ops):
+    # Modes without a per-channel table (CMYK, P, ...) keep the ImageEnhance path
+    for name, value in ops:
+        if name == "B/W":
+            image = image.convert("L").convert("RGB")
+        elif name == "Color":
+            image = ImageEnhance.Color(image).enhance(value / 50.0)
+        elif name == "Contrast":
+            image = ImageEnhance.Contrast(image).enhance(value / 50.0)
+        else:
+            raise ValueError(f"Not a point operation: '{name}'")
+    return image
@@ -0,0 +1,40 @@
+from PyQt5.QtGui import QImage
+
+# PIL mode -> (raw mode to pull from PIL, QImage format, bytes per pixel)
+_DIRECT_FORMATS = {
+    "RGB": ("RGB", QImage.Format_RGB888, 3),
+    "RGBA": ("RGBA", QImage.Format_RGBA8888, 4),
+    "RGBX": ("RGBX", QImage.Format_RGBX8888, 4),
+    "L": ("L", QImage.Format_Grayscale8, 1),
+    "I;16": ("I;16", QImage.Format_Grayscale16, 2),
+}
+
+
+def displayable(image):
+    if image.mode in _DIRECT_FORMATS:
+        return image
+    if image.mode == "P":
+        return image.convert("RGBA" if "transparency" in image.info else "RGB")
+    if image.mode == "1":
+        return image.convert("L")
+    if image.mode in ("LA", "PA", "RGBa", "La"):
+        return image.convert("RGBA")
+    if image.mode.startswith("I;16"):
+        return image.convert("I").convert("I;16")
+    if image.mode in ("I", "F"):
+        return image.convert("L")
+    return image.convert("RGB")
+
+
+def pil_to_qimage(image):
+    # Wraps the raw pixel rows in a QImage without any encode/decode step. The
+    # explicit bytesPerLine keeps odd widths from being read with the 32-bit
+    # scanline alignment QImage assumes by default.
+    image = displayable(image)
+    raw_mode, qformat, bytes_per_pixel = _DIRECT_FORMATS[image.mode]
+    width, height = image.size
+    data = image.tobytes("raw", raw_mode)
+    qimage = QImage(data, width, height, width * bytes_per_pixel, qformat)
+    # QImage does not own the buffer, so keep it alive for as long as the QImage is
+    qimage._pil_buffer = data
+    return qimage
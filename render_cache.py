@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+
+from PIL import Image
+
+import edit_recipe
+
+# Rendered edits on disk, addressed by the content hash of the source file plus
+# the normalized recipe, so the same edits on the same pixels are a lookup in a
+# later session too, whatever the file is called or wherever it moved. Entries are
+# uncompressed TIFFs: lossless for every editor mode and quick to read back.
+# The cache also remembers which render each output file was last written from,
+# so saving an unchanged edit does not encode it again. An entry is as big as the
+# raw pixels (about 200 MB for a 50 MP RGBA edit), so the editor only keeps one
+# when asked to:
+#   PHOTOQT_RENDER_CACHE=1             cache in DEFAULT_CACHE_DIRECTORY
+#   PHOTOQT_RENDER_CACHE=/some/dir     cache there (default: off)
+
+CACHE_ENV = "PHOTOQT_RENDER_CACHE"
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "photoqt", "renders")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# Eviction trims below the cap so it does not run again on the very next insert
+EVICT_TO_FRACTION = 0.9
+HASH_CHUNK = 1024 * 1024
+OUTPUTS_FILE = "outputs.json"
+
+
+def directory_from_environment():
+    # None when the cache is off
+    setting = os.environ.get(CACHE_ENV, "")
+    if not setting or setting == "0":
+        return None
+    return DEFAULT_CACHE_DIRECTORY if setting == "1" else setting
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RenderCache:
+    def __init__(self, cache_directory=DEFAULT_CACHE_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_directory = cache_directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes_skipped = 0
+        self._lock = threading.Lock()
+        # Source hashes by (path, mtime, size), so each file is read for hashing once
+        self._digests = {}
+        os.makedirs(self.cache_directory, exist_ok=True)
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_directory)
+                                if entry.is_file() and entry.name.endswith(".tif"))
+        self._outputs_path = os.path.join(self.cache_directory, OUTPUTS_FILE)
+        self._outputs = self._read_outputs()
+        # Entries are written behind the render that produced them
+        self._jobs = queue.Queue()
+        self._worker = threading.Thread(target=self._work_loop, name="render-cache", daemon=True)
+        self._worker.start()
+
+    def source_digest(self, path):
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._digests.get(memo_key)
+        if digest is None:
+            digest = file_digest(path)
+            with self._lock:
+                self._digests[memo_key] = digest
+        return digest
+
+    def key(self, source_path, steps):
+        chain = "\n".join(edit_recipe.normalize_steps(steps))
+        return hashlib.sha256(f"{self.source_digest(source_path)}\n{chain}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_directory, key + ".tif")
+
+    def get(self, key):
+        entry_path = self._entry_path(key)
+        try:
+            # load() reads the pixels and closes the file; no detaching copy needed
+            image = Image.open(entry_path)
+            image.load()
+            os.utime(entry_path)
+        except (FileNotFoundError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return image
+
+    def put(self, key, image):
+        self._jobs.put((key, image))
+
+    def wait_idle(self):
+        self._jobs.join()
+
+    def _work_loop(self):
+        while True:
+            key, image = self._jobs.get()
+            try:
+                self._store(key, image)
+            except Exception as e:
+                print(f"[RenderCache] Could not cache render {key[:12]}: {e}")
+            finally:
+                self._jobs.task_done()
+
+    def _store(self, key, image):
+        entry_path = self._entry_path(key)
+        if os.path.exists(entry_path):
+            return
+        temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            image.save(temp_path, format="TIFF")
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._total_bytes += os.path.getsize(entry_path)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.cache_directory) if entry.is_file() and entry.name.endswith(".tif")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self._total_bytes = sum(entry.stat().st_size for entry in entries)
+        target = self.max_bytes * EVICT_TO_FRACTION
+        for entry in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= size
+            except OSError:
+                pass
+        print(f"[RenderCache] Evicted least recently used renders, {self._total_bytes / (1024 * 1024):.1f} MB in cache.")
+
+    def _read_outputs(self):
+        try:
+            with open(self._outputs_path) as outputs_file:
+                outputs = json.load(outputs_file)
+        except (OSError, ValueError):
+            return {}
+        return {path: record for path, record in outputs.items() if os.path.exists(path)}
+
+    def output_is_current(self, path, key):
+        # True when path still holds exactly what was written from key
+        with self._lock:
+            record = self._outputs.get(os.path.abspath(path))
+        if record is None or record["key"] != key:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_mtime_ns == record["mtime_ns"] and stat.st_size == record["size"]
+
+    def record_output(self, path, key):
+        stat = os.stat(path)
+        with self._lock:
+            self._outputs[os.path.abspath(path)] = {"key": key, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+            temp_path = f"{self._outputs_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w") as outputs_file:
+                json.dump(self._outputs, outputs_file)
+            os.replace(temp_path, self._outputs_path)
+
+    def skip_write(self, path, key):
+        if key is None or not self.output_is_current(path, key):
+            return False
+        with self._lock:
+            self.writes_skipped += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes_skipped": self.writes_skipped,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
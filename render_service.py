@@ -0,0 +1,335 @@
+# Local HTTP service running the editor's op chains for other tools, offline and
+# without Qt. Renders run in a bounded pool of worker processes; each request is
+# one job on one worker, whose blur/sharpen threads are capped so the workers
+# together do not oversubscribe the CPUs. Once max-queue requests are admitted
+# and unfinished, new ones get 503 with Retry-After instead of waiting; their
+# bodies are never read, so memory stays bounded by the admitted requests.
+#   python render_service.py                       (http://127.0.0.1:8765)
+#   python render_service.py --socket /tmp/photoqt-render.sock --workers 4
+#   curl --data-binary @in.jpg "http://127.0.0.1:8765/render?op=Contrast=70&op=Resize=800x600&format=png" -o out.png
+#   curl --unix-socket /tmp/photoqt-render.sock http://localhost/stats
+# POST /render  body: the encoded image; query: op (repeatable, as batch_cli --op),
+#               format (output extension, default: the input's), profile (export profile)
+# GET /stats    latency percentiles, queue depth and request counts as JSON
+# GET /health
+import argparse
+import collections
+import concurrent.futures
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+import export_profiles
+import image_ops
+import strip_parallel
+from autosave import encode_image
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Admitted (queued or running) requests per worker before new ones are turned away
+QUEUE_PER_WORKER = 4
+DEFAULT_MAX_REQUEST_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_PIXELS = 100_000_000
+DEFAULT_MAX_OPS = 64
+DEFAULT_TIMEOUT = 120.0
+RETRY_AFTER_SECONDS = 1
+# A turned-away request's body is read and dropped for at most this long
+DISCARD_SECONDS = 2.0
+DISCARD_CHUNK = 64 * 1024
+LATENCY_WINDOW = 1000
+PERCENTILES = (50, 90, 99)
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(status, message)
+        self.status = status
+        self.message = message
+
+
+def render_request(data, ops, extension, profile, max_pixels):
+    # Runs in a worker process; returns (encoded bytes, content type)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > max_pixels:
+                raise RequestError(413, f"Image has {image.width * image.height} pixels, the limit is {max_pixels}")
+            image.load()
+            image_format = image.format
+            result = image_ops.apply_ops(image, ops)
+    except Image.DecompressionBombError as e:
+        raise RequestError(413, str(e)) from None
+    except (OSError, SyntaxError) as e:
+        raise RequestError(400, f"Could not decode image: {e}") from None
+    except ValueError as e:
+        # Ops that do not fit the image, e.g. a crop outside it
+        raise RequestError(422, str(e)) from None
+    if extension:
+        image_format = Image.registered_extensions()[extension]
+    output = io.BytesIO()
+    try:
+        encode_image(result, output, image_format, profile)
+    except (OSError, ValueError, KeyError) as e:
+        # The result does not fit the format, e.g. LA or CMYK as PNG/JPEG
+        raise RequestError(422, f"Could not encode a {result.mode} image as {image_format}: {e}") from None
+    return output.getvalue(), Image.MIME.get(image_format, "application/octet-stream")
+
+
+def percentile(sorted_values, percent):
+    # Nearest rank
+    if not sorted_values:
+        return None
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class RenderService:
+    def __init__(self, workers=None, max_queue=None, max_request_bytes=DEFAULT_MAX_REQUEST_BYTES,
+                 max_pixels=DEFAULT_MAX_PIXELS, max_ops=DEFAULT_MAX_OPS, timeout=DEFAULT_TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        self.threads_per_worker = max((os.cpu_count() or 1) // self.workers, 1)
+        self.max_queue = max_queue or self.workers * QUEUE_PER_WORKER
+        self.max_request_bytes = max_request_bytes
+        self.max_pixels = max_pixels
+        self.max_ops = max_ops
+        self.timeout = timeout
+        self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                            initializer=strip_parallel.set_threads,
+                                                            initargs=(self.threads_per_worker,))
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._counts = collections.Counter()
+        self._started = time.monotonic()
+
+    def parse_request(self, query):
+        specs = query.get("op", [])
+        if len(specs) > self.max_ops:
+            raise RequestError(400, f"{len(specs)} ops requested, the limit is {self.max_ops}")
+        try:
+            ops = [image_ops.parse_op(spec) for spec in specs]
+        except ValueError as e:
+            raise RequestError(400, str(e)) from None
+        extension = None
+        if "format" in query:
+            extension = "." + query["format"][-1].strip().lower().lstrip(".")
+            if Image.registered_extensions().get(extension) not in Image.SAVE:
+                raise RequestError(400, f"Unsupported output format: '{query['format'][-1]}'")
+        profile = query.get("profile", [export_profiles.DEFAULT_PROFILE])[-1]
+        if profile not in export_profiles.PROFILES:
+            raise RequestError(400, f"Unknown export profile: '{profile}'")
+        return ops, extension, profile
+
+    def render(self, read_body, ops, extension=None, profile=export_profiles.DEFAULT_PROFILE):
+        # Returns (bytes, content type) or raises RequestError. read_body() returns
+        # the encoded image; it is only called once the request has a slot.
+        with self._lock:
+            if self._admitted >= self.max_queue:
+                self._counts["rejected"] += 1
+                raise RequestError(503, f"Render queue is full ({self.max_queue} requests)")
+            self._admitted += 1
+        try:
+            data = read_body()
+            future = self._pool.submit(render_request, data, ops, extension, profile, self.max_pixels)
+        except BaseException:
+            self._finish_job(None)
+            raise
+        # The slot is freed when the worker is done, not when the client stops
+        # waiting, so timed-out renders still count against the queue
+        future.add_done_callback(self._finish_job)
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise RequestError(504, f"Render took longer than {self.timeout:g}s") from None
+        except concurrent.futures.process.BrokenProcessPool:
+            raise RequestError(500, "A render worker died") from None
+
+    def _finish_job(self, future):
+        with self._lock:
+            self._admitted -= 1
+
+    def record(self, status, seconds):
+        with self._lock:
+            self._counts[str(status)] += 1
+            if status == 200:
+                self._latencies.append(seconds)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            admitted = self._admitted
+            counts = dict(self._counts)
+        latency = {f"p{percent}": percentile(latencies, percent) for percent in PERCENTILES}
+        latency = {name: round(value * 1000, 1) if value is not None else None for name, value in latency.items()}
+        latency["max"] = round(latencies[-1] * 1000, 1) if latencies else None
+        latency["window"] = len(latencies)
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "max_queue": self.max_queue,
+            "queue_depth": admitted,
+            "waiting": max(admitted - self.workers, 0),
+            "latency_ms": latency,
+            "requests": counts,
+            "uptime_seconds": round(time.monotonic() - self._started, 1),
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    server_version = "PhotoQTRender/1"
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/stats":
+            self._send_json(200, self.server.service.stats())
+        elif path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"Not found: {path}"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        self._unread_bytes = 0
+        service = self.server.service
+        url = urlsplit(self.path)
+        try:
+            if url.path != "/render":
+                raise RequestError(404, f"Not found: {url.path}")
+            length = self.headers.get("Content-Length")
+            if length is None:
+                raise RequestError(411, "Content-Length is required")
+            self._unread_bytes = int(length) if length.isdigit() else 0
+            if not length.isdigit() or int(length) > service.max_request_bytes:
+                raise RequestError(413, f"Request body is limited to {service.max_request_bytes} bytes")
+            ops, extension, profile = service.parse_request(parse_qs(url.query))
+            body, content_type = service.render(lambda: self._read_body(int(length)), ops, extension, profile)
+        except RequestError as e:
+            service.record(e.status, time.perf_counter() - start)
+            self._send_error(e.status, e.message)
+            return
+        except Exception as e:
+            service.record(500, time.perf_counter() - start)
+            print(f"[RenderService] Error rendering {self.path}: {e}")
+            self._send_error(500, f"{type(e).__name__}: {e}")
+            return
+        service.record(200, time.perf_counter() - start)
+        self._send(200, body, content_type)
+
+    def _read_body(self, length):
+        data = self.rfile.read(length)
+        self._unread_bytes = 0
+        if len(data) < length:
+            raise RequestError(400, f"Request body ended after {len(data)} of {length} bytes")
+        return data
+
+    def _send_error(self, status, message):
+        headers = {"Retry-After": str(RETRY_AFTER_SECONDS)} if status == 503 else {}
+        if self._unread_bytes:
+            # The unread body would be parsed as the next request
+            headers["Connection"] = "close"
+            self.close_connection = True
+        self._send(status, json.dumps({"error": message}).encode("utf-8"), "application/json", headers)
+        if self._unread_bytes:
+            self._discard_body()
+
+    def _discard_body(self):
+        # Clients that send the whole body before reading the reply would otherwise
+        # get a reset connection instead of the error; nothing is kept
+        deadline = time.monotonic() + DISCARD_SECONDS
+        try:
+            self.connection.settimeout(DISCARD_SECONDS)
+            while self._unread_bytes > 0 and time.monotonic() < deadline:
+                chunk = self.rfile.read1(min(self._unread_bytes, DISCARD_CHUNK))
+                if not chunk:
+                    break
+                self._unread_bytes -= len(chunk)
+        except OSError:
+            pass
+
+    def _send_json(self, status, document):
+        self._send(status, json.dumps(document).encode("utf-8"), "application/json")
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[RenderService] {self.address_string()} {format % args}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # Unix socket peers have no address; the handler's logging expects one
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, RenderRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), RenderRequestHandler)
+    server.service = service
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve the editor's image operations to local tools.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port (default: %(default)s)")
+    parser.add_argument("--socket", default=None, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--max-queue", type=int, default=None,
+                        help=f"Requests admitted at once before 503 (default: {QUEUE_PER_WORKER} per worker)")
+    parser.add_argument("--max-request-mb", type=float, default=DEFAULT_MAX_REQUEST_BYTES / (1024 * 1024),
+                        help="Largest accepted request body (default: %(default)g)")
+    parser.add_argument("--max-megapixels", type=float, default=DEFAULT_MAX_PIXELS / 1_000_000,
+                        help="Largest accepted image (default: %(default)g)")
+    parser.add_argument("--max-ops", type=int, default=DEFAULT_MAX_OPS, help="Most ops per request (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Seconds a request waits for its render (default: %(default)g)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    service = RenderService(args.workers, args.max_queue, int(args.max_request_mb * 1024 * 1024),
+                            int(args.max_megapixels * 1_000_000), args.max_ops, args.timeout)
+    server = create_server(service, args.host, args.port, args.socket)
+    where = args.socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"[RenderService] Listening on {where} with {service.workers} workers "
+          f"x {service.threads_per_worker} threads, queue limit {service.max_queue}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import collections
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+PREVIEW = "preview"
+COMMIT = "commit"
+
+
+class RenderWorker(QObject):
+    # Emitted from the worker thread; Qt queues them onto the GUI thread
+    job_finished = pyqtSignal(int, object)
+    job_failed = pyqtSignal(int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._condition = threading.Condition()
+        self._commits = collections.deque()
+        self._preview = None
+        self._next_job_id = 0
+        self._latest_preview_id = 0
+        self._callbacks = {}
+        self.dropped_jobs = 0
+
+        self.job_finished.connect(self._deliver_result)
+        self.job_failed.connect(self._deliver_error)
+
+        self._thread = threading.Thread(target=self._run, name="render-worker", daemon=True)
+        self._thread.start()
+
+    def submit_preview(self, render, on_done, on_error=None):
+        # Only the newest preview matters: a pending one is replaced outright and a
+        # running one has its result discarded when it lands.
+        with self._condition:
+            job_id = self._new_job_id()
+            if self._preview is not None:
+                self._callbacks.pop(self._preview[0], None)
+                self.dropped_jobs += 1
+            self._preview = (job_id, render)
+            self._latest_preview_id = job_id
+            self._callbacks[job_id] = (PREVIEW, on_done, on_error)
+            self._condition.notify()
+        return job_id
+
+    def submit(self, render, on_done, on_error=None):
+        # Committed work is never coalesced; it also makes any outstanding preview stale
+        with self._condition:
+            job_id = self._new_job_id()
+            self._drop_preview()
+            self._commits.append((job_id, render))
+            self._callbacks[job_id] = (COMMIT, on_done, on_error)
+            self._condition.notify()
+        return job_id
+
+    def cancel_all(self):
+        with self._condition:
+            self._drop_preview()
+            self.dropped_jobs += len(self._commits)
+            self._commits.clear()
+            self._callbacks.clear()
+
+    def is_idle(self):
+        with self._condition:
+            return not self._callbacks
+
+    def _new_job_id(self):
+        self._next_job_id += 1
+        return self._next_job_id
+
+    def _drop_preview(self):
+        if self._preview is not None:
+            self.dropped_jobs += 1
+            self._preview = None
+        self._latest_preview_id = 0
+        for job_id in [job_id for job_id, callbacks in self._callbacks.items() if callbacks[0] == PREVIEW]:
+            del self._callbacks[job_id]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._commits and self._preview is None:
+                    self._condition.wait()
+                if self._commits:
+                    job_id, render = self._commits.popleft()
+                else:
+                    job_id, render = self._preview
+                    self._preview = None
+                    if job_id not in self._callbacks:
+                        continue
+            try:
+                result = render()
+            except Exception as e:
+                self.job_failed.emit(job_id, e)
+            else:
+                self.job_finished.emit(job_id, result)
+
+    def _take_callbacks(self, job_id):
+        with self._condition:
+            callbacks = self._callbacks.pop(job_id, None)
+            if callbacks is not None and callbacks[0] == PREVIEW and job_id != self._latest_preview_id:
+                callbacks = None
+            if callbacks is None:
+                self.dropped_jobs += 1
+            return callbacks
+
+    def _deliver_result(self, job_id, result):
+        callbacks = self._take_callbacks(job_id)
+        if callbacks is not None:
+            callbacks[1](result)
+
+    def _deliver_error(self, job_id, error):
+        callbacks = self._take_callbacks(job_id)
+        if callbacks is not None and callbacks[2] is not None:
+            callbacks[2](error)
@@ -0,0 +1,163 @@
+# Exports a set of renditions (sizes x formats) of one image from a single
+# decode. Sizes are made largest first, each resampled from the smallest image
+# already made that still covers it, so a thumbnail comes from the web size and
+# not from the full image. Every resample is a whole-pixel reduce() for the large
+# part of the step and LANCZOS for the rest (Pillow's reducing_gap). Encoding and
+# writing run on a thread pool while the next size is resampled.
+#   python renditions.py photo.jpg -o out
+#   python renditions.py photo.jpg -o out --size web=1600 --size thumb=256x256 --format jpg --format webp
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+from PIL import Image
+
+import export_profiles
+import image_ops
+from autosave import write_image
+from instrumentation import tracer
+
+FULL_SIZE = "full"
+DEFAULT_SIZES = ["print=full", "web=2048", "thumb=320"]
+DEFAULT_FORMATS = ["jpg", "webp"]
+# LANCZOS is left at least this much to shrink after reduce(); 3.0 is
+# indistinguishable from resampling the whole way with LANCZOS
+REDUCING_GAP = 3.0
+WRITE_THREADS = os.cpu_count() or 1
+
+
+def parse_size(spec):
+    # "web=2048" (longest side), "thumb=320x240" (fit in a box), "print=full"
+    name, _, size = spec.partition("=")
+    name = name.strip()
+    size = size.strip().lower()
+    if not name or not size:
+        raise ValueError(f"Invalid rendition size '{spec}', expected NAME=SIZE")
+    if size == FULL_SIZE:
+        return name, None
+    try:
+        if "x" in size:
+            width, height = (int(part) for part in size.split("x"))
+        else:
+            width = height = int(size)
+        if width <= 0 or height <= 0:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"Invalid rendition size '{spec}'") from None
+    return name, (width, height)
+
+
+def parse_format(spec):
+    extension = "." + spec.strip().lower().lstrip(".")
+    if Image.registered_extensions().get(extension) is None:
+        raise ValueError(f"Unsupported rendition format: '{spec}'")
+    return extension
+
+
+def fit_size(size, box):
+    # Never enlarges; sizes are fitted from the full image so cascading does not drift
+    if box is None:
+        return size
+    ratio = min(box[0] / size[0], box[1] / size[1], 1.0)
+    return (max(round(size[0] * ratio), 1), max(round(size[1] * ratio), 1))
+
+
+def _resampling_source(image):
+    # Modes resize() cannot filter properly
+    if image.mode == "P":
+        return image.convert("RGBA" if "transparency" in image.info else "RGB")
+    if image.mode == "1":
+        return image.convert("L")
+    if image.mode.startswith("I;16"):
+        return image.convert("I")
+    return image
+
+
+def _writable(image):
+    # save() keeps its encoder options on the Image object while it runs, so writes
+    # on different threads each get their own object over the same pixels
+    image.load()
+    return image_ops.freeze(image._new(image.im))
+
+
+def build_renditions(image, sizes):
+    # sizes: [(name, box or None)]; yields (name, image), largest first
+    targets = sorted(((name, fit_size(image.size, box)) for name, box in sizes),
+                     key=lambda target: target[1][0] * target[1][1], reverse=True)
+    made = []
+    for name, size in targets:
+        if size == image.size:
+            yield name, image
+            continue
+        if not made:
+            made.append(_resampling_source(image))
+        source = min((candidate for candidate in made if candidate.width >= size[0] and candidate.height >= size[1]),
+                     key=lambda candidate: candidate.width * candidate.height)
+        with tracer.span("rendition", source, size=f"{size[0]}x{size[1]}") as span:
+            result = source.resize(size, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+            span.output(result)
+        made.append(result)
+        yield name, result
+
+
+def export_renditions(image, output_directory, stem, sizes, extensions, profile=export_profiles.DEFAULT_PROFILE,
+                      threads=None, report=print):
+    # Writes <stem>_<name><extension> for every size and extension; returns [(path, error)] for failed writes
+    os.makedirs(output_directory, exist_ok=True)
+    start = time.perf_counter()
+    failures = []
+    futures = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads or WRITE_THREADS,
+                                               thread_name_prefix="renditions") as pool:
+        for name, rendition in build_renditions(image, sizes):
+            for extension in extensions:
+                path = os.path.join(output_directory, f"{stem}_{name}{extension}")
+                futures[pool.submit(write_image, _writable(rendition), path, profile)] = path
+        for future in concurrent.futures.as_completed(futures):
+            path = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures.append((path, f"{type(e).__name__}: {e}"))
+                report(f"FAILED {path}: {e}")
+    elapsed = time.perf_counter() - start
+    written = len(futures) - len(failures)
+    report(f"Exported {written}/{len(futures)} renditions to {output_directory} in {elapsed:.2f}s "
+           f"({written / max(elapsed, 1e-9):.1f} renditions/sec).")
+    return failures
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Export several sizes and formats of an image from one decode.")
+    parser.add_argument("input", help="Image to export")
+    parser.add_argument("-o", "--output", required=True, help="Output directory")
+    parser.add_argument("--size", dest="sizes", action="append", default=None, metavar="NAME=SIZE",
+                        help=f"Rendition size: longest side, WxH box or '{FULL_SIZE}' "
+                             f"(default: {' '.join(DEFAULT_SIZES)})")
+    parser.add_argument("--format", dest="formats", action="append", default=None, metavar="EXT",
+                        help=f"Output format, repeatable (default: {' '.join(DEFAULT_FORMATS)})")
+    parser.add_argument("--profile", choices=export_profiles.PROFILE_NAMES, default=export_profiles.DEFAULT_PROFILE,
+                        help="Encoder settings (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=None, help="Concurrent writes (default: CPU count)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        sizes = [parse_size(spec) for spec in args.sizes or DEFAULT_SIZES]
+        extensions = [parse_format(spec) for spec in args.formats or DEFAULT_FORMATS]
+        with Image.open(args.input) as image:
+            image.load()
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    stem = os.path.splitext(os.path.basename(args.input))[0]
+    failures = export_renditions(image, args.output, stem, sizes, extensions, args.profile, args.threads)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import concurrent.futures
+import math
+import os
+import threading
+
+from PIL import Image
+
+# Neighbourhood filters (blur, sharpen) on large images run as overlapping
+# horizontal strips on a shared thread pool; Pillow releases the GIL inside its
+# filter kernels, so the strips use several cores. Each strip is rendered with
+# enough halo rows above and below that every kept row sees the same neighbours
+# it would in the whole image, which keeps the output bit-identical.
+#   PHOTOQT_THREADS=4        threads used (default: CPU count, 1 turns strips off)
+
+THREADS_ENV = "PHOTOQT_THREADS"
+# Smaller images are not worth the split and stitch
+MIN_PARALLEL_PIXELS = 1024 * 1024
+MIN_STRIP_ROWS = 64
+STRIP_MODES = ("L", "RGB", "RGBA")
+# ImageFilter.SMOOTH, which Sharpness blends against, is 3x3
+SHARPEN_HALO = 1
+
+
+def blur_halo(radius):
+    # Pillow approximates the Gaussian with three extended box passes; each widens
+    # the footprint by at most ceil(radius) + 1 rows
+    return 3 * (math.ceil(radius) + 1)
+
+
+def _default_threads():
+    setting = os.environ.get(THREADS_ENV, "")
+    if setting.isdigit() and int(setting) > 0:
+        return int(setting)
+    return os.cpu_count() or 1
+
+
+_threads = _default_threads()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def set_threads(count):
+    global _threads, _executor
+    with _executor_lock:
+        count = max(int(count), 1)
+        if count != _threads and _executor is not None:
+            # Strips already submitted still finish on the old pool
+            _executor.shutdown(wait=False)
+            _executor = None
+        _threads = count
+
+
+def get_threads():
+    return _threads
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=_threads, thread_name_prefix="strips")
+        return _executor
+
+
+def _strip_bounds(height, halo, threads):
+    # One strip per thread: more strips would only add halo rows to recompute
+    count = min(threads, height // max(MIN_STRIP_ROWS, 2 * halo))
+    return [(height * index // count, height * (index + 1) // count) for index in range(count)]
+
+
+def map_strips(image, halo, render, threads=None):
+    # render(image) -> image of the same size; returns what render(image) would
+    threads = threads or _threads
+    width, height = image.size
+    if threads <= 1 or image.mode not in STRIP_MODES or width * height < MIN_PARALLEL_PIXELS:
+        return render(image)
+    bounds = _strip_bounds(height, halo, threads)
+    if len(bounds) < 2:
+        return render(image)
+    # Strips are cropped from several threads at once; the pixels must be loaded first
+    image.load()
+
+    def run(top, bottom):
+        read_top = max(top - halo, 0)
+        result = render(image.crop((0, read_top, width, min(bottom + halo, height))))
+        return result.crop((0, top - read_top, width, bottom - read_top))
+
+    futures = [_get_executor().submit(run, top, bottom) for top, bottom in bounds]
+    strips = [future.result() for future in futures]
+    output = Image.new(strips[0].mode, image.size)
+    for (top, _), strip in zip(bounds, strips):
+        output.paste(strip, (0, top))
+    return output
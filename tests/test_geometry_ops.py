@@ -0,0 +1,65 @@
+# Fused geometry runs against the same ops applied one at a time.
+#   python -m pytest tests
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from PIL import Image, ImageChops
+
+import geometry_ops
+import image_ops
+
+
+def sample_image():
+    image = Image.new("RGB", (640, 480), (255, 0, 0))
+    image.paste((0, 255, 0), (150, 120, 350, 260))
+    return image
+
+
+def sequential(image, ops):
+    for name, value in ops:
+        image = image_ops.apply_op(image, name, value)
+    return image
+
+
+def crop_rotate_chains(count, seed=1):
+    # Crops followed by free and quarter turns, mirrors and other crops, all in bounds
+    chooser = random.Random(seed)
+    chains = []
+    for _ in range(count):
+        size = (640, 480)
+        ops = []
+        for position in range(chooser.randint(2, 4)):
+            if position == 0 or chooser.random() < 0.3:
+                x, y = chooser.randint(0, size[0] // 3), chooser.randint(0, size[1] // 3)
+                width, height = size[0] - x, size[1] - y
+                op = ("Crop", (x, y, chooser.randint(min(10, width), width), chooser.randint(min(10, height), height)))
+            else:
+                op = (chooser.choice(["Left", "Right", "Mirror"]), chooser.choice([0, 33, 50, 100]))
+            ops.append(op)
+            size = geometry_ops.plan(size, [op])[1]
+        chains.append(ops)
+    return chains
+
+
+def test_crop_then_free_rotation_fills_corners_black():
+    ops = [("Crop", (100, 100, 300, 200)), ("Left", 33)]
+    fused = geometry_ops.apply_geometry_ops(sample_image(), ops)
+    assert fused.getpixel((0, 0)) == (0, 0, 0)
+    assert fused.tobytes() == sequential(sample_image(), ops).tobytes()
+
+
+@pytest.mark.parametrize("ops", crop_rotate_chains(100))
+def test_crop_rotate_chains_match_sequential(ops):
+    image = sample_image()
+    fused = geometry_ops.apply_geometry_ops(image, ops)
+    expected = sequential(image, ops)
+    assert fused.size == expected.size
+    # Fusing consecutive rotations resamples once instead of twice, so only
+    # content (the exposed corners above all) has to agree, not every edge pixel
+    red, green, blue = ImageChops.difference(fused, expected).split()
+    same = ImageChops.lighter(red, ImageChops.lighter(green, blue)).histogram()[0]
+    assert fused.width * fused.height - same <= 0.05 * fused.width * fused.height
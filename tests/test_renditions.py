@@ -0,0 +1,51 @@
+# Rendition exports written on several threads against one-at-a-time writes.
+#   python -m pytest tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFilter
+
+import export_profiles
+import image_ops
+import renditions
+from autosave import write_image
+
+SIZES = ["print=full", "web=800", "thumb=200"]
+FORMATS = ["jpg", "webp", "png"]
+
+
+def sample_image():
+    gradient = Image.linear_gradient("L").resize((1200, 900))
+    grain = Image.effect_noise((1200, 900), 40).filter(ImageFilter.GaussianBlur(1))
+    return image_ops.freeze(Image.merge("RGB", (gradient, grain, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT))))
+
+
+def test_threaded_export_matches_single_writes_and_leaves_source_alone(tmp_path):
+    image = sample_image()
+    pixels = image.tobytes()
+    info = dict(image.info)
+    sizes = [renditions.parse_size(spec) for spec in SIZES]
+    extensions = [renditions.parse_format(spec) for spec in FORMATS]
+    profile = export_profiles.FAST_PREVIEW
+
+    expected = {}
+    for name, rendition in renditions.build_renditions(image, sizes):
+        for extension in extensions:
+            path = tmp_path / f"expected_{name}{extension}"
+            write_image(rendition, str(path), profile)
+            expected[f"photo_{name}{extension}"] = path.read_bytes()
+
+    # The options of concurrent saves of one Image object used to mix
+    for attempt in range(5):
+        output_directory = tmp_path / f"out{attempt}"
+        failures = renditions.export_renditions(image, str(output_directory), "photo", sizes, extensions, profile,
+                                                threads=len(sizes) * len(extensions), report=lambda message: None)
+        assert failures == []
+        for filename, data in expected.items():
+            assert (output_directory / filename).read_bytes() == data, filename
+
+    assert image.tobytes() == pixels
+    assert image.info == info
+    assert getattr(image, "encoderinfo", {}) == {}
@@ -0,0 +1,55 @@
+# Banded resizes against whole-image ones, and the rows they read per band.
+#   python -m pytest tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageChops, ImageFilter
+
+import tiled_image
+
+MAX_BAND_BYTES = 1 << 20
+
+
+def sample_tiff(path, size):
+    gradient = Image.linear_gradient("L").resize(size)
+    grain = Image.effect_noise(size, 40).filter(ImageFilter.GaussianBlur(2))
+    Image.merge("RGB", (gradient, grain, gradient.transpose(Image.Transpose.FLIP_TOP_BOTTOM))).save(path)
+    return str(path)
+
+
+def resize_tiled(monkeypatch, source_path, output_path, size):
+    # Returns the largest band (in bytes) any pass read
+    peak = [0]
+    read_band = tiled_image.BandedSource.read_band
+
+    def recording_read_band(self, top, bottom):
+        band = read_band(self, top, bottom)
+        peak[0] = max(peak[0], band.width * band.height * len(band.getbands()))
+        return band
+
+    monkeypatch.setattr(tiled_image.BandedSource, "read_band", recording_read_band)
+    tiled_image.process_tiled(source_path, str(output_path), [("Resize", size)], max_band_bytes=MAX_BAND_BYTES,
+                              report=lambda message: None)
+    return peak[0]
+
+
+def test_downscale_matches_whole_image_resize(tmp_path, monkeypatch):
+    source_path = sample_tiff(tmp_path / "source.tif", (1000, 4000))
+    peak = resize_tiled(monkeypatch, source_path, tmp_path / "out.tif", (500, 1000))
+    assert peak <= MAX_BAND_BYTES
+    with Image.open(source_path) as source, Image.open(tmp_path / "out.tif") as result:
+        assert result.tobytes() == source.resize((500, 1000), Image.Resampling.LANCZOS).tobytes()
+
+
+def test_large_downscale_stays_within_band_budget(tmp_path, monkeypatch):
+    source_path = sample_tiff(tmp_path / "source.tif", (1000, 4000))
+    assert tiled_image.BandedSource(source_path).is_banded
+    peak = resize_tiled(monkeypatch, source_path, tmp_path / "out.tif", (400, 40))
+    assert peak <= MAX_BAND_BYTES
+    with Image.open(source_path) as source, Image.open(tmp_path / "out.tif") as result:
+        expected = source.resize((400, 40), Image.Resampling.LANCZOS)
+        assert result.size == expected.size
+        assert max(high for low, high in ImageChops.difference(result, expected).getextrema()) <= 8
+    assert sorted(os.listdir(tmp_path)) == ["out.tif", "source.tif"]
@@ -22,14 +22,14 @@ QPushButton:pressed {
     background-color: #444444;
 }
 
-/* List Widget (for file_list) styles */
-QListWidget {
+/* List View (for file_list) styles */
+QListView {
     background-color: #444444;
     color: #DDDDDD;
     border: 1px solid #555555;
     border-radius: 4px;
 }
-QListWidget::item:selected {
+QListView::item:selected {
     background-color: #6a6a6a; /* Slightly lighter selection */
     color: #FFFFFF;
 }
@@ -100,14 +100,14 @@ QPushButton:pressed {
     background-color: #F0F0F0;
 }
 
-/* List Widget (for file_list) styles */
-QListWidget {
+/* List View (for file_list) styles */
+QListView {
     background-color: #FFFFFF;
     color: #333333;
     border: 1px solid #DDDDDD;
     border-radius: 4px;
 }
-QListWidget::item:selected {
+QListView::item:selected {
     background-color: #BBBBBB;
     color: #333333;
 }
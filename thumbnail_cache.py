@@ -0,0 +1,93 @@
+import hashlib
+import os
+import threading
+
+from PIL import Image
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "photoqt", "thumbnails")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+THUMBNAIL_SIZE = (96, 96)
+# Eviction trims below the cap so it does not run again on the very next insert
+EVICT_TO_FRACTION = 0.9
+
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    with Image.open(path) as image:
+        if image.format == "JPEG":
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full resolution
+            image.draft("RGB", (size[0] * 2, size[1] * 2))
+        image.thumbnail(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        return image.copy()
+
+
+class ThumbnailCache:
+    # Thumbnails on disk keyed by (path, mtime, size), so an edited file gets a new
+    # entry. File mtimes double as the LRU clock: a hit touches its file.
+
+    def __init__(self, cache_directory=DEFAULT_CACHE_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES, size=THUMBNAIL_SIZE):
+        self.cache_directory = cache_directory
+        self.max_bytes = max_bytes
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_directory, exist_ok=True)
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_directory) if entry.is_file())
+
+    def _entry_path(self, path):
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{self.size[0]}x{self.size[1]}"
+        return os.path.join(self.cache_directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png")
+
+    def get(self, path):
+        entry_path = self._entry_path(path)
+        try:
+            with Image.open(entry_path) as cached:
+                thumbnail = cached.copy()
+            os.utime(entry_path)
+            with self._lock:
+                self.hits += 1
+            return thumbnail
+        except (FileNotFoundError, OSError):
+            return None
+
+    def get_or_create(self, path):
+        thumbnail = self.get(path)
+        if thumbnail is not None:
+            return thumbnail
+        with self._lock:
+            self.misses += 1
+        thumbnail = make_thumbnail(path, self.size)
+        self._store(self._entry_path(path), thumbnail)
+        return thumbnail
+
+    def _store(self, entry_path, thumbnail):
+        temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        thumbnail.save(temp_path, format="PNG", compress_level=1)
+        os.replace(temp_path, entry_path)
+        with self._lock:
+            self._total_bytes += os.path.getsize(entry_path)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.cache_directory) if entry.is_file() and entry.name.endswith(".png")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self._total_bytes = sum(entry.stat().st_size for entry in entries)
+        target = self.max_bytes * EVICT_TO_FRACTION
+        for entry in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= size
+            except OSError:
+                pass
+        print(f"[ThumbnailCache] Evicted least recently used thumbnails, {self._total_bytes / (1024 * 1024):.1f} MB in cache.")
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self._total_bytes, "max_bytes": self.max_bytes}
@@ -0,0 +1,128 @@
+import os
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QSize, QThreadPool, QTimer, pyqtSignal
+from PyQt5.QtGui import QIcon, QPixmap
+
+from qt_image import pil_to_qimage
+from thumbnail_cache import ThumbnailCache
+
+THUMBNAIL_WORKERS = 4
+# Rows just outside the viewport are requested too, so short scrolls find icons ready
+PREFETCH_ROWS = 5
+
+
+class _ThumbnailJob(QRunnable):
+    def __init__(self, loader, name, path, generation):
+        super().__init__()
+        self.loader = loader
+        self.name = name
+        self.path = path
+        self.generation = generation
+
+    def run(self):
+        if not self.loader._still_wanted(self.path, self.generation):
+            return
+        try:
+            qimage = pil_to_qimage(self.loader.cache.get_or_create(self.path))
+            # QImage is safe to build off the GUI thread; QPixmap/QIcon are made on delivery
+            self.loader.thumbnail_ready.emit(self.name, self.path, self.generation, qimage)
+        except Exception as e:
+            # Failed files stay marked as requested so they are not retried on every scroll
+            print(f"Error creating thumbnail for {self.path}: {e}")
+
+
+class ThumbnailLoader(QObject):
+    thumbnail_ready = pyqtSignal(str, str, int, object)
+    thumbnail_skipped = pyqtSignal(str, int)
+
+    def __init__(self, file_list, cache=None, parent=None):
+        super().__init__(parent)
+        self.file_list = file_list
+        self.cache = cache if cache is not None else ThumbnailCache()
+        self.directory = ""
+        self._generation = 0
+        self._wanted = set()
+        self._requested = set()
+        self._lock = threading.Lock()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(THUMBNAIL_WORKERS)
+
+        self.file_list.setIconSize(QSize(*self.cache.size))
+        self.file_list.verticalScrollBar().valueChanged.connect(self.schedule_update)
+        # Rows arrive in batches while the directory is scanned
+        self.file_list.model().rowsInserted.connect(self.schedule_update)
+        self.file_list.model().rowsRemoved.connect(self.schedule_update)
+        self.thumbnail_ready.connect(self._apply_thumbnail)
+        self.thumbnail_skipped.connect(self._forget_request)
+
+        self._update_timer = QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(30)
+        self._update_timer.timeout.connect(self.request_visible)
+
+    def reset(self, directory):
+        with self._lock:
+            self._generation += 1
+            self._wanted.clear()
+        self._requested.clear()
+        self._pool.clear()
+        self.directory = directory
+        self.schedule_update()
+
+    def files_changed(self, added, removed):
+        # A file deleted and then created again under the same name needs a new thumbnail
+        for name in removed:
+            self._requested.discard(os.path.join(self.directory, name))
+
+    def schedule_update(self, *args):
+        # Coalesces bursts of scroll events into one visibility pass
+        self._update_timer.start()
+
+    def _visible_rows(self):
+        count = self.file_list.count()
+        if count == 0:
+            return range(0)
+        viewport = self.file_list.viewport().rect()
+        first = self.file_list.indexAt(viewport.topLeft())
+        last = self.file_list.indexAt(viewport.bottomLeft())
+        first_row = first.row() if first.isValid() else 0
+        if last.isValid():
+            last_row = last.row()
+        else:
+            # Below the last row, or rows not laid out yet: as many rows as fit
+            row_height = max(self.file_list.sizeHintForRow(first_row), 1)
+            last_row = min(first_row + viewport.height() // row_height, count - 1)
+        return range(max(first_row - PREFETCH_ROWS, 0), min(last_row + PREFETCH_ROWS, count - 1) + 1)
+
+    def request_visible(self):
+        rows = {}
+        for row in self._visible_rows():
+            name = self.file_list.filename(row)
+            rows[name] = os.path.join(self.directory, name)
+        with self._lock:
+            # Jobs for rows that scrolled away are skipped when they reach a worker
+            self._wanted = set(rows.values())
+            generation = self._generation
+        for name, path in rows.items():
+            if path not in self._requested:
+                self._requested.add(path)
+                self._pool.start(_ThumbnailJob(self, name, path, generation))
+
+    def _still_wanted(self, path, generation):
+        with self._lock:
+            wanted = generation == self._generation and path in self._wanted
+        if not wanted:
+            # Let a later visibility pass request it again
+            self.thumbnail_skipped.emit(path, generation)
+        return wanted
+
+    def _forget_request(self, path, generation):
+        if generation == self._generation:
+            self._requested.discard(path)
+
+    def _apply_thumbnail(self, name, path, generation, qimage):
+        if generation != self._generation:
+            return
+        # Rows move as files come and go; the model finds the name's current row
+        self.file_list.model().set_icon(name, QIcon(QPixmap.fromImage(qimage)))
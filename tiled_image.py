@@ -0,0 +1,400 @@
+import contextlib
+import math
+import os
+import struct
+
+from PIL import Image
+
+import export_profiles
+import image_ops
+import strip_parallel
+from autosave import write_image
+
+# Out-of-core processing for images too large to hold in memory. Sources are read
+# in horizontal bands by narrowing the raw tile descriptors Pillow parses from the
+# file header, so only the rows of one band (plus its halo) are ever decoded.
+# Results are streamed into an uncompressed strip TIFF, which is itself readable
+# in bands, so a chain of ops runs as a sequence of bounded-memory passes.
+
+DEFAULT_MAX_BAND_BYTES = 64 * 1024 * 1024
+ROWS_PER_STRIP = 64
+# Beyond this the classic TIFF 32-bit offsets overflow and BigTIFF is written instead
+CLASSIC_TIFF_LIMIT = 2 ** 32 - 1024
+# Images at least this large are processed tiled when the caller leaves it up to us
+AUTO_TILED_PIXELS = 100 * 1000 * 1000
+
+TILED_OPS = ["Mirror", "Sharpen", "B/W", "Color", "Contrast", "Blur", "Resize", "Crop"]
+
+_RAWMODE_BYTES = {
+    "1": None, "L": 1, "P": 1, "LA": 2, "La": 2, "I;16": 2, "I;16L": 2, "I;16B": 2,
+    "RGB": 3, "BGR": 3, "RGBA": 4, "RGBa": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4, "CMYK": 4,
+    "I": 4, "I;32": 4, "I;32L": 4, "F": 4, "F;32F": 4,
+}
+
+
+@contextlib.contextmanager
+def _no_pixel_limit():
+    # Pillow refuses to even open files past MAX_IMAGE_PIXELS; nothing here decodes them whole
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        yield
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+
+def _tile_layout(tile):
+    rawmode, stride, ystep = tile.args, 0, 1
+    if isinstance(tile.args, tuple):
+        rawmode = tile.args[0]
+        stride = tile.args[1] if len(tile.args) > 1 else 0
+        ystep = tile.args[2] if len(tile.args) > 2 else 1
+    bytes_per_pixel = _RAWMODE_BYTES.get(rawmode)
+    if tile.codec_name != "raw" or bytes_per_pixel is None:
+        return None
+    x0, y0, x1, y1 = tile.extents
+    if not stride:
+        stride = (x1 - x0) * bytes_per_pixel
+    return rawmode, stride, ystep
+
+
+class BandedSource:
+    # Reads rows [top, bottom) of an image without decoding the rest. Only sources
+    # stored as raw pixels (uncompressed TIFF, BMP, PPM/PGM) support this; for others
+    # is_banded is False and read_band() falls back to decoding the whole file once.
+
+    def __init__(self, path):
+        self.path = path
+        with _no_pixel_limit(), Image.open(path) as image:
+            self.size = image.size
+            self.mode = image.mode
+            self._tiles = list(image.tile)
+        self.width, self.height = self.size
+        self.is_banded = bool(self._tiles) and all(_tile_layout(tile) for tile in self._tiles)
+        self._whole = None
+
+    def read_band(self, top, bottom):
+        top = max(top, 0)
+        bottom = min(bottom, self.height)
+        if not self.is_banded:
+            if self._whole is None:
+                print(f"[BandedSource] {self.path} is not stored as raw pixels; decoding it whole.")
+                with _no_pixel_limit(), Image.open(self.path) as image:
+                    self._whole = image.copy()
+            return self._whole.crop((0, top, self.width, bottom))
+
+        band_tiles = []
+        for tile in self._tiles:
+            x0, y0, x1, y1 = tile.extents
+            if y1 <= top or y0 >= bottom:
+                continue
+            rawmode, stride, ystep = _tile_layout(tile)
+            first = max(y0, top)
+            last = min(y1, bottom)
+            if ystep < 0:
+                # Bottom-up storage: the file starts with the tile's last row
+                offset = tile.offset + (y1 - last) * stride
+            else:
+                offset = tile.offset + (first - y0) * stride
+            band_tiles.append(tile._replace(extents=(x0, first - top, x1, last - top), offset=offset,
+                                            args=(rawmode, stride, ystep)))
+
+        with _no_pixel_limit():
+            image = Image.open(self.path)
+            image._size = (self.width, bottom - top)
+            if hasattr(image, "_tile_size"):
+                # The TIFF plugin allocates its buffer from _tile_size rather than size
+                image._tile_size = image._size
+            image.tile = band_tiles
+            image.load()
+        return image
+
+
+class StripTiffWriter:
+    # Streams rows into an uncompressed, strip-organised TIFF; the directory is
+    # written last, once every strip offset is known.
+
+    _PHOTOMETRIC = {"L": 1, "RGB": 2, "RGBA": 2}
+
+    def __init__(self, path, size, mode):
+        if mode not in self._PHOTOMETRIC:
+            raise ValueError(f"Tiled output does not support mode {mode}")
+        self.path = path
+        self.width, self.height = size
+        self.mode = mode
+        self.samples = Image.getmodebands(mode)
+        self.stride = self.width * self.samples
+        data_bytes = self.stride * self.height
+        self.bigtiff = data_bytes > CLASSIC_TIFF_LIMIT
+        self.rows_written = 0
+        self._temp_path = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._temp_path, "wb")
+        self._data_start = 16 if self.bigtiff else 8
+        # Header placeholder; the IFD offset is patched in on close()
+        self._file.write(b"\0" * self._data_start)
+
+    def write_band(self, band):
+        if band.mode != self.mode:
+            band = band.convert(self.mode)
+        if band.width != self.width:
+            raise ValueError("Band width does not match the output width")
+        self._file.write(band.tobytes())
+        self.rows_written += band.height
+
+    def close(self):
+        if self.rows_written != self.height:
+            self.abort()
+            raise ValueError(f"Expected {self.height} rows, got {self.rows_written}")
+        strip_count = max(math.ceil(self.height / ROWS_PER_STRIP), 1)
+        offsets = [self._data_start + index * ROWS_PER_STRIP * self.stride for index in range(strip_count)]
+        counts = [min(ROWS_PER_STRIP, self.height - index * ROWS_PER_STRIP) * self.stride for index in range(strip_count)]
+
+        tags = [
+            (256, [self.width]),
+            (257, [self.height]),
+            (258, [8] * self.samples),
+            (259, [1]),
+            (262, [self._PHOTOMETRIC[self.mode]]),
+            (273, offsets),
+            (277, [self.samples]),
+            (278, [ROWS_PER_STRIP]),
+            (279, counts),
+            (284, [1]),
+        ]
+        if self.mode == "RGBA":
+            tags.append((338, [2]))
+        self._write_directory(tags)
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        with contextlib.suppress(OSError):
+            os.remove(self._temp_path)
+
+    def _write_directory(self, tags):
+        # Arrays that do not fit in an entry go between the pixel data and the IFD
+        if self.bigtiff:
+            entry_format, value_size, count_format, value_type = "<HHQ", 8, "<Q", (16, "<Q")
+        else:
+            entry_format, value_size, count_format, value_type = "<HHI", 4, "<I", (4, "<I")
+        short_type = (3, "<H")
+
+        out = self._file
+        entries = []
+        for tag, values in tags:
+            field_type, fmt = short_type if tag in (258, 259, 262, 277, 284, 338) else value_type
+            packed = b"".join(struct.pack(fmt, value) for value in values)
+            if len(packed) <= value_size:
+                entries.append((tag, field_type, len(values), packed.ljust(value_size, b"\0")))
+            else:
+                entries.append((tag, field_type, len(values), struct.pack(count_format, out.tell())))
+                out.write(packed)
+        if out.tell() % 2:
+            out.write(b"\0")
+
+        ifd_offset = out.tell()
+        out.write(struct.pack("<Q" if self.bigtiff else "<H", len(entries)))
+        for tag, field_type, count, value in entries:
+            out.write(struct.pack(entry_format, tag, field_type, count) + value)
+        out.write(struct.pack(count_format, 0))
+
+        out.seek(0)
+        if self.bigtiff:
+            out.write(b"II" + struct.pack("<HHHQ", 43, 8, 0, ifd_offset))
+        else:
+            out.write(b"II" + struct.pack("<HI", 42, ifd_offset))
+
+
+def image_size(path):
+    with _no_pixel_limit(), Image.open(path) as image:
+        return image.size
+
+
+def supports_ops(ops):
+    return all(name in TILED_OPS for name, _ in ops)
+
+
+def should_tile(path, ops):
+    width, height = image_size(path)
+    return width * height >= AUTO_TILED_PIXELS and supports_ops(ops)
+
+
+def _band_height(width, mode, max_band_bytes):
+    bytes_per_row = max(width * Image.getmodebands(mode), 1)
+    return max(max_band_bytes // bytes_per_row, 1)
+
+
+def _output_mode(mode):
+    if mode in ("L", "RGB", "RGBA"):
+        return mode
+    return "RGBA" if mode in ("LA", "PA", "RGBa", "La") else "RGB"
+
+
+def _contrast_mean(source, band_height):
+    histogram = [0] * 256
+    for top in range(0, source.height, band_height):
+        band = source.read_band(top, top + band_height)
+        for value, count in enumerate(band.convert("L").histogram()[:256]):
+            histogram[value] += count
+    total = sum(histogram)
+    return int(sum(value * count for value, count in enumerate(histogram)) / total + 0.5) if total else 0
+
+
+def _contrast_band(band, factor, mean):
+    # Same arithmetic as ImageEnhance.Contrast, but with the whole-image mean
+    degenerate = Image.new("L", band.size, mean)
+    if degenerate.mode != band.mode:
+        degenerate = degenerate.convert(band.mode)
+    if "A" in band.getbands():
+        degenerate.putalpha(band.getchannel("A"))
+    return Image.blend(degenerate, band, factor)
+
+
+def _neighborhood_pass(source, writer, band_height, halo, render):
+    for top in range(0, source.height, band_height):
+        bottom = min(top + band_height, source.height)
+        read_top = max(top - halo, 0)
+        band = source.read_band(read_top, min(bottom + halo, source.height))
+        result = render(band)
+        writer.write_band(result.crop((0, top - read_top, result.width, top - read_top + bottom - top)))
+
+
+def _resize_support(scale):
+    # Source rows LANCZOS reads on each side of an output row's own rows, with slack for rounding
+    return 3 * max(scale, 1.0) + 2
+
+
+def _reduce_factor(scale_y, source_rows):
+    # 1 when the rows under one output row, plus the support on both sides, fit in
+    # source_rows; otherwise the integer reduce() that brings them within it
+    if scale_y + 2 * _resize_support(scale_y) <= source_rows:
+        return 1
+    # After reducing by f the footprint is 7 * scale_y / f + 4 rows
+    target = max((source_rows - 4) / 7, 1.0)
+    return max(min(math.ceil(scale_y / target), int(scale_y)), 2)
+
+
+def _reduce_pass(source, writer, band_height, factor):
+    # Bands start on multiples of factor, so each matches the same rows of a whole-image reduce()
+    rows = max(band_height // factor, 1) * factor
+    for top in range(0, source.height, rows):
+        band = source.read_band(top, min(top + rows, source.height))
+        if band.mode != writer.mode:
+            band = band.convert(writer.mode)
+        writer.write_band(band.reduce((1, factor)))
+
+
+def _resize_pass(source, writer, max_band_bytes, width, height):
+    # Each output band resamples from just the source rows under it (plus the
+    # LANCZOS support), using resize(box=...) so the sampling grid matches a
+    # whole-image resize. Bands are sized by the source rows they read.
+    scale_y = source.height / height
+    support = _resize_support(scale_y)
+    source_rows = _band_height(source.width, source.mode, max_band_bytes)
+    band_height = max(int((source_rows - 2 * support) / scale_y), 1)
+    for top in range(0, height, band_height):
+        bottom = min(top + band_height, height)
+        source_top = top * scale_y
+        source_bottom = bottom * scale_y
+        read_top = max(int(math.floor(source_top - support)), 0)
+        read_bottom = min(int(math.ceil(source_bottom + support)), source.height)
+        band = source.read_band(read_top, read_bottom)
+        box = (0, source_top - read_top, source.width, source_bottom - read_top)
+        writer.write_band(band.resize((width, bottom - top), Image.Resampling.LANCZOS, box=box))
+    return band_height
+
+
+def _resize(source, writer, output_path, max_band_bytes, width, height):
+    # A downscale too steep for even one output row's footprint to fit the budget
+    # first goes through a banded integer reduce(), as resize(reducing_gap=...) would
+    source_rows = _band_height(source.width, source.mode, max_band_bytes)
+    factor = _reduce_factor(source.height / height, source_rows)
+    if factor == 1:
+        return _resize_pass(source, writer, max_band_bytes, width, height)
+    reduced_path = f"{output_path}.reduced.tif"
+    reducer = StripTiffWriter(reduced_path, (source.width, math.ceil(source.height / factor)), writer.mode)
+    try:
+        _reduce_pass(source, reducer, source_rows, factor)
+        reducer.close()
+    except BaseException:
+        reducer.abort()
+        raise
+    try:
+        return _resize_pass(BandedSource(reduced_path), writer, max_band_bytes, width, height)
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(reduced_path)
+
+
+def _run_op(source, output_path, name, argument, max_band_bytes, report):
+    mode = _output_mode(source.mode)
+    if name == "Resize":
+        width, height = argument
+    elif name == "Crop":
+        x, y, width, height = argument
+        if x < 0 or y < 0 or x + width > source.width or y + height > source.height:
+            raise ValueError("Crop area is outside image boundaries.")
+    else:
+        width, height = source.size
+    if name == "B/W":
+        mode = "RGB"
+
+    band_height = _band_height(max(width, source.width), mode, max_band_bytes)
+    writer = StripTiffWriter(output_path, (width, height), mode)
+    try:
+        if name == "Crop":
+            for top in range(y, y + height, band_height):
+                band = source.read_band(top, min(top + band_height, y + height))
+                writer.write_band(band.crop((x, 0, x + width, band.height)))
+        elif name == "Resize":
+            band_height = _resize(source, writer, output_path, max_band_bytes, width, height)
+        elif name == "Blur":
+            _neighborhood_pass(source, writer, band_height, strip_parallel.blur_halo(argument / 10.0),
+                               lambda band: image_ops.apply_blur(band, argument))
+        elif name == "Sharpen":
+            _neighborhood_pass(source, writer, band_height, strip_parallel.SHARPEN_HALO,
+                               lambda band: image_ops.apply_sharpen(band, argument))
+        elif name == "Contrast":
+            mean = _contrast_mean(source, band_height)
+            _neighborhood_pass(source, writer, band_height, 0,
+                               lambda band: _contrast_band(band, argument / 50.0, mean))
+        elif name in ("Mirror", "B/W", "Color"):
+            render = image_ops.get_filter_function(name)
+            _neighborhood_pass(source, writer, band_height, 0, lambda band: render(band, argument))
+        else:
+            raise ValueError(f"'{name}' is not supported in tiled mode (supported: {', '.join(TILED_OPS)})")
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    report(f"[tiled] {name} done: {width}x{height} {mode}, {band_height}-row bands")
+
+
+def process_tiled(input_path, output_path, ops, max_band_bytes=DEFAULT_MAX_BAND_BYTES, report=print,
+                  profile=export_profiles.DEFAULT_PROFILE):
+    # Every op is one streamed pass; intermediates are strip TIFFs next to the output
+    # and are removed as soon as the following pass has consumed them.
+    source_path = input_path
+    intermediates = []
+    try:
+        for index, (name, argument) in enumerate(ops):
+            is_last = index == len(ops) - 1
+            step_path = output_path if is_last and output_path.lower().endswith((".tif", ".tiff")) \
+                else f"{output_path}.step{index}.tif"
+            _run_op(BandedSource(source_path), step_path, name, argument, max_band_bytes, report)
+            if step_path != output_path:
+                intermediates.append(step_path)
+            if len(intermediates) > 1:
+                os.remove(intermediates.pop(0))
+            source_path = step_path
+
+        if source_path != output_path:
+            # Non-TIFF outputs need a whole-image encode; that is the one unbounded step
+            report(f"[tiled] Encoding {output_path} from the tiled result; this decodes it whole.")
+            with _no_pixel_limit(), Image.open(source_path) as result:
+                write_image(result, output_path, profile)
+    finally:
+        for path in intermediates:
+            with contextlib.suppress(OSError):
+                os.remove(path)